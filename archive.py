@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from http import HTTPStatus
+
+from requests.utils import get_encoding_from_headers
+
+from parse_pool import parse_page
+from parsers import PARSERS, get_parser
+from segments import CODECS, SEGMENT_RE as VOCAB_SEGMENT_RE, VocabSegments, live_keys
+from tokenizer import Tokenizer, load_stopwords
+
+# --- Raw response archive: <output-dir>/archive/archive-NNNNN.warc.gz ---
+# Each file is a series of WARC/1.1 records, every record its own gzip member
+# (the usual .warc.gz layout, so warcio and other WARC tools read it): a
+# warcinfo record, then one "response" record per parsed page holding the
+# HTTP status line, headers and body as the crawler received them, with
+# X-Crawl-Topic naming the topic directory. requests and aiohttp hand over
+# decoded bodies, so Content-Encoding / Transfer-Encoding are dropped and
+# Content-Length is rewritten. Records are only appended; a later record for
+# the same URL wins. A file is sealed when it passes max_bytes or the crawl
+# ends, by writing archive-NNNNN.idx next to it: one
+# "hash\ttopic\toffset\tlength\turl" line per record. A file without .idx
+# (crash) is indexed by scanning its gzip members.
+SEGMENT_RE = re.compile(r"^archive-(\d+)\.warc\.gz$")
+DROP_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+def url_hash(url: str) -> str:
+    # The crawler's encode_name: the name of the page's vocab file
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+def _record(fields: list, block: bytes) -> bytes:
+    head = "".join(f"{name}: {value}\r\n" for name, value in fields)
+    data = (f"WARC/1.1\r\n{head}Content-Length: {len(block)}\r\n\r\n").encode("utf-8")
+    return data + block + b"\r\n\r\n"
+
+
+def _gzip(data: bytes, level: int) -> bytes:
+    comp = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return comp.compress(data) + comp.flush()
+
+
+def _now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+# --- Parse one decompressed record: (WARC fields, HTTP status, HTTP headers, body) ---
+def parse_record(data: bytes) -> tuple:
+    head, _, rest = data.partition(b"\r\n\r\n")
+    fields = {}
+    for line in head.decode("utf-8").split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        fields[name.strip()] = value.strip()
+    block = rest[:int(fields.get("Content-Length", len(rest)))]
+    if fields.get("WARC-Type") != "response":
+        return fields, None, {}, block
+    http_head, _, body = block.partition(b"\r\n\r\n")
+    lines = http_head.decode("iso-8859-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return fields, status, headers, body
+
+
+def _members(f):
+    # (offset, compressed length, data) of every complete gzip member; stops at a torn one
+    start = pos = 0
+    parts = []
+    inflate = zlib.decompressobj(31)
+    buf = b""
+    while True:
+        if not buf:
+            buf = f.read(1 << 20)
+            if not buf:
+                return
+        try:
+            parts.append(inflate.decompress(buf))
+        except zlib.error:
+            return
+        if inflate.eof:
+            end = pos + len(buf) - len(inflate.unused_data)
+            yield start, end - start, b"".join(parts)
+            buf = inflate.unused_data
+            start = pos = end
+            parts = []
+            inflate = zlib.decompressobj(31)
+        else:
+            pos += len(buf)
+            buf = b""
+
+
+# --- Index of one archive file: [(hash, topic, offset, length, url)] in file order ---
+def read_index(path: str) -> list:
+    idx = path[:-len(".warc.gz")] + ".idx"
+    if os.path.exists(idx):
+        with open(idx, encoding="utf-8") as f:
+            return [(key, topic, int(offset), int(length), url)
+                    for key, topic, offset, length, url in
+                    (line.rstrip("\n").split("\t", 4) for line in f if line.strip())]
+    entries = []
+    with open(path, "rb") as f:
+        for offset, length, data in _members(f):
+            fields, status, _, _ = parse_record(data)
+            if status is not None:
+                url = fields["WARC-Target-URI"]
+                entries.append((url_hash(url), fields.get("X-Crawl-Topic", ""), offset, length,
+                                url))
+    return entries
+
+
+def read_at(path: str, offset: int, length: int) -> tuple:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return parse_record(zlib.decompress(f.read(length), 31))
+
+
+def archive_files(archive_dir: str) -> list:
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(os.path.join(archive_dir, name) for name in os.listdir(archive_dir)
+                  if SEGMENT_RE.match(name))
+
+
+def latest_records(archive_dir: str) -> dict:
+    # hash -> (path, topic, offset, length, url) of its newest record
+    latest = {}
+    for path in archive_files(archive_dir):
+        for key, topic, offset, length, url in read_index(path):
+            latest[key] = (path, topic, offset, length, url)
+    return latest
+
+
+# --- Append-only writer, shared by every seed and thread of a crawl ---
+# Compression happens outside the lock; a new file is started at every run.
+class WarcArchive:
+    def __init__(self, archive_dir: str, max_bytes: int = 1 << 30, level: int = 6):
+        self.archive_dir = archive_dir
+        self.max_bytes = max_bytes
+        self.level = level
+        self.records = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        os.makedirs(archive_dir, exist_ok=True)
+        numbers = [int(m.group(1)) for m in map(SEGMENT_RE.match, os.listdir(archive_dir)) if m]
+        self._next = max(numbers, default=-1) + 1
+        self._lock = threading.Lock()
+        self._f = None
+
+    def _open(self):
+        self._path = os.path.join(self.archive_dir, f"archive-{self._next:05d}.warc.gz")
+        self._next += 1
+        self._f = open(self._path, "wb")
+        self._index = []
+        info = b"software: web-crawler-and-scrapping\r\nformat: WARC File Format 1.1\r\n"
+        self._f.write(_gzip(_record([
+            ("WARC-Type", "warcinfo"),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", _now()),
+            ("WARC-Filename", os.path.basename(self._path)),
+            ("Content-Type", "application/warc-fields"),
+        ], info), self.level))
+
+    def write(self, topic: str, url: str, status: int, headers, body: bytes):
+        # headers: requests' or aiohttp's response headers (items() of name, value)
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        head = [f"HTTP/1.1 {status} {reason}"]
+        head += [f"{name}: {value}" for name, value in headers.items()
+                 if name.lower() not in DROP_HEADERS]
+        head.append(f"Content-Length: {len(body)}")
+        block = ("\r\n".join(head) + "\r\n\r\n").encode("iso-8859-1", "replace") + body
+        data = _gzip(_record([
+            ("WARC-Type", "response"),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", _now()),
+            ("WARC-Target-URI", url),
+            ("X-Crawl-Topic", topic),
+            ("Content-Type", "application/http;msgtype=response"),
+        ], block), self.level)
+        with self._lock:
+            if self._f is None:
+                self._open()
+            offset = self._f.tell()
+            self._f.write(data)
+            self._index.append(f"{url_hash(url)}\t{topic}\t{offset}\t{len(data)}\t{url}\n")
+            self.records += 1
+            self.bytes_in += len(block)
+            self.bytes_out += len(data)
+            if offset + len(data) >= self.max_bytes:
+                self._seal()
+
+    def _seal(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        self._f = None
+        idx = self._path[:-len(".warc.gz")] + ".idx"
+        with open(idx + ".tmp", "w", encoding="utf-8") as f:
+            f.writelines(self._index)
+        os.replace(idx + ".tmp", idx)
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._seal()
+
+    def summary(self) -> str:
+        ratio = self.bytes_in / self.bytes_out if self.bytes_out else 0
+        return (f"{self.records} responses, {self.bytes_in / 1e6:.1f} MB -> "
+                f"{self.bytes_out / 1e6:.1f} MB ({ratio:.1f}x)")
+
+
+# --- Move the archive files of a shard into the output's archive, renumbered ---
+def merge_archive(src_dir: str, dst_dir: str) -> int:
+    files = archive_files(src_dir)
+    if not files:
+        return 0
+    os.makedirs(dst_dir, exist_ok=True)
+    number = max((int(SEGMENT_RE.match(n).group(1)) for n in os.listdir(dst_dir)
+                  if SEGMENT_RE.match(n)), default=-1) + 1
+    for path in files:
+        target = os.path.join(dst_dir, f"archive-{number:05d}")
+        idx = path[:-len(".warc.gz")] + ".idx"
+        if os.path.exists(idx):
+            os.replace(idx, target + ".idx")
+        os.replace(path, target + ".warc.gz")
+        number += 1
+    return len(files)
+
+
+# --- Pages of a crawl output: {(topic, hash)} from vocab files and segments ---
+def crawl_pages(output_dir: str) -> set:
+    pages = set()
+    for dirpath, _, files in os.walk(output_dir):
+        topic = os.path.relpath(dirpath, output_dir)
+        pages.update((topic, name[6:-4]) for name in files
+                     if name.startswith("vocab_") and name.endswith(".txt"))
+        segs = [os.path.join(dirpath, name) for name in files if VOCAB_SEGMENT_RE.match(name)]
+        if segs:
+            pages.update((topic, key) for key in live_keys(segs))
+    return pages
+
+
+# --- reprocess: tokens of every archived page, in worker processes ---
+_worker = None
+
+
+def _init_worker(parser_name: str, lowercase: bool, stopwords: str, max_length: int):
+    global _worker
+    _, parse = get_parser(parser_name)
+    tokenize = Tokenizer(lowercase=lowercase,
+                         stopwords=load_stopwords(stopwords) if stopwords else (),
+                         max_length=max_length)
+    _worker = (parse, tokenize)
+
+
+def _reprocess_chunk(task: tuple) -> list:
+    # task: (archive file, [(hash, topic, offset, length)], out_dir or None)
+    # With out_dir the vocab files are written here and only counts come back;
+    # without, [(topic, hash, vocab line)] is returned for the segment writer
+    path, entries, out_dir = task
+    parse, tokenize = _worker
+    results = []
+    with open(path, "rb") as f:
+        for key, topic, offset, length in entries:
+            f.seek(offset)
+            fields, status, headers, body = parse_record(zlib.decompress(f.read(length), 31))
+            # Decoded the way requests' resp.text does in the sync and threaded crawls
+            encoding = get_encoding_from_headers(headers)
+            tokens, _ = parse_page(body, encoding, fields["WARC-Target-URI"], parse, tokenize)
+            line = " ".join(tokens)
+            if out_dir is None:
+                results.append((topic, key, line))
+                continue
+            topic_dir = os.path.join(out_dir, topic)
+            with open(os.path.join(topic_dir, f"vocab_{key}.txt"), "w", encoding="utf-8") as vf:
+                vf.write(line)
+            results.append((topic, key, None))
+    return results
+
+
+def reprocess(output_dir: str, out_dir: str, workers: int, parser_name: str, lowercase: bool,
+              stopwords: str, max_length: int, segments: VocabSegments = None,
+              chunk: int = 256) -> tuple:
+    # Returns (pages rebuilt, {topic: pages of the crawl output not rebuilt}):
+    # pages crawled before --archive, or only revalidated since, have no
+    # record and keep the vocab line they were crawled with
+    latest = latest_records(os.path.join(output_dir, "archive"))
+    # Near-duplicates got no vocab file in the crawl and get none here either
+    skip = set()
+    dups = os.path.join(output_dir, "duplicates.tsv")
+    if os.path.exists(dups):
+        with open(dups, encoding="utf-8") as f:
+            skip = {line.split("\t", 1)[0] for line in f if line.strip()}
+    by_file = {}
+    for key, (path, topic, offset, length, _) in latest.items():
+        if key not in skip:
+            by_file.setdefault(path, []).append((offset, key, topic, length))
+    missed = Counter(topic for topic, key in crawl_pages(output_dir)
+                     if key in skip or key not in latest or latest[key][1] != topic)
+    tasks = []
+    for path, entries in sorted(by_file.items()):
+        entries.sort()  # read each file front to back
+        for i in range(0, len(entries), chunk):
+            tasks.append((path, [(key, topic, offset, length)
+                                 for offset, key, topic, length in entries[i:i + chunk]],
+                          None if segments is not None else out_dir))
+    for topic in {topic for _, topic, _, _, _ in latest.values()}:
+        os.makedirs(os.path.join(out_dir, topic), exist_ok=True)
+
+    count = 0
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ctx.Pool(workers, initializer=_init_worker,
+              initargs=(parser_name, lowercase, stopwords, max_length)) as pool:
+        for results in pool.imap_unordered(_reprocess_chunk, tasks):
+            if segments is not None:
+                for topic, key, line in results:
+                    segments.write(os.path.join(out_dir, topic), key, line)
+            count += len(results)
+    return count, missed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw response archive of a crawl "
+                                                 "(crawler --archive)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("reprocess", help="Rebuild the vocab files of a crawl from its archive")
+    rep.add_argument("output_dir", help="Crawl output directory (with archive/)")
+    rep.add_argument("--out", help="Write the vocab files here instead of into output_dir")
+    rep.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    rep.add_argument("--parser", choices=["auto"] + list(PARSERS), default="auto")
+    rep.add_argument("--lowercase", action="store_true")
+    rep.add_argument("--stopwords", metavar="LISTS")
+    rep.add_argument("--max-token-length", type=int, default=0)
+    rep.add_argument("--vocab-format", choices=["files", "segments"], default="files")
+    rep.add_argument("--segment-codec", choices=list(CODECS), default="deflate")
+    rep.add_argument("--segment-size", type=int, default=256, help="MB per segment")
+    stats = sub.add_parser("stats", help="Records and sizes per archive file")
+    stats.add_argument("output_dir")
+    get = sub.add_parser("get", help="Print the archived HTTP response of a URL or hash")
+    get.add_argument("output_dir")
+    get.add_argument("url")
+    get.add_argument("--headers", action="store_true", help="Only the status and headers")
+    args = parser.parse_args()
+
+    archive_dir = os.path.join(args.output_dir, "archive")
+    if not archive_files(archive_dir):
+        parser.error(f"no archive files in {archive_dir}")
+    if args.command == "reprocess":
+        try:
+            parser_name, _ = get_parser(args.parser)
+        except ValueError as exc:
+            parser.error(f"--parser: {exc}")
+        try:
+            if args.stopwords:
+                load_stopwords(args.stopwords)
+        except (OSError, ValueError) as exc:
+            parser.error(f"--stopwords: {exc}")
+        segments = None
+        if args.vocab_format == "segments":
+            try:
+                segments = VocabSegments(args.segment_codec, args.segment_size << 20)
+            except ValueError as exc:
+                parser.error(f"--segment-codec: {exc}")
+        start = time.time()
+        try:
+            count, missed = reprocess(args.output_dir, args.out or args.output_dir,
+                                      args.workers, parser_name, args.lowercase, args.stopwords,
+                                      args.max_token_length, segments)
+        finally:
+            if segments is not None:
+                segments.close()
+        took = time.time() - start
+        print(f"Reprocessed {count} pages with {parser_name} on {args.workers} workers in "
+              f"{took:.1f}s ({count / max(took, 1e-9):.0f} pages/s)")
+        if missed:
+            where = ("keep their old vocab lines" if not args.out
+                     or os.path.abspath(args.out) == os.path.abspath(args.output_dir)
+                     else f"are missing from {args.out}")
+            print(f"Warning: {sum(missed.values())} pages of {args.output_dir} have no archive "
+                  f"record and were not rebuilt; they {where}. They were crawled before "
+                  f"--archive or only revalidated since. Per topic: "
+                  + ", ".join(f"{topic} {n}" for topic, n in sorted(missed.items())))
+    elif args.command == "stats":
+        total = size = 0
+        for path in archive_files(archive_dir):
+            entries = read_index(path)
+            sealed = os.path.exists(path[:-len(".warc.gz")] + ".idx")
+            total += len(entries)
+            size += os.path.getsize(path)
+            print(f"{path}: {len(entries)} responses, {os.path.getsize(path) / 1e6:.1f} MB, "
+                  f"{'sealed' if sealed else 'open'}")
+        print(f"{total} responses, {len(latest_records(archive_dir))} distinct pages, "
+              f"{size / 1e6:.1f} MB")
+    else:
+        # URLs are archived in the crawler's canonical form, without a trailing slash
+        key = (args.url if re.fullmatch(r"[0-9a-f]{16}", args.url)
+               else url_hash(args.url.strip().rstrip("/")))
+        entry = latest_records(archive_dir).get(key)
+        if entry is None:
+            parser.error(f"{args.url} is not in the archive")
+        path, _, offset, length, _ = entry
+        fields, status, headers, body = read_at(path, offset, length)
+        print(f"{fields['WARC-Target-URI']} ({fields['WARC-Date']}, {os.path.basename(path)} "
+              f"@ {offset})")
+        print(f"HTTP {status}")
+        for name, value in headers.items():
+            print(f"{name}: {value}")
+        if not args.headers:
+            print()
+            print(body.decode(get_encoding_from_headers(headers) or "utf-8", errors="replace"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import os
+import queue
+import threading
+import time
+
+
+# --- Drop a half-written last line left behind by a crash ---
+def repair_tail(path: str) -> int:
+    # Returns the number of bytes cut off
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+        pos = size
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                end = pos - step + nl + 1
+                break
+            pos -= step
+        else:
+            end = 0
+        if end < size:
+            f.truncate(end)
+        return size - end
+
+
+# --- Long-lived appender for line-oriented logs (all_urls_master.txt etc.) ---
+# write() only enqueues; a background thread batches lines and appends them
+# with a single write() once flush_lines are waiting or flush_interval has
+# passed, and fsyncs every fsync_interval seconds and on checkpoint()/close().
+# Every batch ends on a newline and a torn tail from a crash is trimmed by
+# repair_tail() on open, so readers never see a half-written line.
+class BatchedLineWriter:
+    def __init__(self, path: str, flush_lines: int = 1000, flush_interval: float = 1.0,
+                 fsync_interval: float = 30.0):
+        self.path = path
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        repair_tail(path)
+        self._fh = open(path, "ab")
+        self._queue = queue.Queue()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name=f"writer-{os.path.basename(path)}",
+                                        daemon=True)
+        self._thread.start()
+
+    def write(self, line: str):
+        if self._closed:
+            raise ValueError(f"write to closed writer {self.path}")
+        if self._error:
+            raise self._error
+        self._queue.put(line if line.endswith("\n") else line + "\n")
+
+    def checkpoint(self):
+        # Block until everything written so far is on disk
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+        if self._error:
+            raise self._error
+
+    def close(self):
+        if self._closed:
+            return
+        self.checkpoint()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._fh.close()
+
+    def _run(self):
+        buf = []
+        oldest = last_sync = time.monotonic()
+        dirty = False
+        while True:
+            try:
+                if buf:
+                    wait = self.flush_interval - (time.monotonic() - oldest)
+                    item = self._queue.get(timeout=max(0.0, wait))
+                else:
+                    # Idle: wake up once to fsync whatever is still unsynced
+                    item = self._queue.get(timeout=self.fsync_interval if dirty else None)
+            except queue.Empty:
+                item = ""
+            control = item is None or isinstance(item, threading.Event)
+            if item and not control:
+                if not buf:
+                    oldest = time.monotonic()
+                buf.append(item)
+            now = time.monotonic()
+            if buf and (control or len(buf) >= self.flush_lines
+                        or now - oldest >= self.flush_interval):
+                self._flush(buf)
+                buf = []
+                dirty = True
+            if dirty and (control or now - last_sync >= self.fsync_interval):
+                self._sync()
+                dirty = False
+                last_sync = now
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _flush(self, lines: list):
+        try:
+            self._fh.write("".join(lines).encode("utf-8"))
+            self._fh.flush()
+        except OSError as exc:
+            self._error = exc
+
+    def _sync(self):
+        try:
+            os.fsync(self._fh.fileno())
+        except OSError as exc:
+            self._error = exc
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from segments import iter_documents
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MODES = {
+    # name -> extra crawler arguments
+    "sync": ["--mode", "sync"],
+    "threaded": ["--mode", "threaded"],
+    "async": ["--mode", "async"],
+    "async+parse-workers": ["--mode", "async", "--parse-workers", "2"],
+    "shards": ["--mode", "async", "--shards", "2"],
+}
+
+
+# --- Synthetic site: pages 0..N-1 per host, each linking to `fanout` others ---
+# Page n links to n*fanout+1 .. n*fanout+fanout (mod N; page 0 is the root
+# "/"), so every page is reachable from the root, plus a login link the
+# crawler must skip. Page text is drawn from a fixed pseudo-word vocabulary
+# seeded by the page number, so every run (and every host) serves the same
+# bytes. A share of first requests can be answered 429 with Retry-After: 0.
+class SyntheticSite:
+    def __init__(self, hosts: int = 4, pages: int = 500, fanout: int = 5, words: int = 300,
+                 latency: float = 0.0, rate_limit: float = 0.0, crawl_delay: float = 0.0):
+        self.pages = pages
+        self.fanout = fanout
+        self.words = words
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.crawl_delay = crawl_delay
+        rng = random.Random(0)
+        letters = "abcdefghijklmnopqrstuvwxyz"
+        self.vocab = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10)))
+                      for _ in range(5000)]
+        self.hits = {}
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self.servers = []
+        for _ in range(hosts):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+
+    @property
+    def seeds(self) -> list:
+        return [f"http://127.0.0.1:{server.server_address[1]}" for server in self.servers]
+
+    def page(self, n: int) -> bytes:
+        rng = random.Random(n)
+        text = " ".join(rng.choice(self.vocab) for _ in range(self.words))
+        hrefs = [f"/p/{m}" if m else "/"
+                 for m in ((n * self.fanout + k) % self.pages for k in range(1, self.fanout + 1))]
+        links = "".join(f'<a href="{href}">next</a> ' for href in hrefs)
+        return (f"<html><head><title>Page {n}</title><script>var page = {n};</script></head>"
+                f"<body><p>{text}</p>{links}<a href='/login'>Sign in</a></body></html>"
+                ).encode("utf-8")
+
+    def reset(self):
+        # Forget which URLs were requested, so the next run is throttled the same way
+        with self._lock:
+            self.hits.clear()
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; with Nagle on, keep-alive
+            # connections stall ~40 ms per response on the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+                    key = (self.server.server_address[1], self.path)
+                    first = key not in site.hits
+                    site.hits[key] = site.hits.get(key, 0) + 1
+                if site.latency:
+                    time.sleep(site.latency)
+                if self.path == "/robots.txt":
+                    self._send(200, f"User-agent: *\nCrawl-delay: {site.crawl_delay:g}\n".encode(),
+                               "text/plain")
+                    return
+                # The same URLs are throttled in every run: decided by a hash of the path
+                if first and site.rate_limit and \
+                        zlib.crc32(self.path.encode()) % 1000 < site.rate_limit * 1000:
+                    with site._lock:
+                        site.throttled += 1
+                    self._send(429, b"", headers={"Retry-After": "0"})
+                    return
+                parts = self.path.strip("/").split("/")
+                if self.path == "/" or (len(parts) == 2 and parts[0] == "p" and
+                                        parts[1].isdigit() and int(parts[1]) < site.pages):
+                    n = int(parts[1]) if self.path != "/" else 0
+                    self._send(200, site.page(n))
+                else:
+                    self._send(404, b"")
+
+            def _send(self, status: int, body: bytes, kind: str = "text/html; charset=utf-8",
+                      headers: dict = None):
+                self.send_response(status)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                pass
+        return Handler
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+# --- One crawler run in a child process: wall time, CPU time and peak RSS ---
+# CPU and RSS come from wait4(), so they cover the crawler and every process
+# it waited for (parse workers, shards); RSS is that of the largest process.
+def run_crawler(crawler: str, args: list, log_path: str) -> dict:
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, crawler] + args, stdout=log,
+                                stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            cpu = usage.ru_utime + usage.ru_stime
+            # KB on Linux, bytes on macOS
+            rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        else:
+            proc.wait()
+            cpu = rss = None
+    return {"status": proc.returncode, "seconds": time.perf_counter() - start,
+            "cpu": cpu, "rss": rss}
+
+
+def read_output(output_dir: str) -> tuple:
+    # (crawled URLs, {hash: vocab line})
+    with open(os.path.join(output_dir, "all_urls_master.txt"), encoding="utf-8") as f:
+        urls = {line.strip() for line in f if line.strip()}
+    return urls, dict(iter_documents(output_dir))
+
+
+def compare(reference: tuple, output: tuple) -> str:
+    (ref_urls, ref_docs), (urls, docs) = reference, output
+    problems = []
+    if urls != ref_urls:
+        problems.append(f"{len(ref_urls - urls)} URLs missing, {len(urls - ref_urls)} extra")
+    differ = sum(docs.get(key) != text for key, text in ref_docs.items()) + \
+        len(docs.keys() - ref_docs.keys())
+    if differ:
+        problems.append(f"{differ} vocab files differ")
+    return "; ".join(problems) or "same"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crawler modes against a local synthetic site, without "
+                    "politeness delays"
+    )
+    parser.add_argument("--crawler", default=os.path.join(HERE, "crawler-updated12.py"),
+                        help="Crawler script to run")
+    parser.add_argument("--modes", default="sync,threaded,async,shards",
+                        help=f"Comma-separated modes out of {', '.join(MODES)}; the first is "
+                             f"the reference for output equivalence")
+    parser.add_argument("--hosts", type=int, default=4, help="Hosts (one seed each)")
+    parser.add_argument("--pages", type=int, default=500, help="Pages per host")
+    parser.add_argument("--fanout", type=int, default=5, help="Links per page")
+    parser.add_argument("--words", type=int, default=300, help="Words per page")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds the server waits before answering")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Share of first requests answered 429 with Retry-After: 0")
+    parser.add_argument("--crawl-delay", type=float, default=0.0,
+                        help="Crawl-delay in robots.txt")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per mode; the fastest is reported")
+    parser.add_argument("--crawler-args", default="",
+                        help="Extra crawler arguments for every run, e.g. '--parser lxml'")
+    parser.add_argument("--work-dir", help="Keep seeds, outputs and logs here (default: a "
+                                           "temporary directory that is removed)")
+    parser.add_argument("--json", metavar="PATH", help="Write the results as JSON")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="Results of an earlier --json run; exit 1 if a mode got slower "
+                             "by more than --tolerance or its output differs")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed pages/s drop against --baseline (default 0.2 = 20%%)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Only run the synthetic site and print its seeds (Ctrl-C to stop)")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(unknown)}")
+
+    site = SyntheticSite(args.hosts, args.pages, args.fanout, args.words, args.latency,
+                         args.rate_limit, args.crawl_delay)
+    if args.serve:
+        print("\n".join(site.seeds))
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            site.close()
+        return
+
+    work = args.work_dir or tempfile.mkdtemp(prefix="bench-crawler-")
+    os.makedirs(os.path.join(work, "seeds"), exist_ok=True)
+    with open(os.path.join(work, "seeds", "bench.txt"), "w") as f:
+        f.write("\n".join(site.seeds) + "\n")
+    print(f"{args.hosts} hosts x {args.pages} pages, fanout {args.fanout}, {args.words} words "
+          f"per page, latency {args.latency * 1000:g} ms, {args.rate_limit:.0%} throttled")
+
+    results = {}
+    reference = None
+    try:
+        print(f"{'mode':<22}{'pages':>7}{'seconds':>9}{'pages/s':>9}{'CPU ms/page':>12}"
+              f"{'peak MB':>9}  output")
+        for mode in modes:
+            best = None
+            for run in range(args.repeat):
+                out = os.path.join(work, f"out-{mode}")
+                shutil.rmtree(out, ignore_errors=True)
+                site.reset()
+                crawl_args = ["--seeds-dir", os.path.join(work, "seeds"), "--output-dir", out,
+                              "--max-pages", str(args.pages), "--jitter", "0", "0", "--quiet"]
+                crawl_args += MODES[mode] + args.crawler_args.split()
+                result = run_crawler(args.crawler, crawl_args,
+                                     os.path.join(work, f"log-{mode}.txt"))
+                if best is None or result["seconds"] < best["seconds"]:
+                    best = result
+            if best["status"] != 0:
+                print(f"{mode:<22} failed with status {best['status']}, see "
+                      f"{os.path.join(work, f'log-{mode}.txt')}")
+                results[mode] = {**best, "output": "failed"}
+                continue
+            output = read_output(out)
+            if reference is None:
+                reference = output
+            pages = len(output[0])
+            best.update(pages=pages, pages_per_second=pages / best["seconds"],
+                        output=compare(reference, output))
+            results[mode] = best
+            cpu = f"{best['cpu'] * 1000 / max(pages, 1):>12.2f}" if best["cpu"] is not None \
+                else f"{'-':>12}"
+            rss = f"{best['rss'] / 1e6:>9.1f}" if best["rss"] is not None else f"{'-':>9}"
+            print(f"{mode:<22}{pages:>7}{best['seconds']:>9.2f}{best['pages_per_second']:>9.1f}"
+                  f"{cpu}{rss}  {best['output']}")
+        print(f"Server: {site.requests} requests, {site.throttled} answered 429")
+    finally:
+        site.close()
+        if not args.work_dir:
+            shutil.rmtree(work, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items()
+                                    if k not in ("json", "baseline", "work_dir", "serve")},
+                       "results": results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        changed = [name for name in ("hosts", "pages", "fanout", "words", "latency",
+                                     "rate_limit", "crawl_delay", "crawler_args")
+                   if baseline["settings"].get(name) != getattr(args, name)]
+        if changed:
+            print(f"Warning: the baseline was run with different {', '.join(changed)}")
+        baseline = baseline["results"]
+        regressions = 0
+        for mode, result in results.items():
+            before = baseline.get(mode)
+            if not before or "pages_per_second" not in before:
+                continue
+            if "pages_per_second" not in result:
+                print(f"{mode}: failed (baseline {before['pages_per_second']:.1f} pages/s)")
+                regressions += 1
+                continue
+            change = result["pages_per_second"] / before["pages_per_second"] - 1
+            flag = ""
+            if change < -args.tolerance or result["output"] != "same":
+                flag = "  REGRESSION"
+                regressions += 1
+            print(f"{mode}: {before['pages_per_second']:.1f} -> "
+                  f"{result['pages_per_second']:.1f} pages/s ({change:+.0%}){flag}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import time
+from collections import Counter
+
+from parsers import available_parsers, get_parser
+from tokenizer import default_tokenizer
+
+
+# --- Collect saved pages (*.html / *.htm) from files and directories ---
+def find_pages(paths: list, limit: int = None) -> list:
+    pages = []
+    for path in paths:
+        if os.path.isfile(path):
+            pages.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith((".html", ".htm")):
+                    pages.append(os.path.join(root, name))
+    pages.sort()
+    return pages[:limit] if limit else pages
+
+
+# --- Run one backend over every page: (seconds, [(tokens, hrefs), ...]) ---
+def run_backend(parse, docs: list, repeat: int):
+    best = None
+    for _ in range(repeat):
+        out = []
+        start = time.perf_counter()
+        for html in docs:
+            texts, hrefs = parse(html)
+            out.append((list(default_tokenizer(texts)), hrefs))
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best, out
+
+
+# --- Agreement between two backends' outputs ---
+# Token overlap is the multiset Jaccard (sum of min counts / sum of max
+# counts) over all pages; link overlap is the same over the href lists.
+def compare(a: list, b: list) -> dict:
+    same_tokens = same_links = 0
+    tok_min = tok_max = link_min = link_max = 0
+    for (tokens_a, hrefs_a), (tokens_b, hrefs_b) in zip(a, b):
+        same_tokens += tokens_a == tokens_b
+        same_links += hrefs_a == hrefs_b
+        ca, cb = Counter(tokens_a), Counter(tokens_b)
+        tok_min += sum((ca & cb).values())
+        tok_max += sum((ca | cb).values())
+        la, lb = Counter(hrefs_a), Counter(hrefs_b)
+        link_min += sum((la & lb).values())
+        link_max += sum((la | lb).values())
+    return {
+        "same_tokens": same_tokens,
+        "same_links": same_links,
+        "token_overlap": tok_min / tok_max if tok_max else 1.0,
+        "link_overlap": link_min / link_max if link_max else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare speed and token/link output of the HTML parser backends"
+    )
+    parser.add_argument("pages", nargs="+",
+                        help="Saved HTML pages, or directories searched for *.html / *.htm")
+    parser.add_argument("--backends", nargs="+", default=available_parsers(),
+                        help="Backends to run (default: every installed one)")
+    parser.add_argument("--reference", default="bs4",
+                        help="Backend the others are compared against")
+    parser.add_argument("--limit", type=int, help="Use at most this many pages")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timing runs per backend; the fastest is reported")
+    parser.add_argument("--show-diffs", type=int, default=0, metavar="N",
+                        help="Print up to N pages whose tokens differ from the reference")
+    args = parser.parse_args()
+
+    backends = list(dict.fromkeys([args.reference] + args.backends))
+    parse_fns = {}
+    for name in backends:
+        try:
+            parse_fns[name] = get_parser(name)[1]
+        except ValueError as exc:
+            parser.error(str(exc))
+
+    paths = find_pages(args.pages, args.limit)
+    if not paths:
+        parser.error("no .html/.htm pages found")
+    docs = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            docs.append(f.read())
+    size = sum(len(d) for d in docs)
+    print(f"Parsing {len(docs)} pages ({size / 1e6:.1f} MB) with {', '.join(backends)}")
+
+    results = {}
+    for name in backends:
+        took, out = run_backend(parse_fns[name], docs, args.repeat)
+        results[name] = (took, out)
+
+    ref_time, ref_out = results[args.reference]
+    print(f"\n{'backend':<12}{'ms/page':>10}{'MB/s':>8}{'speedup':>9}"
+          f"{'same tok':>10}{'tok ovl':>9}{'same lnk':>10}{'lnk ovl':>9}")
+    for name in backends:
+        took, out = results[name]
+        cmp = compare(ref_out, out)
+        print(f"{name:<12}{took * 1000 / len(docs):>10.2f}{size / 1e6 / took:>8.1f}"
+              f"{ref_time / took:>8.1f}x"
+              f"{cmp['same_tokens'] / len(docs):>10.1%}{cmp['token_overlap']:>9.4f}"
+              f"{cmp['same_links'] / len(docs):>10.1%}{cmp['link_overlap']:>9.4f}")
+
+    # Pairwise agreement between every backend, not just the reference
+    if len(backends) > 2:
+        print("\nToken overlap between backends:")
+        print(" " * 12 + "".join(f"{name:>12}" for name in backends))
+        for a in backends:
+            row = "".join(f"{compare(results[a][1], results[b][1])['token_overlap']:>12.4f}"
+                          for b in backends)
+            print(f"{a:<12}{row}")
+
+    shown = 0
+    for name in backends:
+        if name == args.reference:
+            continue
+        for path, (ref_tokens, _), (tokens, _) in zip(paths, ref_out, results[name][1]):
+            if shown >= args.show_diffs:
+                break
+            if ref_tokens != tokens:
+                ref_c, c = Counter(ref_tokens), Counter(tokens)
+                print(f"\n{name} vs {args.reference}: {path}")
+                print(f"  only in {args.reference}: {sorted((ref_c - c).elements())[:20]}")
+                print(f"  only in {name}: {sorted((c - ref_c).elements())[:20]}")
+                shown += 1
+
+
+if __name__ == "__main__":
+    main()
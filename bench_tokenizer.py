@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+import time
+import tracemalloc
+from collections import deque
+
+from tokenizer import Tokenizer, load_stopwords
+
+
+# --- The extraction the crawler used before tokenizer.py ---
+def legacy_tokens(text: str) -> list:
+    raw_tokens = re.findall(r"\b\w+\b", text, flags=re.UNICODE)
+    return [t for t in raw_tokens if t.isalpha()]
+
+
+def load_docs(root: str, limit: int = None) -> list:
+    paths = []
+    for dirpath, _, files in os.walk(root):
+        paths.extend(os.path.join(dirpath, name) for name in files if name.endswith(".txt"))
+    paths.sort()
+    docs = []
+    for path in paths[:limit] if limit else paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            docs.append(f.read())
+    return docs
+
+
+# --- Best-of-N wall time for turning every document into its vocab line ---
+def time_run(fn, docs: list, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            fn(doc)
+        took = time.perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best
+
+
+# --- Peak extra memory while producing the tokens of one document ---
+def peak_memory(fn, doc: str) -> int:
+    tracemalloc.start()
+    fn(doc)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the single-pass tokenizer against findall + isalpha"
+    )
+    parser.add_argument("corpus", nargs="?", default="inverted-index/data/travel",
+                        help="Directory of text files (default: inverted-index/data/travel)")
+    parser.add_argument("--limit", type=int, help="Use at most this many files")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Timing runs per variant; the fastest is reported")
+    parser.add_argument("--stopwords", default="en,ar",
+                        help="Stop-word lists for the filtered variant")
+    args = parser.parse_args()
+
+    docs = load_docs(args.corpus, args.limit)
+    if not docs:
+        parser.error(f"no .txt files under {args.corpus}")
+    size = sum(len(d.encode("utf-8")) for d in docs)
+    print(f"{len(docs)} documents, {size / 1e6:.1f} MB from {args.corpus}")
+
+    plain = Tokenizer()
+    filtered = Tokenizer(lowercase=True, stopwords=load_stopwords(args.stopwords),
+                         max_length=40)
+    # (name, vocab line of a document, tokens of a document without the output line)
+    variants = [
+        ("findall+isalpha", lambda d: " ".join(legacy_tokens(d)), legacy_tokens),
+        ("tokenizer", lambda d: " ".join(plain([d])), lambda d: deque(plain([d]), maxlen=0)),
+        ("tokenizer+lower+stop", lambda d: " ".join(filtered([d])),
+         lambda d: deque(filtered([d]), maxlen=0)),
+    ]
+
+    # The plain tokenizer must reproduce the old output exactly
+    mismatches = sum(legacy_tokens(d) != list(plain([d])) for d in docs)
+    tokens = sum(len(legacy_tokens(d)) for d in docs)
+    print(f"{tokens} tokens, {mismatches} documents differ from findall+isalpha\n")
+
+    largest = max(docs, key=len)
+    base = None
+    print(f"{'variant':<22}{'seconds':>9}{'MB/s':>8}{'Mtok/s':>8}{'speedup':>9}{'peak KB':>9}")
+    for name, fn, consume in variants:
+        took = time_run(fn, docs, args.repeat)
+        base = base or took
+        peak = peak_memory(consume, largest)
+        print(f"{name:<22}{took:>9.3f}{size / 1e6 / took:>8.1f}{tokens / 1e6 / took:>8.2f}"
+              f"{base / took:>8.2f}x{peak / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+import argparse
+import heapq
+import itertools
+import json
+import os
+import shutil
+import time
+import zlib
+from collections import Counter
+import multiprocessing
+
+from mapping_store import read_mapping_log
+from segments import SEGMENT_RE, SegmentReader
+
+# (mapping, run_dir, partitions, spill_postings) of this map worker, set by _init_worker
+_worker = None
+
+
+# --- Load url_mapping (TSV log or legacy JSON) ---
+def load_mapping(path: str) -> dict:
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return read_mapping_log(path)[0]
+
+
+# --- Split a crawl output into map tasks ---
+# Vocab files go out in batches of `batch` paths. Every segment is a task of
+# its own, together with the newer segments of its directory, whose records
+# hide older versions of a document.
+def list_tasks(root: str, batch: int = 512):
+    files = []
+    for dirpath, _, names in os.walk(root):
+        names.sort()
+        files.extend(os.path.join(dirpath, n) for n in names
+                     if n.startswith("vocab_") and n.endswith(".txt"))
+        segs = [os.path.join(dirpath, n) for n in names if SEGMENT_RE.match(n)]
+        for i, path in enumerate(segs):
+            yield ("segment", [path] + segs[i + 1:])
+        while len(files) >= batch:
+            yield ("files", files[:batch])
+            files = files[batch:]
+    if files:
+        yield ("files", files)
+
+
+def iter_task(task):
+    kind, paths = task
+    if kind == "segment":
+        skip = set()
+        for newer in paths[1:]:
+            with SegmentReader(newer) as seg:
+                skip.update(seg.index)
+        with SegmentReader(paths[0]) as seg:
+            yield from seg.items(skip)
+        return
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            yield os.path.basename(path)[6:-4], f.read()
+
+
+def partition_of(term: str, partitions: int) -> int:
+    # crc32 rather than hash(): the same term must land in the same partition in every process
+    return zlib.crc32(term.encode("utf-8")) % partitions
+
+
+def _init_worker(mapping, run_dir, partitions, spill_postings):
+    global _worker
+    _worker = (mapping, run_dir, partitions, spill_postings)
+
+
+# --- Write one sorted run per partition: "term\turl|count; url|count" lines ---
+def _spill(buffer: dict, run_dir: str, partitions: int, name: str) -> list:
+    runs = []
+    files = {}
+    try:
+        for term in sorted(buffer):
+            p = partition_of(term, partitions)
+            f = files.get(p)
+            if f is None:
+                path = os.path.join(run_dir, f"p{p:05d}-{name}.run")
+                f = files[p] = open(path, "w", encoding="utf-8")
+                runs.append((p, path))
+            f.write(f"{term}\t{'; '.join(buffer[term])}\n")
+    finally:
+        for f in files.values():
+            f.close()
+    buffer.clear()
+    return runs
+
+
+# --- Map + combine: one task in, sorted run files out ---
+# Each document's terms are counted once (the combiner step), then buffered
+# until spill_postings postings are held and spilled as sorted runs (one per
+# partition), so a worker's memory stays bounded however big the task is.
+def map_task(task):
+    mapping, run_dir, partitions, spill_postings = _worker
+    buffer = {}
+    held = spills = 0
+    runs = []
+    docs = missing = 0
+    name = f"{os.getpid()}-{time.monotonic_ns()}"
+    for key, text in iter_task(task):
+        url = key if mapping is None else mapping.get(key)
+        if url is None:
+            missing += 1
+            continue
+        docs += 1
+        counts = Counter(text.split())
+        for term, count in counts.items():
+            postings = buffer.get(term)
+            if postings is None:
+                buffer[term] = [f"{url}|{count}"]
+            else:
+                postings.append(f"{url}|{count}")
+        held += len(counts)
+        if held >= spill_postings:
+            runs.extend(_spill(buffer, run_dir, partitions, f"{name}-{spills}"))
+            held = 0
+            spills += 1
+    runs.extend(_spill(buffer, run_dir, partitions, f"{name}-{spills}"))
+    return runs, docs, missing
+
+
+# --- Merge sorted run files into one sorted stream of (term, postings text) ---
+# Lines compare like their terms because tab sorts before any token character.
+def merge_runs(paths: list):
+    files = [open(path, "r", encoding="utf-8") for path in paths]
+    try:
+        lines = heapq.merge(*files)
+        for term, group in itertools.groupby(lines, key=lambda line: line[:line.index("\t")]):
+            postings = [line[len(term) + 1:-1] for line in group]
+            if len(postings) == 1:
+                yield term, postings[0]
+                continue
+            # Same rule as CombinerIndex/ReducerIndex: counts of one URL add up
+            counts = {}
+            for entry in "; ".join(postings).split("; "):
+                url, _, count = entry.rpartition("|")
+                counts[url] = counts.get(url, 0) + int(count)
+            yield term, "; ".join(f"{url}|{count}" for url, count in counts.items())
+    finally:
+        for f in files:
+            f.close()
+
+
+# --- Reduce one partition into part-r-NNNNN ---
+# More than fan_in runs are first merged fan_in at a time into bigger runs,
+# so the number of open files stays bounded.
+def reduce_partition(partition: int, runs: list, out_dir: str, fan_in: int = 128) -> int:
+    level = 0
+    while len(runs) > fan_in:
+        merged = []
+        for i in range(0, len(runs), fan_in):
+            group = runs[i:i + fan_in]
+            path = f"{group[0]}.m{level}"
+            with open(path, "w", encoding="utf-8") as f:
+                for term, postings in merge_runs(group):
+                    f.write(f"{term}\t{postings}\n")
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+        level += 1
+    terms = 0
+    tmp = os.path.join(out_dir, f".part-r-{partition:05d}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        for term, postings in merge_runs(runs):
+            f.write(f"{term}\t{postings}\n")
+            terms += 1
+    os.replace(tmp, os.path.join(out_dir, f"part-r-{partition:05d}"))
+    for run in runs:
+        os.remove(run)
+    return terms
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build the inverted index (same output as the Hadoop job) with local processes"
+    )
+    parser.add_argument("input_dir", help="Crawl output: vocab_<hash>.txt files and/or .seg segments")
+    parser.add_argument("mapping", nargs="?",
+                        help="url_mapping.tsv or url_mapping.json (without it, postings name "
+                             "documents by their hash)")
+    parser.add_argument("output_dir", help="Directory for part-r-NNNNN files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Map and reduce processes")
+    parser.add_argument("--partitions", type=int,
+                        help="Output part files, each reduced by one process (default: --workers)")
+    parser.add_argument("--spill-postings", type=int, default=1_000_000,
+                        help="Postings a map worker buffers before spilling a sorted run to disk")
+    parser.add_argument("--tmp-dir", help="Directory for run files (default: <output_dir>/_tmp)")
+    parser.add_argument("--binary", metavar="DIR",
+                        help="Also convert the index into the binary postings format "
+                             "(postings.py) in DIR; needs the mapping")
+    args = parser.parse_args()
+    partitions = args.partitions or args.workers
+    if args.binary and not args.mapping:
+        parser.error("--binary needs the URL mapping, which fixes the doc ID order")
+
+    start = time.time()
+    mapping = None
+    if args.mapping:
+        mapping = load_mapping(args.mapping)
+        print(f"Loaded {len(mapping)} URL mappings")
+
+    # Replace earlier index output, like DriverIndex
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name in os.listdir(args.output_dir):
+        if name.startswith("part-r-") or name == "_SUCCESS":
+            os.remove(os.path.join(args.output_dir, name))
+    run_dir = args.tmp_dir or os.path.join(args.output_dir, "_tmp")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+
+    # Map + combine: where fork exists the mapping reaches the workers without pickling
+    methods = multiprocessing.get_all_start_methods()
+    ctx = multiprocessing.get_context("fork" if "fork" in methods else None)
+    runs = [[] for _ in range(partitions)]
+    docs = missing = 0
+    with ctx.Pool(args.workers, initializer=_init_worker,
+              initargs=(mapping, run_dir, partitions, args.spill_postings)) as pool:
+        for task_runs, task_docs, task_missing in pool.imap_unordered(
+                map_task, list_tasks(args.input_dir)):
+            for p, path in task_runs:
+                runs[p].append(path)
+            docs += task_docs
+            missing += task_missing
+        mapped = time.time()
+        print(f"Mapped {docs} documents into {sum(map(len, runs))} sorted runs "
+              f"in {mapped - start:.1f}s")
+        if missing:
+            print(f"Documents without a URL mapping (skipped): {missing}")
+
+        # Shuffle + reduce: every partition is merged by its own process
+        terms = sum(pool.starmap(reduce_partition,
+                                 [(p, sorted(runs[p]), args.output_dir) for p in range(partitions)]))
+    shutil.rmtree(run_dir, ignore_errors=True)
+    open(os.path.join(args.output_dir, "_SUCCESS"), "w").close()
+    print(f"Wrote {terms} terms to {partitions} part files in {args.output_dir} "
+          f"in {time.time() - start:.1f}s")
+    if args.binary:
+        from postings import build_binary
+        build_binary(args.output_dir, mapping, args.binary)
+        print(f"Binary postings written to {args.binary}")
+
+
+if __name__ == "__main__":
+    main()
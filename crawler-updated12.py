@@ -2,15 +2,38 @@
 import os
 import re
 import argparse
+import asyncio
 import requests
 import hashlib
-import json
+import sys
 import time
-import random
+import threading
+from collections import deque
 from urllib.robotparser import RobotFileParser
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 from requests.utils import requote_uri
+from archive import WarcArchive
+from batched_writer import BatchedLineWriter
+from mapping_store import MappingStore
+from metrics import CrawlMetrics, MetricsExporter, aiohttp_trace
+from parse_pool import ParsePool, extract_page_timed, parse_page_timed
+from profiler import CrawlProfiler, no_span
+from parsers import PARSERS, get_parser, parse_bs4
+from http_cache import HttpCache
+from frontier import (Frontier, FreshnessPriority, FrontierStore, PatternPriority,
+                      PersistentFrontier, bfs_priority, parse_url_boosts)
+from politeness import HostRateLimiter, parse_host_delays
+from scheduler import SeedScheduler
+from segments import CODECS, VocabSegments
+from shard import ShardRouter, SocketTransport, launch, parse_shard, shard_dir
+from simhash import NearDupFilter
+from tokenizer import Tokenizer, default_tokenizer, load_stopwords
+from visited_store import open_visited
+
+try:
+    import aiohttp
+except ImportError:  # async mode is optional
+    aiohttp = None
 
 # --- HTTP headers to mimic a real browser ---
 hdrs = {
@@ -23,108 +46,526 @@ hdrs = {
 MAX_RETRIES = 3
 RETRY_BACKOFF = 2  # seconds
 
+# Guards visited/mapping/master file when seeds are crawled by several workers
+store_lock = threading.Lock()
+
 # --- Utility: shorten and hash URL for safe filenames ---
 def encode_name(url: str) -> str:
     h = hashlib.sha256(url.encode('utf-8')).hexdigest()
     return h[:16]
 
-# --- Crawl a single seed under a topic ---
-def crawl_seed(topic: str, seed: str, max_pages: int, master_file: str,
-               output_dir: str, mapping: dict, visited: set):
-    # Prepare topic directory
-    topic_dir = os.path.join(output_dir, topic)
-    os.makedirs(topic_dir, exist_ok=True)
+# --- Utility: normalize a raw href into the canonical form we dedupe on ---
+def canonicalize(raw_url: str) -> str:
+    safe_url = requote_uri(raw_url.strip())
+    parsed = urlparse(safe_url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}".rstrip('/')
+
+# --- Single fetch attempt: ("ok", resp), ("skip", None) or ("retry", wait) ---
+# A 304 answer to conditional headers also counts as "ok".
+def fetch_once(session: requests.Session, canonical: str, attempt: int,
+               headers: dict = None, metrics: CrawlMetrics = None):
+    host = urlparse(canonical).netloc.lower()
+    try:
+        start = time.perf_counter()
+        resp = session.get(canonical, headers={**hdrs, **headers} if headers else hdrs,
+                           timeout=10)
+        if metrics is not None:
+            # requests has read the whole body by now; elapsed stops at the headers
+            took = time.perf_counter() - start
+            ttfb = resp.elapsed.total_seconds()
+            metrics.response(host, resp.status_code, len(resp.content), took,
+                             ttfb=ttfb, download=max(took - ttfb, 0.0))
+        if resp.status_code == 429:
+            retry_after = resp.headers.get('Retry-After')
+            wait = int(retry_after) if retry_after and retry_after.isdigit() else RETRY_BACKOFF * attempt
+            print(f"429 Too Many Requests for {canonical}, waiting {wait}s")
+            if metrics is not None:
+                metrics.inc("crawler_rate_limited_total", host=host)
+            return "retry", wait
+        resp.raise_for_status()
+        return "ok", resp
+    except requests.exceptions.HTTPError as he:
+        code = he.response.status_code
+        if metrics is not None:
+            metrics.inc("crawler_fetch_errors_total", host=host, kind="http")
+        if code in (404, 410):
+            print(f"Skipping {canonical} (HTTP {code})")
+            return "skip", None
+        print(f"HTTPError {code} on {canonical}, attempt {attempt}")
+    except requests.exceptions.RequestException as rexc:
+        if metrics is not None:
+            metrics.inc("crawler_fetch_errors_total", host=host, kind="network")
+        print(f"RequestException on {canonical}, attempt {attempt}: {rexc}")
+    sleep = RETRY_BACKOFF * attempt
+    print(f"Retrying in {sleep}s...")
+    return "retry", sleep
+
+# --- Fetch one URL with retry and 429 handling (blocking) ---
+def fetch_page(session: requests.Session, canonical: str):
+    for attempt in range(1, MAX_RETRIES + 1):
+        outcome, value = fetch_once(session, canonical, attempt)
+        if outcome != "retry":
+            return value
+        time.sleep(value)
+    print(f"Failed to fetch {canonical} after {MAX_RETRIES} attempts, skipping.")
+    return None
+
+# --- Record a crawled page: master list, mapping and vocab file ---
+# Returns the hash of the page this one near-duplicates (no vocab file is
+# written then), or None. With segments the vocab line is appended to the
+# topic's segment files instead of a vocab_<hash>.txt of its own.
+def store_page(topic_dir: str, canonical: str, tokens, master: BatchedLineWriter,
+               mapping: dict, visited: set, near_dup: NearDupFilter = None,
+               segments: VocabSegments = None):
+    safe_name = encode_name(canonical)
+    vocab_path = os.path.join(topic_dir, f"vocab_{safe_name}.txt")
+    original = None
+    if near_dup is not None:
+        tokens = list(tokens)
+        original = near_dup.duplicate_of(safe_name, canonical, tokens)
+
+    # Mark visited & record (a recrawled page is already in the master list)
+    with store_lock:
+        recrawl = canonical in visited
+        if not recrawl:
+            visited.add(canonical)
+            mapping[safe_name] = canonical
+            master.write(canonical)
 
-    # Prepare robot parser for crawl-delay
+    if original is not None:
+        # A recrawled page may have turned into a duplicate since
+        if segments is not None:
+            if recrawl:
+                segments.delete(topic_dir, safe_name)
+        elif os.path.exists(vocab_path):
+            os.remove(vocab_path)
+        return original
+
+    if segments is not None:
+        segments.write(topic_dir, safe_name, ' '.join(tokens))
+        return None
+
+    # Write vocab file (tokens may be a lazy iterator, consumed here)
+    os.makedirs(os.path.dirname(vocab_path), exist_ok=True)
+    with open(vocab_path, "w", encoding="utf-8") as vf:
+        vf.write(' '.join(tokens))
+    return None
+
+# --- Robots crawl-delay for a seed (blocking) ---
+def read_robots_delay(seed: str) -> float:
     rp = RobotFileParser()
     rp.set_url(f"{seed.rstrip('/')}/robots.txt")
     try:
         rp.read()
     except:
         pass
-    crawl_delay = rp.crawl_delay(hdrs['User-Agent']) or 0
+    return rp.crawl_delay(hdrs['User-Agent']) or 0
+
+# --- Crawl state for a single seed, advanced one page at a time ---
+# The caller decides when the host may be fetched (see politeness.py); step()
+# never sleeps. Failed attempts are parked in self.retry and the host is
+# deferred by the backoff / Retry-After instead. With a parse_pool, fetched
+# bodies are parsed in another process and their links are folded back in
+# (collect()) on a later step. With an http_cache the crawl is a recrawl:
+# pages from earlier runs are revalidated instead of skipped, and `seen`
+# (shared by all seeds of this run) takes over visited's dedupe role. With a
+# router (sharded crawls, shard.py) links into other seeds' sites are handed
+# to it, and links for this seed arrive in self.inbox from other threads.
+# Fetch, parse and store timings go to metrics (metrics.py); quiet drops the
+# per-page progress line. With a profiler (--profile) every stage runs in a
+# profiler span. With an archive (--archive) the raw response of every page
+# that gets parsed is kept, so archive.py reprocess can retokenize offline.
+class SeedCrawl:
+    def __init__(self, topic: str, seed: str, max_pages: int, master: BatchedLineWriter,
+                 output_dir: str, mapping: dict, visited: set, limiter: HostRateLimiter,
+                 session: requests.Session = None, progress=None, priority=bfs_priority,
+                 frontier_memory: int = 100_000, frontier_store: FrontierStore = None,
+                 parse=parse_bs4, parse_pool: ParsePool = None, tokenize=default_tokenizer,
+                 http_cache: HttpCache = None, seen: set = None,
+                 near_dup: NearDupFilter = None, segments: VocabSegments = None,
+                 router: ShardRouter = None, metrics: CrawlMetrics = None,
+                 quiet: bool = False, profiler: CrawlProfiler = None,
+                 archive: WarcArchive = None):
+        self.topic = topic
+        self.seed = seed
+        self.max_pages = max_pages
+        self.master = master
+        self.mapping = mapping
+        self.visited = visited
+        self.limiter = limiter
+        self.session = session or requests.Session()
+        self.progress = progress
+        self.parse = parse
+        self.parse_pool = parse_pool
+        self.tokenize = tokenize
+        self.http_cache = http_cache
+        self.near_dup = near_dup
+        self.segments = segments
+        self.router = router
+        self.metrics = metrics if metrics is not None else CrawlMetrics()
+        self.quiet = quiet
+        self.profiler = profiler
+        self.archive = archive
+        self.span = profiler.span if profiler is not None else no_span
+        self.inbox = deque()    # (url, depth) routed here by other seeds / shards
+        self.seen = visited if seen is None else seen
+        self.pending = deque()  # (canonical, depth, future, meta) of pages being parsed
+        self.host = urlparse(seed).netloc.lower()
+        self.base = seed.rstrip('/')
+        self.topic_dir = os.path.join(output_dir, topic)
+        os.makedirs(self.topic_dir, exist_ok=True)
+        key = encode_name(f"{topic}\t{seed}")
+        if frontier_store is not None:
+            self.frontier = PersistentFrontier(frontier_store, key, priority, visited)
+        else:
+            spill_dir = os.path.join(output_dir, ".frontier", key)
+            self.frontier = Frontier(priority, max_in_memory=frontier_memory, spill_dir=spill_dir)
+        self.enqueue(seed, 0)
+        # A resumed persistent frontier remembers how many pages this seed already has
+        self.count = self.frontier.pages
+        self.depth = 0
+        self.retry = None  # (canonical, depth, attempt) waiting for another try
+        if router is not None:
+            router.register(self)
+        self.metrics.track(self)
 
-    session = requests.Session()
-    queue = [seed]
-    seen = set()
-    count = 0
-    base = seed.rstrip('/')
+    @property
+    def done(self) -> bool:
+        # Only a check; finish() tears the crawl down
+        return not self.pending and (
+            self.count >= self.max_pages or
+            (not self.frontier and self.retry is None and not self.inbox))
 
-    while queue and count < max_pages:
-        raw_url = queue.pop(0).strip()
+    def finish(self, failed: bool = False) -> bool:
+        # Called once done, or with failed after step() raised; False if the
+        # crawl has to go on after all (never when failed)
+        if self.router is not None:
+            # Unless the seed is full or failed, links that arrived in the meantime keep it going
+            if not self.router.finish(self, drop=failed or self.count >= self.max_pages):
+                return False
+        self.metrics.untrack(self)
+        self.frontier.close()
+        return True
+
+    def enqueue(self, raw_url: str, depth: int):
         # Normalize and canonicalize
-        safe_url = requote_uri(raw_url)
-        parsed = urlparse(safe_url)
-        canonical = f"{parsed.scheme}://{parsed.netloc}{parsed.path}".rstrip('/')
+        canonical = canonicalize(raw_url)
         # Skip login or empty
         if not canonical or any(x in canonical.lower() for x in ['signin', 'login']):
+            return
+        # Dedupe (the frontier drops URLs it has already queued)
+        if canonical in self.seen:
+            return
+        self.frontier.push(canonical, depth)
+
+    def next_url(self):
+        while self.inbox:
+            self.enqueue(*self.inbox.popleft())
+        # Pop until we find a URL worth fetching
+        while True:
+            item = self.frontier.pop()
+            if item is None:
+                return None
+            canonical, self.depth = item
+            # Another seed may have fetched it since it was queued
+            if canonical not in self.seen:
+                return canonical
+
+    def on_page(self, canonical: str, tokens, links: list, depth: int, meta: tuple = None):
+        # Enqueue same-domain links, durably before the page counts as visited
+        with self.span("links"):
+            for abs_url in links:
+                if abs_url.startswith(self.base):
+                    self.enqueue(abs_url, depth + 1)
+                elif self.router is not None:
+                    self.router.route(abs_url, depth + 1)
+            self.frontier.flush()
+
+        if tokens is None:
+            # Unchanged since the last crawl: the vocab file is still current
+            status = kind = "unchanged"
+        else:
+            start = time.perf_counter()
+            with self.span("store"):
+                original = store_page(self.topic_dir, canonical, tokens, self.master,
+                                      self.mapping, self.visited, self.near_dup, self.segments)
+                if meta is not None:
+                    self.http_cache.put(canonical, meta, links)
+            self.metrics.observe("crawler_store_seconds", time.perf_counter() - start)
+            status = "crawled" if original is None else f"near-duplicate of {original}"
+            kind = "crawled" if original is None else "near_duplicate"
+        if self.seen is not self.visited:
+            with store_lock:
+                self.seen.add(canonical)
+        self.frontier.mark_stored(canonical)
+
+        self.count += 1
+        self.metrics.inc("crawler_pages_total", host=self.host, status=kind)
+        if not self.quiet:
+            print(f"[{self.topic}] seed {self.seed} {status} {self.count}/{self.max_pages}: {canonical}")
+        if self.progress:
+            self.progress(self.count)
+
+    def revalidate(self, canonical: str, status: int, headers, body: bytes):
+        # (meta, cached links); cached links mean the page is unchanged
+        if self.http_cache is None:
+            return None, None
+        return self.http_cache.revalidate(canonical, status, headers, body)
+
+    def request_headers(self, canonical: str) -> dict:
+        if self.http_cache is None:
+            return None
+        return self.http_cache.conditional_headers(canonical)
+
+    def on_retry(self, canonical: str, attempt: int, wait: float):
+        self.limiter.defer(self.host, wait)
+        if attempt < MAX_RETRIES:
+            self.retry = (canonical, self.depth, attempt + 1)
+            self.metrics.inc("crawler_retries_total", host=self.host)
+        else:
+            self.metrics.inc("crawler_failed_total", host=self.host)
+            print(f"Failed to fetch {canonical} after {MAX_RETRIES} attempts, skipping.")
+
+    def collect(self, wait: bool = False):
+        # Store pages the parse pool has finished, in fetch order; with wait,
+        # block for at least the oldest one
+        while self.pending and (wait or self.pending[0][2].done()):
+            canonical, depth, future, meta = self.pending.popleft()
+            wait = False
+            try:
+                tokens, links, timings = future.result()
+            except Exception as exc:
+                print(f"Failed to parse {canonical}: {exc!r}")
+                self.frontier.release(canonical)
+                continue
+            self.parsed_elsewhere(timings)
+            self.on_page(canonical, tokens, links, depth, meta)
+
+    def keep_raw(self, canonical: str, status: int, headers, body: bytes):
+        # Archive the response about to be parsed (cached/unchanged pages are already in it)
+        if self.archive is not None:
+            with self.span("store"):
+                self.archive.write(self.topic, canonical, status, headers, body)
+
+    def parsed_elsewhere(self, timings: tuple):
+        # Timings of a page parsed in the parse pool, outside this process's spans
+        self.metrics.parsed(*timings)
+        if self.profiler is not None:
+            self.profiler.add("parse", timings[0])
+            self.profiler.add("tokenize", timings[1])
+
+    def step(self):
+        # Prepare robot parser for crawl-delay (once per host)
+        if not self.limiter.knows(self.host):
+            with self.span("fetch"):
+                self.limiter.set_crawl_delay(self.host, read_robots_delay(self.seed))
+
+        self.collect()
+        if self.count + len(self.pending) >= self.max_pages:
+            # Enough pages fetched; wait for the parsers to catch up
+            self.collect(wait=True)
+            return
+        if self.retry:
+            (canonical, self.depth, attempt), self.retry = self.retry, None
+        else:
+            canonical, attempt = self.next_url(), 1
+        if canonical is None:
+            # Nothing queued yet; the pages still being parsed may add links
+            self.collect(wait=True)
+            return
+
+        # Fetch with retry and handle 429
+        with self.span("fetch"):
+            outcome, value = fetch_once(self.session, canonical, attempt,
+                                        self.request_headers(canonical), self.metrics)
+        self.limiter.record_fetch(self.host)
+        if outcome == "retry":
+            self.on_retry(canonical, attempt, value)
+            return
+        if outcome != "ok":
+            return
+        meta, cached_links = self.revalidate(canonical, value.status_code, value.headers,
+                                             value.content)
+        if cached_links is not None:
+            self.on_page(canonical, None, cached_links, self.depth)
+            return
+        self.keep_raw(canonical, value.status_code, value.headers, value.content)
+        if self.parse_pool is not None:
+            self.frontier.hold()
+            future = self.parse_pool.submit(value.content, value.encoding, canonical)
+            self.pending.append((canonical, self.depth, future, meta))
+        else:
+            tokens, links, timings = extract_page_timed(value.text, canonical, self.parse,
+                                                        self.tokenize, self.span)
+            self.metrics.parsed(*timings)
+            self.on_page(canonical, tokens, links, self.depth, meta)
+
+# --- Crawl a single seed under a topic ---
+def crawl_seed(topic: str, seed: str, max_pages: int, master: BatchedLineWriter,
+               output_dir: str, mapping: dict, visited: set, progress=None,
+               limiter: HostRateLimiter = None, **crawl_opts):
+    limiter = limiter or HostRateLimiter()
+    crawl = SeedCrawl(topic, seed, max_pages, master, output_dir, mapping, visited,
+                      limiter, progress=progress, **crawl_opts)
+    while not (crawl.done and crawl.finish()):
+        crawl.step()
+        if crawl.done:
             continue
-        # Dedupe
-        if canonical in visited or canonical in seen:
+        # Polite crawl delay between requests
+        wait = limiter.wait_time(crawl.host)
+        crawl.metrics.observe("crawler_politeness_wait_seconds", wait)
+        if not crawl.quiet:
+            print(f"Sleeping {wait:.1f}s before next URL")
+        with crawl.span("politeness"):
+            time.sleep(wait)
+    return crawl.count
+
+# --- Async mode: per-host concurrency shared by every seed on that host ---
+class AsyncHost:
+    def __init__(self, per_host: int):
+        self.slots = asyncio.Semaphore(per_host)
+        self.turn = asyncio.Lock()
+        self.robots = None
+
+    async def wait_turn(self, crawl: SeedCrawl):
+        # Space request starts by the limiter's crawl-delay + random politeness
+        async with self.turn:
+            wait = crawl.limiter.wait_time(crawl.host)
+            crawl.metrics.observe("crawler_politeness_wait_seconds", wait)
+            if crawl.profiler is not None:
+                crawl.profiler.add("politeness", wait)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            crawl.limiter.record_fetch(crawl.host)
+
+async def read_crawl_delay(http, seed: str) -> float:
+    rp = RobotFileParser()
+    try:
+        async with http.get(f"{seed.rstrip('/')}/robots.txt", headers=hdrs) as resp:
+            if resp.status < 400:
+                rp.parse((await resp.text()).splitlines())
+    except Exception:
+        pass
+    return rp.crawl_delay(hdrs['User-Agent']) or 0
+
+async def fetch_page_async(http, host: AsyncHost, crawl: SeedCrawl,
+                           inflight: asyncio.Semaphore, canonical: str):
+    # Returns (status, headers, body, charset) or None
+    limiter = crawl.limiter
+    metrics = crawl.metrics
+    extra = crawl.request_headers(canonical)
+    headers = {**hdrs, **extra} if extra else hdrs
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            async with host.slots:
+                await host.wait_turn(crawl)
+                async with inflight:
+                    start = time.perf_counter()
+                    async with http.get(canonical, headers=headers) as resp:
+                        # DNS, connect and TTFB are recorded by the session's trace hooks
+                        if resp.status >= 400:
+                            metrics.response(crawl.host, resp.status, 0,
+                                             time.perf_counter() - start)
+                        if resp.status == 429:
+                            retry_after = resp.headers.get('Retry-After')
+                            wait = int(retry_after) if retry_after and retry_after.isdigit() else RETRY_BACKOFF * attempt
+                            print(f"429 Too Many Requests for {canonical}, waiting {wait}s")
+                            metrics.inc("crawler_rate_limited_total", host=crawl.host)
+                            if attempt < MAX_RETRIES:
+                                metrics.inc("crawler_retries_total", host=crawl.host)
+                            # Hold the host back so sibling seeds respect Retry-After too
+                            limiter.defer(crawl.host, wait)
+                            continue
+                        resp.raise_for_status()
+                        headers_at = time.perf_counter()
+                        body = await resp.read()
+                        end = time.perf_counter()
+                        metrics.response(crawl.host, resp.status, len(body), end - start,
+                                         download=end - headers_at)
+                        # Awaits interleave, so a fetch is timed instead of run in a span
+                        if crawl.profiler is not None:
+                            crawl.profiler.add("fetch", end - start)
+                        return resp.status, resp.headers, body, resp.charset
+        except aiohttp.ClientResponseError as he:
+            metrics.inc("crawler_fetch_errors_total", host=crawl.host, kind="http")
+            if he.status in (404, 410):
+                print(f"Skipping {canonical} (HTTP {he.status})")
+                return None
+            print(f"HTTPError {he.status} on {canonical}, attempt {attempt}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as rexc:
+            metrics.inc("crawler_fetch_errors_total", host=crawl.host, kind="network")
+            print(f"RequestException on {canonical}, attempt {attempt}: {rexc!r}")
+        sleep = RETRY_BACKOFF * attempt
+        print(f"Retrying in {sleep}s...")
+        if attempt < MAX_RETRIES:
+            metrics.inc("crawler_retries_total", host=crawl.host)
+        limiter.defer(crawl.host, sleep)
+    metrics.inc("crawler_failed_total", host=crawl.host)
+    print(f"Failed to fetch {canonical} after {MAX_RETRIES} attempts, skipping.")
+    return None
+
+async def crawl_seed_async(http, hosts: dict, inflight: asyncio.Semaphore, per_host: int,
+                           crawl: SeedCrawl):
+    host = hosts.setdefault(crawl.host, AsyncHost(per_host))
+    if host.robots is None:
+        host.robots = asyncio.ensure_future(read_crawl_delay(http, crawl.seed))
+    delay = await host.robots
+    if not crawl.limiter.knows(crawl.host):
+        crawl.limiter.set_crawl_delay(crawl.host, delay)
+
+    loop = asyncio.get_running_loop()
+    while not (crawl.done and crawl.finish()):
+        canonical = crawl.next_url()
+        if canonical is None:
+            # done re-checks the inbox, which routed links may have filled
+            continue
+        depth = crawl.depth
+        page = await fetch_page_async(http, host, crawl, inflight, canonical)
+        if page is None:
             continue
-        seen.add(canonical)
 
-        # Fetch with retry and handle 429
-        success = False
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                resp = session.get(canonical, headers=hdrs, timeout=10)
-                if resp.status_code == 429:
-                    retry_after = resp.headers.get('Retry-After')
-                    wait = int(retry_after) if retry_after and retry_after.isdigit() else RETRY_BACKOFF * attempt
-                    print(f"429 Too Many Requests for {canonical}, waiting {wait}s")
-                    time.sleep(wait)
-                    continue
-                resp.raise_for_status()
-                success = True
-                break
-            except requests.exceptions.HTTPError as he:
-                code = he.response.status_code
-                if code in (404, 410):
-                    print(f"Skipping {canonical} (HTTP {code})")
-                    break
-                print(f"HTTPError {code} on {canonical}, attempt {attempt}")
-            except requests.exceptions.RequestException as rexc:
-                print(f"RequestException on {canonical}, attempt {attempt}: {rexc}")
-            sleep = RETRY_BACKOFF * attempt
-            print(f"Retrying in {sleep}s...")
-            time.sleep(sleep)
-        if not success:
-            print(f"Failed to fetch {canonical} after {MAX_RETRIES} attempts, skipping.")
+        status, headers, body, charset = page
+        meta, cached_links = crawl.revalidate(canonical, status, headers, body)
+        if cached_links is not None:
+            crawl.on_page(canonical, None, cached_links, depth)
             continue
+        # Gzipping and writing the archive record blocks too; it runs
+        # alongside the parse
+        archived = None
+        if crawl.archive is not None:
+            archived = loop.run_in_executor(None, crawl.keep_raw, canonical, status, headers, body)
 
-        # Mark visited & record
-        visited.add(canonical)
-        with open(master_file, "a", encoding="utf-8") as mf:
-            mf.write(canonical + "\n")
-
-        # Extract tokens
-        soup = BeautifulSoup(resp.text, "html.parser")
-        text = soup.get_text(separator=" ")
-        raw_tokens = re.findall(r"\b\w+\b", text, flags=re.UNICODE)
-        tokens = [t for t in raw_tokens if t.isalpha()]
-
-        # Write vocab file
-        safe_name = encode_name(canonical)
-        mapping[safe_name] = canonical
-        vocab_path = os.path.join(topic_dir, f"vocab_{safe_name}.txt")
-        os.makedirs(os.path.dirname(vocab_path), exist_ok=True)
-        with open(vocab_path, "w", encoding="utf-8") as vf:
-            vf.write(' '.join(tokens))
-
-        # Enqueue same-domain links
-        for link in soup.find_all("a", href=True):
-            abs_url = urljoin(canonical, link["href"])
-            if abs_url.startswith(base) and abs_url not in visited and abs_url not in seen:
-                queue.append(abs_url)
-
-        count += 1
-        print(f"[{topic}] seed {seed} crawled {count}/{max_pages}: {canonical}")
+        # Parsing is CPU-bound; keep it off the event loop
+        if crawl.parse_pool is not None:
+            tokens, links, timings = await crawl.parse_pool.parse_async(body, charset, canonical)
+            crawl.parsed_elsewhere(timings)
+        else:
+            tokens, links, timings = await loop.run_in_executor(
+                None, parse_page_timed, body, charset, canonical, crawl.parse, crawl.tokenize,
+                crawl.span)
+            crawl.metrics.parsed(*timings)
+        if archived is not None:
+            await archived
+        crawl.on_page(canonical, tokens, links, depth, meta)
 
-        # Polite crawl delay between requests
-        total_delay = crawl_delay + random.uniform(1.0, 3.0)
-        print(f"Sleeping {total_delay:.1f}s before next URL")
-        time.sleep(total_delay)
+async def crawl_all_async(topics: dict, max_pages: int, master: BatchedLineWriter, output_dir: str,
+                          mapping: dict, visited: set, limiter: HostRateLimiter,
+                          concurrency: int, per_host: int, **crawl_opts):
+    inflight = asyncio.Semaphore(concurrency)
+    hosts = {}
+    timeout = aiohttp.ClientTimeout(total=10)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_host)
+    metrics = crawl_opts.get("metrics")
+    traces = [aiohttp_trace(metrics)] if metrics is not None else []
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector,
+                                     trace_configs=traces) as http:
+        tasks = [
+            crawl_seed_async(http, hosts, inflight, per_host,
+                             SeedCrawl(topic, seed, max_pages, master, output_dir,
+                                       mapping, visited, limiter, **crawl_opts))
+            for topic, seeds in topics.items() for seed in seeds
+        ]
+        await asyncio.gather(*tasks)
 
 # --- Main script ---
 def main():
@@ -137,27 +578,210 @@ def main():
                         help="Max pages to crawl per seed URL")
     parser.add_argument("--output-dir", default="output",
                         help="Root directory to store outputs")
+    parser.add_argument("--mode", choices=["sync", "threaded", "async"], default="sync",
+                        help="sync crawls seeds one by one; threaded runs seeds on a worker "
+                             "pool; async crawls all hosts concurrently")
+    parser.add_argument("--workers", type=int, default=16,
+                        help="Worker pool size (threaded mode)")
+    parser.add_argument("--concurrency", type=int, default=200,
+                        help="Max requests in flight across all hosts (async mode)")
+    parser.add_argument("--per-host", type=int, default=1,
+                        help="Max concurrent requests to a single host (async mode)")
+    parser.add_argument("--jitter", type=float, nargs=2, default=[1.0, 3.0],
+                        metavar=("MIN", "MAX"),
+                        help="Random politeness added to each host's crawl-delay (seconds)")
+    parser.add_argument("--host-delay", action="append", default=[], metavar="HOST=SECONDS",
+                        help="Override the crawl-delay for a host (repeatable)")
+    parser.add_argument("--url-boost", action="append", default=[], metavar="REGEX=SCORE",
+                        help="Add SCORE to the BFS depth of URLs matching REGEX; negative "
+                             "scores are crawled sooner (repeatable)")
+    parser.add_argument("--freshness", action="store_true",
+                        help="With --revalidate, queue pages that were never fetched first and "
+                             "the ones checked longest ago next")
+    parser.add_argument("--frontier-memory", type=int, default=100_000,
+                        help="Queued URLs kept in memory per seed before spilling to disk")
+    parser.add_argument("--visited-backend", choices=["set", "fingerprint"], default="set",
+                        help="set keeps full URLs in memory; fingerprint keeps 64-bit hashes in "
+                             "a memory-mapped <output-dir>/visited.fp")
+    parser.add_argument("--persist-frontier", action="store_true",
+                        help="Keep the crawl queue in <output-dir>/frontier.sqlite3 so an "
+                             "interrupted crawl resumes where it stopped")
+    parser.add_argument("--parser", choices=["auto"] + list(PARSERS), default="auto",
+                        help="HTML parser backend; auto uses selectolax or lxml when installed "
+                             "and falls back to BeautifulSoup")
+    parser.add_argument("--lowercase", action="store_true",
+                        help="Lowercase tokens before writing vocab files")
+    parser.add_argument("--stopwords", metavar="LISTS",
+                        help="Drop stop words: comma-separated built-in lists (en, ar) and/or "
+                             "files with one word per line")
+    parser.add_argument("--max-token-length", type=int, default=0,
+                        help="Drop tokens longer than this many characters (0 keeps all)")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="Parse pages in this many worker processes while fetching goes on "
+                             "(0 parses in the fetching thread)")
+    parser.add_argument("--parse-queue", type=int,
+                        help="Max pages waiting for or in the parse workers before fetchers "
+                             "pause (default 4 per worker)")
+    parser.add_argument("--revalidate", action="store_true",
+                        help="Recrawl the seeds, revalidating pages from earlier runs with "
+                             "conditional GETs (cache in <output-dir>/http_cache.sqlite3); "
+                             "unchanged pages are not parsed or rewritten")
+    parser.add_argument("--near-dup", type=int, metavar="BITS", default=-1,
+                        help="Skip pages whose SimHash (word 3-grams) is within BITS bits of an "
+                             "earlier page, e.g. 2; they are listed in duplicates.tsv instead of "
+                             "getting a vocab file (default off)")
+    parser.add_argument("--vocab-format", choices=["files", "segments"], default="files",
+                        help="files writes one vocab_<hash>.txt per page; segments appends the "
+                             "vocab lines to large segment-NNNNN.seg files per topic")
+    parser.add_argument("--segment-codec", choices=list(CODECS), default="deflate",
+                        help="Compression of each document in a segment (zstd needs zstandard)")
+    parser.add_argument("--segment-size", type=int, default=256,
+                        help="MB per segment file before a new one is started")
+    parser.add_argument("--archive", action="store_true",
+                        help="Keep the raw response of every crawled page in compressed WARC "
+                             "files under <output-dir>/archive, so archive.py reprocess can "
+                             "rebuild the vocab files without recrawling")
+    parser.add_argument("--archive-size", type=int, default=1024,
+                        help="MB per archive file before a new one is started")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="Crawl in this many processes, hosts split among them by hash; "
+                             "each writes <output-dir>/shards/NNN, merged at the end")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="Crawl only shard I of N (set by --shards, or per node together "
+                             "with --coordinator for multi-node crawls)")
+    parser.add_argument("--coordinator", metavar="ADDRESS",
+                        help="host:port or unix:/path of the shard coordinator (shard.py "
+                             "coordinator); with --shards, the address to listen on")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve crawl metrics on http://localhost:PORT/metrics (Prometheus "
+                             "text) and /metrics.json")
+    parser.add_argument("--metrics-file", metavar="PATH",
+                        help="Rewrite a JSON metrics snapshot to PATH every --metrics-interval "
+                             "seconds and at exit")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Seconds between --metrics-file snapshots")
+    parser.add_argument("--profile", choices=["spans", "cprofile", "sample"],
+                        help="Time each crawl stage (fetch, parse, tokenize, links, store, "
+                             "politeness); cprofile also profiles each stage, sample writes "
+                             "flame graph stacks. Written at exit and on SIGUSR1")
+    parser.add_argument("--profile-dir", metavar="DIR",
+                        help="Where --profile writes its files (default <output-dir>/profile)")
+    parser.add_argument("--profile-interval", type=float, default=0.005,
+                        help="Seconds between stack samples (--profile sample)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="No per-page and sleep lines; errors and summaries are still printed")
     args = parser.parse_args()
 
+    if args.mode == "async" and aiohttp is None:
+        parser.error("--mode async requires aiohttp (pip install aiohttp)")
+    if args.revalidate and args.persist_frontier:
+        parser.error("--revalidate recrawls from the seeds and cannot resume a "
+                     "--persist-frontier queue")
+    if args.freshness and not args.revalidate:
+        parser.error("--freshness orders the recrawl by the --revalidate cache; add --revalidate")
+    shard = None
+    if args.shard:
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as exc:
+            parser.error(f"--shard: {exc}")
+        if not args.coordinator:
+            parser.error("--shard needs --coordinator")
+    elif args.shards > 1:
+        # This process only coordinates; the shards are crawler processes of their own
+        sys.exit(launch(os.path.abspath(__file__), sys.argv[1:], args.shards, args.output_dir,
+                        args.coordinator or "127.0.0.1:0"))
+    try:
+        limiter = HostRateLimiter(jitter=tuple(args.jitter),
+                                  overrides=parse_host_delays(args.host_delay))
+    except ValueError as exc:
+        parser.error(f"--host-delay: {exc}")
+    try:
+        boosts = parse_url_boosts(args.url_boost)
+    except (ValueError, re.error) as exc:
+        parser.error(f"--url-boost: {exc}")
+    try:
+        parser_name, parse = get_parser(args.parser)
+    except ValueError as exc:
+        parser.error(f"--parser: {exc}")
+    print(f"Parsing pages with {parser_name}")
+    try:
+        stopwords = load_stopwords(args.stopwords) if args.stopwords else ()
+    except (OSError, ValueError) as exc:
+        parser.error(f"--stopwords: {exc}")
+    tokenize = Tokenizer(lowercase=args.lowercase, stopwords=stopwords,
+                         max_length=args.max_token_length)
+    metrics = CrawlMetrics()
+    crawl_opts = {
+        "priority": PatternPriority(boosts) if boosts else bfs_priority,
+        "frontier_memory": args.frontier_memory,
+        "parse": parse,
+        "tokenize": tokenize,
+        "metrics": metrics,
+        "quiet": args.quiet,
+    }
+    parse_pool = None
+    if args.parse_workers > 0:
+        parse_pool = ParsePool(parse, workers=args.parse_workers, max_pending=args.parse_queue,
+                               tokenize=tokenize)
+        crawl_opts["parse_pool"] = parse_pool
+        metrics.gauge("crawler_parse_pending", lambda: [({}, len(parse_pool))])
+        print(f"Parsing on {parse_pool.workers} worker processes "
+              f"(up to {parse_pool.max_pending} pages queued)")
+
+    # A shard keeps all its state (master list, mapping, visited, frontier) in its own directory
+    if shard is not None:
+        args.output_dir = shard_dir(args.output_dir, shard[0])
     os.makedirs(args.output_dir, exist_ok=True)
     master_file = os.path.join(args.output_dir, "all_urls_master.txt")
 
-    # Load visited URLs
-    visited = set()
-    if os.path.exists(master_file):
-        with open(master_file, 'r', encoding='utf-8') as mf:
-            for line in mf:
-                visited.add(line.strip())
-    else:
-        open(master_file, 'w').close()
-
-    # Load or initialize URL mapping
-    mapping_path = os.path.join(args.output_dir, "url_mapping.json")
-    if os.path.exists(mapping_path):
-        with open(mapping_path, 'r', encoding='utf-8') as mp:
-            mapping = json.load(mp)
-    else:
-        mapping = {}
+    # Open the master list (trimming a torn last line) and load visited URLs
+    master = BatchedLineWriter(master_file)
+    visited = open_visited(args.visited_backend, args.output_dir, master_file)
+
+    # Load or initialize URL mapping (importing an old url_mapping.json once)
+    mapping = MappingStore(os.path.join(args.output_dir, "url_mapping.tsv"),
+                           legacy_json=os.path.join(args.output_dir, "url_mapping.json"))
+
+    # Persistent crawl queue shared by every seed
+    frontier_store = None
+    if args.persist_frontier:
+        frontier_store = FrontierStore(os.path.join(args.output_dir, "frontier.sqlite3"))
+        crawl_opts["frontier_store"] = frontier_store
+
+    # Validators of earlier runs; pages crawled in this run are tracked separately
+    http_cache = None
+    if args.revalidate:
+        http_cache = HttpCache(os.path.join(args.output_dir, "http_cache.sqlite3"))
+        crawl_opts["http_cache"] = http_cache
+        crawl_opts["seen"] = set()
+        if args.freshness:
+            crawl_opts["priority"] = FreshnessPriority(http_cache.last_checked,
+                                                       base=crawl_opts["priority"])
+
+    # SimHash index of every page written so far (simhash.tsv)
+    near_dup = None
+    if args.near_dup >= 0:
+        try:
+            near_dup = NearDupFilter(args.output_dir, distance=args.near_dup)
+        except ValueError as exc:
+            parser.error(f"--near-dup: {exc}")
+        crawl_opts["near_dup"] = near_dup
+
+    # Vocab segments, one rolling set per topic directory
+    segments = None
+    if args.vocab_format == "segments":
+        try:
+            segments = VocabSegments(args.segment_codec, args.segment_size << 20)
+        except ValueError as exc:
+            parser.error(f"--segment-codec: {exc}")
+        crawl_opts["segments"] = segments
+
+    # Raw response archive, one set of WARC files per output directory
+    archive = None
+    if args.archive:
+        archive = WarcArchive(os.path.join(args.output_dir, "archive"), args.archive_size << 20)
+        crawl_opts["archive"] = archive
 
     # Load seeds by topic
     topics = {}
@@ -170,19 +794,100 @@ def main():
             if seeds:
                 topics[topic] = seeds
 
-    # Crawl each seed
-    for topic, seeds in topics.items():
-        print(f"Starting topic '{topic}'")
-        for seed in seeds:
-            print(f"  Crawling seed: {seed}")
-            crawl_seed(topic, seed, args.max_pages, master_file,
-                       args.output_dir, mapping, visited)
+    # Sharded: crawl the seeds whose host hashes to this shard, swap links with the others
+    transport = None
+    router = None
+    if shard is not None:
+        router = ShardRouter(topics, *shard)
+        topics = {topic: [seed for seed in seeds if router.owns(seed)]
+                  for topic, seeds in topics.items()}
+        topics = {topic: seeds for topic, seeds in topics.items() if seeds}
+        transport = SocketTransport(args.coordinator, shard[0], router.deliver_many)
+        router.transport = transport
+        crawl_opts["router"] = router
+        print(f"Shard {shard[0]}/{shard[1]}: {sum(map(len, topics.values()))} seeds")
+
+    # Metrics endpoint / snapshot file; every shard gets its own port and file
+    exporter = None
+    if args.metrics_port is not None or args.metrics_file:
+        port, path = args.metrics_port, args.metrics_file
+        if shard is not None:
+            port = None if port is None else port + shard[0]
+            if path:
+                root, ext = os.path.splitext(path)
+                path = f"{root}.shard{shard[0]:03d}{ext}"
+        try:
+            exporter = MetricsExporter(metrics, port, path, args.metrics_interval)
+        except OSError as exc:
+            parser.error(f"--metrics-port: {exc}")
+        if port is not None:
+            print(f"Metrics on http://localhost:{port}/metrics")
 
-    # Save mapping JSON
-    with open(mapping_path, 'w', encoding='utf-8') as mp:
-        json.dump(mapping, mp, indent=2)
+    # Per-stage spans and profiles (profiler.py)
+    profiler = None
+    if args.profile:
+        profile_dir = args.profile_dir or os.path.join(args.output_dir, "profile")
+        if args.profile_dir and shard is not None:
+            profile_dir = os.path.join(profile_dir, f"shard{shard[0]:03d}")
+        profiler = CrawlProfiler(profile_dir, args.profile, args.profile_interval).start()
+        crawl_opts["profiler"] = profiler
+        print(f"Profiling ({args.profile}) into {profiler.out_dir}")
+
+    # Crawl each seed
+    try:
+        if args.mode == "async":
+            print(f"Crawling {sum(len(s) for s in topics.values())} seeds asynchronously")
+            asyncio.run(crawl_all_async(topics, args.max_pages, master, args.output_dir,
+                                        mapping, visited, limiter, args.concurrency, args.per_host,
+                                        **crawl_opts))
+        elif args.mode == "threaded":
+            def make_crawl(topic, seed, progress):
+                return SeedCrawl(topic, seed, args.max_pages, master, args.output_dir,
+                                 mapping, visited, limiter, progress=progress, **crawl_opts)
+            SeedScheduler(make_crawl, limiter, workers=args.workers).run(topics)
+        else:
+            for topic, seeds in topics.items():
+                print(f"Starting topic '{topic}'")
+                for seed in seeds:
+                    print(f"  Crawling seed: {seed}")
+                    crawl_seed(topic, seed, args.max_pages, master,
+                               args.output_dir, mapping, visited, limiter=limiter, **crawl_opts)
+    except KeyboardInterrupt:
+        # Pages still queued for parsing stay in the frontier for the next run
+        if parse_pool is not None:
+            parse_pool.close(cancel=True)
+        raise
+    finally:
+        # Flush and fsync everything, also on Ctrl-C
+        if transport is not None:
+            transport.close()
+            print(f"Shard {shard[0]}: {router.summary()}")
+        if parse_pool is not None:
+            parse_pool.close()
+        if segments is not None:
+            segments.close()
+        if archive is not None:
+            archive.close()
+            print(f"Archive: {archive.summary()}")
+        master.close()
+        mapping.close()
+        if frontier_store is not None:
+            frontier_store.close()
+        if near_dup is not None:
+            near_dup.close()
+            print(f"Near-duplicates skipped: {near_dup.skipped}")
+        if http_cache is not None:
+            http_cache.close()
+            print(f"Revalidation: {http_cache.summary()}")
+        if hasattr(visited, "close"):
+            visited.close()
+        if exporter is not None:
+            exporter.close()
+        print(f"Metrics: {metrics.summary()}")
+        if profiler is not None:
+            print(f"Profile: {profiler.close()}")
 
     print("Crawling complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
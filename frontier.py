@@ -0,0 +1,382 @@
+import heapq
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from visited_store import FingerprintSet, fingerprint
+
+
+# --- Prioritizers: (url, depth) -> int, lower is crawled sooner ---
+def bfs_priority(url: str, depth: int) -> int:
+    # Plain breadth-first order, same as the old list queue
+    return depth
+
+
+class PatternPriority:
+    # Shift URLs matching a regex up (negative score) or down (positive score),
+    # e.g. PatternPriority([(r"/page/\d+/", -5)]) for listing pages
+    def __init__(self, patterns, base=bfs_priority):
+        self.patterns = [(re.compile(p) if isinstance(p, str) else p, score) for p, score in patterns]
+        self.base = base
+
+    def __call__(self, url: str, depth: int) -> int:
+        prio = self.base(url, depth)
+        for pattern, score in self.patterns:
+            if pattern.search(url):
+                prio += score
+        return prio
+
+
+class FreshnessPriority:
+    # Never-crawled URLs first, then the ones we fetched longest ago.
+    # last_crawled(url) returns a unix timestamp or None.
+    def __init__(self, last_crawled, bucket_seconds: float = 86400, base=bfs_priority):
+        self.last_crawled = last_crawled
+        self.bucket_seconds = bucket_seconds
+        self.base = base
+
+    def __call__(self, url: str, depth: int) -> int:
+        prio = self.base(url, depth)
+        ts = self.last_crawled(url)
+        if ts is None:
+            return prio
+        # Pages fetched recently sink; roughly one bucket per day of freshness
+        age_buckets = int((time.time() - ts) // self.bucket_seconds)
+        return prio + max(0, 30 - age_buckets)
+
+
+def parse_url_boosts(values) -> list:
+    # Repeated --url-boost REGEX=SCORE options
+    patterns = []
+    for item in values or []:
+        regex, sep, score = item.rpartition("=")
+        if not sep:
+            raise ValueError(f"expected REGEX=SCORE, got {item!r}")
+        patterns.append((re.compile(regex), int(score)))
+    return patterns
+
+
+# --- URL frontier: bucketed priority queue with enqueue-time dedupe ---
+# Each integer priority has its own FIFO deque, so push/pop are O(1) apart from
+# a tiny heap over the distinct priorities in use. Once more than
+# max_in_memory URLs are queued, further URLs of a priority go to that
+# priority's spill file and are read back in chunks when its deque drains,
+# which keeps FIFO order within a priority. Dedupe keeps the 64-bit
+# fingerprint of every pushed URL (visited_store.fingerprint); past
+# max_in_memory of them they move to a memory-mapped FingerprintSet in the
+# spill directory.
+class Frontier:
+    def __init__(self, priority=bfs_priority, max_in_memory: int = 100_000, spill_dir: str = None):
+        self.priority = priority
+        self.max_in_memory = max_in_memory
+        self.spill_dir = spill_dir
+        self._buckets = {}
+        self._heap = []          # priorities with queued URLs
+        self._spill = {}         # priority -> [path, read_offset, pending]
+        self._in_memory = 0
+        self._spilled = 0
+        self._seen = set()       # fingerprints, until _seen_file takes over
+        self._seen_file = None
+        self.pages = 0
+        if spill_dir and os.path.isdir(spill_dir):
+            # Left over from an interrupted run; this frontier starts from the seed again
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    def mark_stored(self, url: str = None):
+        # Only the persistent frontier remembers progress across runs
+        self.pages += 1
+
+    def hold(self):
+        pass
+
+    def release(self, url: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def __len__(self) -> int:
+        return self._in_memory + self._spilled
+
+    def __contains__(self, url: str) -> bool:
+        return self._has(fingerprint(url))
+
+    def _has(self, fp: int) -> bool:
+        if self._seen_file is not None:
+            return self._seen_file.has_fingerprint(fp)
+        return fp in self._seen
+
+    def _remember(self, fp: int):
+        if self._seen_file is None and self.spill_dir and len(self._seen) >= self.max_in_memory:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._seen_file = FingerprintSet(os.path.join(self.spill_dir, "seen.fp"))
+            for old in self._seen:
+                self._seen_file.add_fingerprint(old)
+            self._seen = set()
+        if self._seen_file is not None:
+            self._seen_file.add_fingerprint(fp)
+        else:
+            self._seen.add(fp)
+
+    def push(self, url: str, depth: int = 0) -> bool:
+        fp = fingerprint(url)
+        if self._has(fp):
+            return False
+        self._remember(fp)
+        prio = self.priority(url, depth)
+        if prio not in self._buckets:
+            self._buckets[prio] = deque()
+            heapq.heappush(self._heap, prio)
+        spill = self._spill.get(prio)
+        if (spill and spill[2]) or (self.spill_dir and self._in_memory >= self.max_in_memory):
+            self._spill_write(prio, url, depth)
+        else:
+            self._buckets[prio].append((url, depth))
+            self._in_memory += 1
+        return True
+
+    def pop(self):
+        # Returns (url, depth) or None when empty
+        while self._heap:
+            prio = self._heap[0]
+            bucket = self._buckets[prio]
+            if not bucket:
+                self._refill(prio)
+            if bucket:
+                self._in_memory -= 1
+                return bucket.popleft()
+            heapq.heappop(self._heap)
+            del self._buckets[prio]
+        return None
+
+    def close(self):
+        if self._seen_file is not None:
+            self._seen_file.close()
+            self._seen_file = None
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self._spill.clear()
+
+    # --- Spill files: one append-only "depth\turl" file per priority ---
+    def _spill_write(self, prio: int, url: str, depth: int):
+        spill = self._spill.get(prio)
+        if spill is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"prio_{prio}.txt")
+            spill = self._spill[prio] = [path, 0, 0]
+        with open(spill[0], "a", encoding="utf-8") as sf:
+            sf.write(f"{depth}\t{url}\n")
+        spill[2] += 1
+        self._spilled += 1
+
+    def _refill(self, prio: int):
+        spill = self._spill.get(prio)
+        if not spill or not spill[2]:
+            return
+        path, offset, pending = spill
+        room = max(1, self.max_in_memory - self._in_memory)
+        bucket = self._buckets[prio]
+        with open(path, "r", encoding="utf-8") as sf:
+            sf.seek(offset)
+            while pending and len(bucket) < room:
+                line = sf.readline()
+                if not line:
+                    break
+                depth, _, url = line.rstrip("\n").partition("\t")
+                bucket.append((url, int(depth)))
+                pending -= 1
+            offset = sf.tell()
+        loaded = spill[2] - pending
+        self._in_memory += loaded
+        self._spilled -= loaded
+        if pending:
+            spill[1], spill[2] = offset, pending
+        else:
+            os.remove(path)
+            del self._spill[prio]
+
+
+# --- Persistent frontier: SQLite file under --output-dir shared by all seeds ---
+# Rows are only ever inserted and flagged, never deleted, so after a crash or
+# Ctrl-C the next run continues from the queued URLs instead of re-fetching
+# seed pages to rediscover them. The master list stays the source of truth:
+# on open, a row flagged stored whose URL never made it into `visited` is
+# queued again, and the seed's page count is rebuilt from the stored rows.
+QUEUED, STORED, SKIPPED = 0, 1, 2
+
+
+class FrontierStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.frontiers = set()   # open PersistentFrontiers, flushed on close()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                id       INTEGER PRIMARY KEY AUTOINCREMENT,
+                crawl    TEXT    NOT NULL,
+                priority INTEGER NOT NULL,
+                depth    INTEGER NOT NULL,
+                url      TEXT    NOT NULL,
+                done     INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (crawl, url)
+            );
+            CREATE INDEX IF NOT EXISTS frontier_next ON frontier (crawl, done, priority, id);
+        """)
+
+    def close(self):
+        # Seeds still running (e.g. after Ctrl-C) keep their unfinished rows queued
+        for frontier in list(self.frontiers):
+            frontier.suspend()
+        with self.lock:
+            self.conn.close()
+
+
+class PersistentFrontier:
+    # Same interface as Frontier. Pushes and done-flags are buffered and
+    # written in one transaction per batch; pops read the next batch of rows
+    # in (priority, insertion) order. A popped row is only flagged on the
+    # next pop (or close), i.e. once the crawler has finished with it; a row
+    # the process died on is popped again and the crawler's visited check
+    # skips it if the page had already been stored. A page still being
+    # parsed elsewhere is hold()-ed so the next pop leaves its row open until
+    # mark_stored(url) or release(url). Dedupe asks the table's (crawl, url)
+    # index, so no URL is kept in memory past its batch.
+    def __init__(self, store: FrontierStore, key: str, priority=bfs_priority,
+                 visited=None, batch_size: int = 256, flush_every: float = 5.0):
+        self.store = store
+        self.key = key
+        self.priority = priority
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self._inserts = []
+        self._flags = []
+        self._batch = deque()
+        self._current = None
+        self._current_url = None
+        self._current_flag = SKIPPED
+        self._held = {}          # url -> row id of popped rows still in progress
+        self._last_flush = time.monotonic()
+        self._unflushed = set()  # URLs of _inserts
+        self.pages = 0
+        store.frontiers.add(self)
+        lost = []
+        with store.lock:
+            conn = store.conn
+            for row_id, url in conn.execute(
+                    "SELECT id, url FROM frontier WHERE crawl = ? AND done = ?", (key, STORED)):
+                if visited is None or url in visited:
+                    self.pages += 1
+                else:
+                    lost.append((row_id,))
+            if lost:
+                conn.execute("BEGIN")
+                conn.executemany("UPDATE frontier SET done = 0 WHERE id = ?", lost)
+                conn.execute("COMMIT")
+            self._remaining = conn.execute(
+                "SELECT COUNT(*) FROM frontier WHERE crawl = ? AND done = 0", (key,)).fetchone()[0]
+
+    def __len__(self) -> int:
+        return self._remaining
+
+    def __contains__(self, url: str) -> bool:
+        if url in self._unflushed:
+            return True
+        with self.store.lock:
+            return self.store.conn.execute(
+                "SELECT 1 FROM frontier WHERE crawl = ? AND url = ?",
+                (self.key, url)).fetchone() is not None
+
+    def push(self, url: str, depth: int = 0) -> bool:
+        if url in self:
+            return False
+        self._unflushed.add(url)
+        self._inserts.append((self.key, self.priority(url, depth), depth, url))
+        self._remaining += 1
+        self._maybe_flush()
+        return True
+
+    def pop(self):
+        self._ack()
+        if not self._batch:
+            self.flush()
+            # Held rows are still queued in the table but already being worked on
+            held = tuple(self._held.values())
+            skip = f" AND id NOT IN ({','.join('?' * len(held))})" if held else ""
+            with self.store.lock:
+                self._batch.extend(self.store.conn.execute(
+                    "SELECT id, url, depth FROM frontier WHERE crawl = ? AND done = 0" + skip +
+                    " ORDER BY priority, id LIMIT ?", (self.key,) + held + (self.batch_size,)))
+            if not self._batch:
+                return None
+        row_id, url, depth = self._batch.popleft()
+        self._current = row_id
+        self._current_url = url
+        self._remaining -= 1
+        self._maybe_flush()
+        return url, depth
+
+    def mark_stored(self, url: str = None):
+        # The URL popped last (or a held one) was fetched and recorded
+        row_id = self._held.pop(url, None)
+        if row_id is not None:
+            self._flags.append((STORED, row_id))
+        else:
+            self._current_flag = STORED
+        self.pages += 1
+
+    def hold(self):
+        # Keep the URL popped last open past the next pop
+        if self._current is not None:
+            self._held[self._current_url] = self._current
+            self._current = None
+
+    def release(self, url: str):
+        # A held URL was dropped without being stored
+        row_id = self._held.pop(url, None)
+        if row_id is not None:
+            self._flags.append((SKIPPED, row_id))
+
+    def _ack(self):
+        if self._current is not None:
+            self._flags.append((self._current_flag, self._current))
+            self._current = None
+            self._current_flag = SKIPPED
+
+    def _maybe_flush(self):
+        if (len(self._inserts) + len(self._flags) >= self.batch_size
+                or time.monotonic() - self._last_flush >= self.flush_every):
+            self.flush()
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not (self._inserts or self._flags):
+            return
+        with self.store.lock:
+            conn = self.store.conn
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR IGNORE INTO frontier (crawl, priority, depth, url) VALUES (?, ?, ?, ?)",
+                self._inserts)
+            conn.executemany("UPDATE frontier SET done = ? WHERE id = ?", self._flags)
+            conn.execute("COMMIT")
+        self._inserts.clear()
+        self._unflushed.clear()
+        self._flags.clear()
+
+    def suspend(self):
+        # Write out what is finished; a row still in progress stays queued
+        if self._current_flag == STORED:
+            self._ack()
+        self.flush()
+
+    def close(self):
+        self._ack()
+        self.flush()
+        self.store.frontiers.discard(self)
@@ -0,0 +1,130 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+
+# --- Hash of a response body (same 16-hex-char form as encode_name) ---
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:16]
+
+
+# --- HTTP revalidation cache: <output-dir>/http_cache.sqlite3 ---
+# One row per canonical URL with the ETag / Last-Modified validators, a hash
+# of the body and the page's links as of the last time it was parsed. On a
+# recrawl the validators go out as If-None-Match / If-Modified-Since; a 304,
+# or a 200 whose body hashes the same, means the page is unchanged, so the
+# crawler follows the cached links and skips parsing and the vocab rewrite.
+# Writes are buffered and committed in batches like PersistentFrontier.
+class HttpCache:
+    def __init__(self, path: str, batch_size: int = 256, flush_every: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_every = flush_every
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._pending = {}   # url -> row not yet committed
+        self._last_flush = time.monotonic()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url           TEXT PRIMARY KEY,
+                etag          TEXT,
+                last_modified TEXT,
+                content_hash  TEXT NOT NULL,
+                links         TEXT NOT NULL,
+                checked       REAL NOT NULL
+            )
+        """)
+
+    def get(self, url: str):
+        # (etag, last_modified, content_hash, links) or None
+        with self._lock:
+            row = self._pending.get(url)
+            if row is None:
+                row = self.conn.execute(
+                    "SELECT url, etag, last_modified, content_hash, links, checked "
+                    "FROM http_cache WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[1], row[2], row[3], row[4].split("\n") if row[4] else []
+
+    def last_checked(self, url: str):
+        # Unix time the page was last fetched, or None (frontier.FreshnessPriority)
+        with self._lock:
+            row = self._pending.get(url)
+            if row is None:
+                row = self.conn.execute("SELECT url, checked FROM http_cache WHERE url = ?",
+                                        (url,)).fetchone()
+        return None if row is None else row[-1]
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.get(url)
+        headers = {}
+        if entry is not None:
+            etag, last_modified = entry[0], entry[1]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def revalidate(self, url: str, status: int, headers, body: bytes):
+        # Returns (meta, links). links is the cached link list when the page
+        # is unchanged; otherwise None and meta is what put() should store
+        # once the page has been parsed.
+        entry = self.get(url)
+        if status == 304:
+            self._count("not_modified")
+            if entry is None:
+                return None, []
+            # Refresh checked, and any validators the 304 updated
+            self.put(url, (headers.get("ETag") or entry[0], headers.get("Last-Modified") or entry[1],
+                           entry[2]), entry[3])
+            return None, entry[3]
+        meta = (headers.get("ETag"), headers.get("Last-Modified"), content_hash(body))
+        if entry is not None and entry[2] == meta[2]:
+            self._count("same_body")
+            self.put(url, meta, entry[3])
+            return None, entry[3]
+        self._count("changed" if entry is not None else "new")
+        return meta, None
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def put(self, url: str, meta: tuple, links: list):
+        etag, last_modified, digest = meta
+        with self._lock:
+            self._pending[url] = (url, etag, last_modified, digest, "\n".join(links), time.time())
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_every):
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        self.conn.execute("BEGIN")
+        self.conn.executemany("INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?, ?)",
+                              list(self._pending.values()))
+        self.conn.execute("COMMIT")
+        self._pending.clear()
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['not_modified']} not modified (304), {s['same_body']} unchanged body, "
+                f"{s['changed']} changed, {s['new']} new")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.conn.close()
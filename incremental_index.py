@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import heapq
+import itertools
+import math
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import time
+from array import array
+from collections import Counter
+
+from build_index import load_mapping
+from postings import BinaryIndex, write_binary
+from segments import SEGMENT_RE, SegmentReader
+
+# --- Incremental index directory ---
+# state.sqlite3 : the live segments, where every document is indexed (segment,
+#                 doc ID) with a digest of its text, the deleted (segment, doc)
+#                 pairs and the input files already indexed (size, mtime)
+# seg-NNNNNN/   : one binary index (postings.py layout) per segment, doc IDs
+#                 local to the segment
+# An update only reads input files whose size or mtime changed (and segments
+# added since the last update), indexes the documents whose text changed into
+# new delta segments and marks their old versions deleted. Merges combine
+# segments of a similar size into one, dropping deleted documents, LSM-style.
+STATE = "state.sqlite3"
+UPDATE, MERGE = "update", "merge"
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _try_lock(path: str):
+    # Exclusive lock held until the returned file is closed (or the process
+    # dies); None if another process holds it
+    f = open(path, "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class IndexState:
+    def __init__(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        self.index_dir = index_dir
+        self.conn = sqlite3.connect(os.path.join(index_dir, STATE), isolation_level=None,
+                                    timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS segments (
+                id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                live    INTEGER NOT NULL DEFAULT 0,
+                owner   TEXT    NOT NULL,
+                docs    INTEGER NOT NULL DEFAULT 0,
+                created REAL    NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS docs (
+                key     TEXT PRIMARY KEY,
+                digest  TEXT    NOT NULL,
+                source  TEXT    NOT NULL,
+                segment INTEGER NOT NULL,
+                doc     INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_location ON docs (segment, doc);
+            CREATE INDEX IF NOT EXISTS docs_source ON docs (source);
+            CREATE TABLE IF NOT EXISTS deleted (
+                segment INTEGER NOT NULL,
+                doc     INTEGER NOT NULL,
+                PRIMARY KEY (segment, doc)
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                path  TEXT PRIMARY KEY,
+                size  INTEGER NOT NULL,
+                mtime INTEGER NOT NULL
+            );
+        """)
+
+    def seg_dir(self, seg_id: int) -> str:
+        return os.path.join(self.index_dir, f"seg-{seg_id:06d}")
+
+    def allocate(self, owner: str) -> int:
+        # Reserve a segment ID; readers ignore the segment until it is live
+        cur = self.conn.execute("INSERT INTO segments (owner, created) VALUES (?, ?)",
+                                (owner, time.time()))
+        return cur.lastrowid
+
+    def discard_pending(self, owner: str):
+        # Segments an interrupted update / merge never finished; the caller
+        # holds that owner's lock, so nobody is still writing them
+        rows = self.conn.execute("SELECT id FROM segments WHERE live = 0 AND owner = ?",
+                                 (owner,)).fetchall()
+        for (seg_id,) in rows:
+            shutil.rmtree(self.seg_dir(seg_id), ignore_errors=True)
+            self.conn.execute("DELETE FROM segments WHERE id = ?", (seg_id,))
+
+    def live_segments(self) -> list:
+        # [(segment ID, docs, deleted docs)] oldest first
+        dead = dict(self.conn.execute("SELECT segment, COUNT(*) FROM deleted GROUP BY segment"))
+        return [(seg_id, docs, dead.get(seg_id, 0)) for seg_id, docs in self.conn.execute(
+            "SELECT id, docs FROM segments WHERE live = 1 ORDER BY id")]
+
+    def deleted(self, seg_id: int) -> set:
+        return {doc for (doc,) in self.conn.execute(
+            "SELECT doc FROM deleted WHERE segment = ?", (seg_id,))}
+
+    def lookup(self, key: str):
+        # (digest, source, segment, doc) or None
+        return self.conn.execute("SELECT digest, source, segment, doc FROM docs WHERE key = ?",
+                                 (key,)).fetchone()
+
+    def close(self):
+        self.conn.close()
+
+
+# --- Postings of the documents indexed since the last flush ---
+class DeltaBuilder:
+    def __init__(self):
+        self.postings = {}    # term -> (doc IDs, counts)
+        self.urls = []
+        self.doc_lens = array("I")
+        self.held = 0
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def add(self, url: str, text: str) -> int:
+        doc = len(self.urls)
+        self.urls.append(url)
+        counts = Counter(text.split())
+        self.doc_lens.append(sum(counts.values()))
+        for term, count in counts.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("I"))
+            entry[0].append(doc)
+            entry[1].append(count)
+        self.held += len(counts)
+        return doc
+
+    def items(self):
+        # str order is code point order, i.e. the UTF-8 byte order of terms.bin
+        for term in sorted(self.postings):
+            doc_ids, counts = self.postings[term]
+            yield term, doc_ids, counts
+
+
+# --- Index the new and changed documents of a crawl output ---
+class IncrementalIndexer:
+    def __init__(self, state: IndexState, mapping: dict, flush_postings: int = 1_000_000):
+        self.state = state
+        self.mapping = mapping
+        self.flush_postings = flush_postings
+        self.delta = DeltaBuilder()
+        self.seg_id = None
+        self.rows = {}        # key -> (digest, source, doc) in the delta
+        self.dead = []        # delta (segment, doc) replaced before the flush
+        self.stale = set()    # keys whose published version is deleted at the flush
+        self.gone = set()     # keys whose docs row goes away
+        self.moved = []       # (source, key): same text, found in another file
+        self.seen = set()     # keys present in the files read so far
+        self.stats = Counter()
+
+    def _location(self, key: str):
+        row = self.rows.get(key)
+        if row is not None:
+            return row[0], row[1], self.seg_id, row[2]
+        if key in self.gone:
+            return None
+        return self.state.lookup(key)
+
+    def _supersede(self, key: str):
+        # Only the delta's own documents have a fixed location: a merge may
+        # move a published document before the flush, so its (segment, doc)
+        # is looked up inside the flush transaction
+        row = self.rows.get(key)
+        if row is not None:
+            self.dead.append((self.seg_id, row[2]))
+        else:
+            self.stale.add(key)
+
+    def put(self, key: str, text: str, source: str) -> bool:
+        # False if the document has no URL mapping (it is not indexed)
+        url = key if self.mapping is None else self.mapping.get(key)
+        if url is None:
+            self.stats["missing"] += 1
+            return False
+        self.seen.add(key)
+        digest = _digest(text)
+        old = self._location(key)
+        if old is not None:
+            if old[0] == digest:
+                if old[1] != source:
+                    if key in self.rows:
+                        self.rows[key] = (digest, source, self.rows[key][2])
+                    else:
+                        self.moved.append((source, key))
+                self.stats["unchanged"] += 1
+                return True
+            self._supersede(key)
+            self.stats["changed"] += 1
+        else:
+            self.stats["added"] += 1
+        if self.seg_id is None:
+            self.seg_id = self.state.allocate(UPDATE)
+        self.rows[key] = (digest, source, self.delta.add(url, text))
+        if self.delta.held >= self.flush_postings:
+            self.flush()
+        return True
+
+    def remove(self, key: str):
+        self.seen.discard(key)
+        old = self._location(key)
+        if old is None:
+            return
+        self._supersede(key)
+        self.rows.pop(key, None)
+        self.gone.add(key)
+        self.stats["deleted"] += 1
+
+    def flush(self):
+        # Write the delta as a segment, then publish it together with the
+        # deletions in one transaction
+        if self.seg_id is not None and len(self.delta):
+            write_binary(self.state.seg_dir(self.seg_id), self.delta.items(),
+                         self.delta.urls, self.delta.doc_lens)
+        conn = self.state.conn
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("UPDATE docs SET source = ? WHERE key = ?", self.moved)
+        conn.executemany("INSERT OR IGNORE INTO deleted SELECT segment, doc FROM docs WHERE key = ?",
+                         ((key,) for key in self.stale))
+        conn.executemany("DELETE FROM docs WHERE key = ?", ((key,) for key in self.gone))
+        conn.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?)",
+                         ((key, digest, source, self.seg_id, doc)
+                          for key, (digest, source, doc) in self.rows.items()))
+        conn.executemany("INSERT OR IGNORE INTO deleted VALUES (?, ?)", self.dead)
+        if self.seg_id is not None:
+            if len(self.delta):
+                conn.execute("UPDATE segments SET live = 1, docs = ? WHERE id = ?",
+                             (len(self.delta), self.seg_id))
+                self.stats["segments"] += 1
+            else:
+                conn.execute("DELETE FROM segments WHERE id = ?", (self.seg_id,))
+        conn.execute("COMMIT")
+        self.delta = DeltaBuilder()
+        self.seg_id = None
+        self.rows = {}
+        self.dead = []
+        self.stale = set()
+        self.gone = set()
+        self.moved = []
+
+    def update(self, input_dir: str):
+        # Stat every input file, read the changed ones
+        conn = self.state.conn
+        known = {path: (size, mtime) for path, size, mtime in
+                 conn.execute("SELECT path, size, mtime FROM sources")}
+        stamps = {}       # path -> stamp of every input file found
+        indexed = []      # files read whose documents all made it in
+        recheck = set()   # sources whose documents not seen again are deleted
+        for dirpath, _, names in os.walk(input_dir):
+            names.sort()
+            rel_dir = os.path.relpath(dirpath, input_dir)
+            segs = []
+            for name in names:
+                path = os.path.normpath(os.path.join(rel_dir, name))
+                is_seg = bool(SEGMENT_RE.match(name))
+                if not is_seg and not (name.startswith("vocab_") and name.endswith(".txt")):
+                    continue
+                st = os.stat(os.path.join(dirpath, name))
+                stamps[path] = (st.st_size, st.st_mtime_ns)
+                if is_seg:
+                    segs.append(path)
+                elif known.get(path) != stamps[path]:
+                    recheck.add(path)
+                    self.stats["files read"] += 1
+                    with open(os.path.join(dirpath, name), "r", encoding="utf-8",
+                              errors="replace") as f:
+                        if self.put(name[6:-4], f.read(), path):
+                            indexed.append(path)
+            if segs:
+                indexed.extend(self._read_segments(input_dir, rel_dir, segs, known, stamps,
+                                                   recheck))
+        self.flush()
+
+        # Files gone since the last update
+        vanished = [path for path in known if path not in stamps]
+        for path in vanished:
+            recheck.add(self._seg_source(os.path.dirname(path))
+                        if SEGMENT_RE.match(os.path.basename(path)) else path)
+        for source in recheck:
+            for (key,) in conn.execute("SELECT key FROM docs WHERE source = ?",
+                                       (source,)).fetchall():
+                if key not in self.seen:
+                    self.remove(key)
+        self.flush()
+
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("DELETE FROM sources WHERE path = ?", ((p,) for p in vanished))
+        conn.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                         ((path, *stamps[path]) for path in indexed))
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _seg_source(rel_dir: str) -> str:
+        # Documents from segments belong to their directory: a newer segment
+        # may hold the live version of a document first seen in an older one
+        return os.path.join(rel_dir, "*.seg")
+
+    def _read_segments(self, input_dir: str, rel_dir: str, segs: list, known: dict,
+                       stamps: dict, recheck: set) -> list:
+        # Only the segments added since the last update are read, unless an
+        # already indexed one changed or vanished (compaction, a resumed
+        # crawl): then the whole directory is read again, oldest first, so
+        # later records win. Returns the segments to record as indexed.
+        here = "" if rel_dir == "." else rel_dir
+        old = {path for path in known
+               if os.path.dirname(path) == here and SEGMENT_RE.match(os.path.basename(path))}
+        if all(stamps.get(path) == known[path] for path in old):
+            todo = [path for path in segs if path not in known]
+        else:
+            todo = segs
+            recheck.add(self._seg_source(rel_dir))
+        missing = self.stats["missing"]
+        source = self._seg_source(rel_dir)
+        for path in todo:
+            self.stats["files read"] += 1
+            with SegmentReader(os.path.join(input_dir, path)) as seg:
+                for key in seg.deleted():
+                    self.remove(key)
+                for key, text in seg.items():
+                    self.put(key, text, source)
+        return todo if self.stats["missing"] == missing else []
+
+
+# --- Merge policy ---
+# Segments fall into tiers by their live document count (powers of fanout);
+# fanout segments of one tier are merged into one of the next tier. A
+# segment that is mostly deleted documents is rewritten on its own.
+def pick_merge(segments: list, fanout: int) -> list:
+    tiers = {}
+    for seg_id, docs, dead in segments:
+        if dead and dead * 2 >= docs:
+            return [seg_id]
+        tier = int(math.log(max(docs - dead, 1), fanout))
+        tiers.setdefault(tier, []).append(seg_id)
+    for tier in sorted(tiers):
+        if len(tiers[tier]) >= fanout:
+            return tiers[tier][:fanout]
+    return []
+
+
+def _terms(index: BinaryIndex, n: int):
+    for i in range(index.term_count):
+        yield index._term_bytes(i), n, i
+
+
+# --- Merge segments into one, dropping deleted documents ---
+# Doc IDs are renumbered densely in segment order, so concatenating every
+# term's remapped postings keeps them sorted. Deletions that arrive while the
+# merge runs are carried over to the new segment when it is published.
+def merge_segments(state: IndexState, seg_ids: list) -> int:
+    new_id = state.allocate(MERGE)
+    inputs = []
+    try:
+        urls = []
+        doc_lens = array("I")
+        remaps = []
+        for seg_id in seg_ids:
+            index = BinaryIndex(state.seg_dir(seg_id))
+            dead = state.deleted(seg_id)
+            inputs.append(index)
+            remap = array("i", [-1]) * index.doc_count
+            for doc in range(index.doc_count):
+                if doc not in dead:
+                    remap[doc] = len(urls)
+                    urls.append(index.url(doc))
+                    doc_lens.append(index.doc_lens[doc])
+            remaps.append(remap)
+
+        def postings():
+            merged = heapq.merge(*(_terms(index, n) for n, index in enumerate(inputs)))
+            for term, group in itertools.groupby(merged, key=lambda entry: entry[0]):
+                doc_ids = array("I")
+                counts = array("I")
+                for _, n, i in group:
+                    remap = remaps[n]
+                    for doc, count in zip(*inputs[n].postings_at(i)):
+                        if remap[doc] >= 0:
+                            doc_ids.append(remap[doc])
+                            counts.append(count)
+                if doc_ids:
+                    yield term.decode("utf-8"), doc_ids, counts
+
+        write_binary(state.seg_dir(new_id), postings(), urls, doc_lens)
+    finally:
+        for index in inputs:
+            index.close()
+
+    conn = state.conn
+    conn.execute("BEGIN IMMEDIATE")
+    moves = []
+    for seg_id, remap in zip(seg_ids, remaps):
+        for doc in range(len(remap)):
+            if remap[doc] >= 0:
+                moves.append((new_id, remap[doc], seg_id, doc))
+    conn.executemany("UPDATE docs SET segment = ?, doc = ? WHERE segment = ? AND doc = ?", moves)
+    late = []
+    for seg_id, remap in zip(seg_ids, remaps):
+        for (doc,) in conn.execute("SELECT doc FROM deleted WHERE segment = ?", (seg_id,)):
+            if remap[doc] >= 0:
+                late.append((new_id, remap[doc]))
+    conn.executemany("INSERT OR IGNORE INTO deleted VALUES (?, ?)", late)
+    marks = ",".join("?" * len(seg_ids))
+    conn.execute(f"DELETE FROM deleted WHERE segment IN ({marks})", seg_ids)
+    conn.execute(f"DELETE FROM segments WHERE id IN ({marks})", seg_ids)
+    if urls:
+        conn.execute("UPDATE segments SET live = 1, docs = ? WHERE id = ?", (len(urls), new_id))
+    else:
+        conn.execute("DELETE FROM segments WHERE id = ?", (new_id,))
+    conn.execute("COMMIT")
+    if not urls:
+        shutil.rmtree(state.seg_dir(new_id), ignore_errors=True)
+    # Readers that still map the old files keep them until they close
+    for seg_id in seg_ids:
+        shutil.rmtree(state.seg_dir(seg_id), ignore_errors=True)
+    return len(urls)
+
+
+def merge(index_dir: str, fanout: int = 8, full: bool = False) -> int:
+    # Merge until the policy (or, with full, one segment) is satisfied;
+    # returns the number of merges, or -1 if another merge is running
+    lock = _try_lock(os.path.join(index_dir, "merge.lock"))
+    if lock is None:
+        return -1
+    state = IndexState(index_dir)
+    merges = 0
+    try:
+        state.discard_pending(MERGE)
+        while True:
+            segments = state.live_segments()
+            if full:
+                ids = [s[0] for s in segments] if len(segments) > 1 or \
+                    any(dead for _, _, dead in segments) else []
+            else:
+                ids = pick_merge(segments, fanout)
+            if not ids:
+                return merges
+            start = time.time()
+            docs = merge_segments(state, ids)
+            merges += 1
+            print(f"Merged segments {', '.join(map(str, ids))} into {docs} documents "
+                  f"in {time.time() - start:.1f}s")
+            if full:
+                return merges
+    finally:
+        state.close()
+        lock.close()
+
+
+def merge_in_background(index_dir: str, fanout: int):
+    # A detached merge process; it outlives this one and logs to merge.log
+    log = open(os.path.join(index_dir, "merge.log"), "a")
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "merge", index_dir,
+                      "--fanout", str(fanout)],
+                     stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                     start_new_session=True)
+    log.close()
+
+
+# --- Open the live segments for searching ---
+# [(BinaryIndex, deleted doc IDs)]; a merge may remove a segment between
+# reading the table and opening it, so that is retried.
+def open_segments(index_dir: str) -> list:
+    state = IndexState(index_dir)
+    try:
+        for attempt in range(5):
+            opened = []
+            try:
+                state.conn.execute("BEGIN")
+                segments = state.live_segments()
+                deleted = [state.deleted(seg_id) for seg_id, _, _ in segments]
+                state.conn.execute("COMMIT")
+                for (seg_id, _, _), dead in zip(segments, deleted):
+                    opened.append((BinaryIndex(state.seg_dir(seg_id)), dead))
+                return opened
+            except FileNotFoundError:
+                for index, _ in opened:
+                    index.close()
+                if attempt == 4:
+                    raise
+                time.sleep(0.2)
+    finally:
+        state.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Incremental inverted index: delta segments plus background merges")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update = sub.add_parser("update", help="Index the new and changed documents of a crawl output")
+    update.add_argument("input_dir", help="Crawl output: vocab_<hash>.txt files and/or .seg segments")
+    update.add_argument("mapping", nargs="?",
+                        help="url_mapping.tsv or url_mapping.json (without it, documents are "
+                             "named by their hash)")
+    update.add_argument("index_dir")
+    update.add_argument("--flush-postings", type=int, default=1_000_000,
+                        help="Postings held in memory before the delta is written as a segment")
+    update.add_argument("--merge", choices=["background", "inline", "off"], default="background",
+                        help="Merge segments afterwards in a detached process (default), "
+                             "before returning, or not at all")
+    update.add_argument("--fanout", type=int, default=8,
+                        help="Segments of one size tier merged together")
+    merge_cmd = sub.add_parser("merge", help="Merge segments by the tier policy")
+    merge_cmd.add_argument("index_dir")
+    merge_cmd.add_argument("--fanout", type=int, default=8)
+    merge_cmd.add_argument("--full", action="store_true",
+                           help="Merge everything into one segment without deleted documents")
+    stats = sub.add_parser("stats", help="Segments and documents")
+    stats.add_argument("index_dir")
+    args = parser.parse_args()
+
+    if args.command == "update":
+        os.makedirs(args.index_dir, exist_ok=True)
+        lock = _try_lock(os.path.join(args.index_dir, "update.lock"))
+        if lock is None:
+            sys.exit(f"Another update of {args.index_dir} is running")
+        start = time.time()
+        mapping = None
+        if args.mapping:
+            mapping = load_mapping(args.mapping)
+            print(f"Loaded {len(mapping)} URL mappings")
+        state = IndexState(args.index_dir)
+        try:
+            state.discard_pending(UPDATE)
+            indexer = IncrementalIndexer(state, mapping, args.flush_postings)
+            indexer.update(args.input_dir)
+        finally:
+            state.close()
+            lock.close()
+        s = indexer.stats
+        print(f"Read {s['files read']} changed files: {s['added']} added, {s['changed']} changed, "
+              f"{s['deleted']} deleted, {s['unchanged']} unchanged documents "
+              f"-> {s['segments']} new segments in {time.time() - start:.1f}s")
+        if s["missing"]:
+            print(f"Documents without a URL mapping (skipped, retried next update): {s['missing']}")
+        if args.merge == "inline":
+            merge(args.index_dir, args.fanout)
+        elif args.merge == "background" and s["segments"] + s["deleted"] + s["changed"]:
+            merge_in_background(args.index_dir, args.fanout)
+    elif args.command == "merge":
+        merges = merge(args.index_dir, args.fanout, args.full)
+        if merges < 0:
+            sys.exit(f"Another merge of {args.index_dir} is running")
+        print(f"{merges} merges")
+    else:
+        state = IndexState(args.index_dir)
+        try:
+            segments = state.live_segments()
+            docs = state.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        finally:
+            state.close()
+        print(f"{len(segments)} segments, {docs} live documents")
+        for seg_id, count, dead in segments:
+            size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names
+                       in os.walk(os.path.join(args.index_dir, f"seg-{seg_id:06d}"))
+                       for name in names)
+            print(f"  seg-{seg_id:06d}: {count} docs, {dead} deleted, {size / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+package org.example;
+
+import java.io.EOFException;
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.HashSet;
+import java.util.List;
+import java.util.Map;
+import java.util.Set;
+import java.util.zip.DataFormatException;
+import java.util.zip.Inflater;
+
+import com.github.luben.zstd.Zstd;
+
+import org.apache.hadoop.fs.FSDataInputStream;
+import org.apache.hadoop.fs.FileStatus;
+import org.apache.hadoop.fs.FileSystem;
+import org.apache.hadoop.fs.Path;
+import org.apache.hadoop.io.Text;
+import org.apache.hadoop.mapreduce.InputSplit;
+import org.apache.hadoop.mapreduce.JobContext;
+import org.apache.hadoop.mapreduce.RecordReader;
+import org.apache.hadoop.mapreduce.TaskAttemptContext;
+import org.apache.hadoop.mapreduce.lib.input.FileInputFormat;
+import org.apache.hadoop.mapreduce.lib.input.FileSplit;
+
+// Reads the segment-NNNNN.seg files written by segments.py / --vocab-format segments.
+// One split per segment (hundreds of documents) instead of one per vocab file;
+// each record is key = doc hash (the url_mapping key), value = the vocab line.
+// Layout (big-endian): 16-byte header "VSEG", version, codec; records of
+// tag u8, 16-byte hash, stored length u32, raw length u32, data; a sealed
+// segment ends with an index footer whose last 12 bytes are offset u64 + "VIDX".
+// As in segments.iter_segments, the last record of a hash wins, within a
+// segment and across the segments of a directory: a reader also loads the
+// indexes of the newer segment files next to its own and skips every hash
+// they write or delete (segments.py compact keeps that list short).
+public class SegmentInputFormat extends FileInputFormat<Text, Text> {
+    static final int HEADER = 16;
+    static final int RECORD = 25;
+    static final int DOC = 1, DELETE = 3;
+
+    @Override
+    protected boolean isSplitable(JobContext context, Path file) {
+        return false;
+    }
+
+    @Override
+    protected List<FileStatus> listStatus(JobContext job) throws IOException {
+        // only the segments; simhash.tsv, duplicates.tsv etc. may sit next to them
+        List<FileStatus> segments = new ArrayList<>();
+        for (FileStatus status : super.listStatus(job)) {
+            if (status.getPath().getName().endsWith(".seg")) {
+                segments.add(status);
+            }
+        }
+        return segments;
+    }
+
+    @Override
+    public RecordReader<Text, Text> createRecordReader(InputSplit split, TaskAttemptContext context) {
+        return new SegmentRecordReader();
+    }
+
+    // The last record of every hash in one segment: hash -> {tag, record offset}
+    static final class SegmentIndex {
+        final Map<String, long[]> entries = new HashMap<>();
+        int codec;
+        long end;       // where the records stop (footer or torn tail)
+    }
+
+    static SegmentIndex readIndex(FSDataInputStream in, long length, Path path) throws IOException {
+        byte[] header = new byte[HEADER];
+        in.readFully(0, header);
+        if (header[0] != 'V' || header[1] != 'S' || header[2] != 'E' || header[3] != 'G' || header[4] != 1) {
+            throw new IOException(path + " is not a vocab segment");
+        }
+        SegmentIndex index = new SegmentIndex();
+        index.codec = header[5];
+        byte[] hash = new byte[16];
+
+        // a sealed segment lists the last record of every hash in its footer
+        if (length >= HEADER + 12) {
+            in.seek(length - 12);
+            long indexOffset = in.readLong();
+            byte[] trailer = new byte[4];
+            in.readFully(trailer);
+            if ("VIDX".equals(new String(trailer, StandardCharsets.US_ASCII))) {
+                in.seek(indexOffset + 1);
+                int count = in.readInt();
+                for (int i = 0; i < count; i++) {
+                    in.readFully(hash);
+                    int tag = in.readUnsignedByte();
+                    long recordOffset = in.readLong();
+                    index.entries.put(new String(hash, StandardCharsets.US_ASCII),
+                                      new long[] {tag, recordOffset});
+                }
+                index.end = indexOffset;
+                return index;
+            }
+        }
+
+        // unsealed (crash): scan the records up to a torn tail, later ones winning
+        long pos = HEADER;
+        while (pos + RECORD <= length) {
+            in.seek(pos);
+            int tag = in.readUnsignedByte();
+            in.readFully(hash);
+            long stored = in.readInt() & 0xffffffffL;
+            if ((tag != DOC && tag != DELETE) || pos + RECORD + stored > length) {
+                break;
+            }
+            index.entries.put(new String(hash, StandardCharsets.US_ASCII), new long[] {tag, pos});
+            pos += RECORD + stored;
+        }
+        index.end = pos;
+        return index;
+    }
+
+    public static class SegmentRecordReader extends RecordReader<Text, Text> {
+        private FSDataInputStream in;
+        private long pos;
+        private long end;
+        private int codec;
+        // hash -> offset of the record to emit: its last one, unless a newer segment has the hash
+        private final Map<String, Long> live = new HashMap<>();
+        private final Text key = new Text();
+        private final Text value = new Text();
+
+        @Override
+        public void initialize(InputSplit split, TaskAttemptContext context) throws IOException {
+            Path path = ((FileSplit) split).getPath();
+            FileSystem fs = path.getFileSystem(context.getConfiguration());
+            in = fs.open(path);
+            SegmentIndex own = readIndex(in, fs.getFileStatus(path).getLen(), path);
+            codec = own.codec;
+            end = own.end;
+
+            // hashes written or deleted in a later segment of this directory hide their versions here
+            Set<String> shadowed = new HashSet<>();
+            String name = path.getName();
+            for (FileStatus sibling : fs.listStatus(path.getParent())) {
+                Path other = sibling.getPath();
+                if (other.getName().endsWith(".seg") && other.getName().compareTo(name) > 0) {
+                    try (FSDataInputStream newer = fs.open(other)) {
+                        shadowed.addAll(readIndex(newer, sibling.getLen(), other).entries.keySet());
+                    }
+                }
+            }
+            for (Map.Entry<String, long[]> entry : own.entries.entrySet()) {
+                if (entry.getValue()[0] == DOC && !shadowed.contains(entry.getKey())) {
+                    live.put(entry.getKey(), entry.getValue()[1]);
+                }
+            }
+            pos = HEADER;
+            in.seek(pos);
+        }
+
+        @Override
+        public boolean nextKeyValue() throws IOException {
+            byte[] hash = new byte[16];
+            while (pos + RECORD <= end) {
+                long offset = pos;
+                int tag;
+                int stored;
+                int raw;
+                try {
+                    tag = in.readUnsignedByte();
+                    in.readFully(hash);
+                    stored = in.readInt();
+                    raw = in.readInt();
+                } catch (EOFException e) {
+                    return false;
+                }
+                if ((tag != DOC && tag != DELETE) || offset + RECORD + stored > end) {
+                    return false;   // torn tail of an unsealed segment
+                }
+                pos = offset + RECORD + stored;
+
+                String name = new String(hash, StandardCharsets.US_ASCII);
+                if (tag != DOC || !Long.valueOf(offset).equals(live.get(name))) {
+                    in.seek(pos);   // deleted, or replaced later in this or a newer segment
+                    continue;
+                }
+                byte[] data = new byte[stored];
+                in.readFully(data);
+                key.set(name);
+                value.set(decode(data, raw));
+                return true;
+            }
+            return false;
+        }
+
+        private byte[] decode(byte[] data, int raw) throws IOException {
+            if (codec == 0) {
+                return data;
+            }
+            if (codec == 2) {
+                return Zstd.decompress(data, raw);
+            }
+            Inflater inflater = new Inflater();
+            try {
+                inflater.setInput(data);
+                byte[] out = new byte[raw];
+                int n = 0;
+                while (n < raw && !inflater.finished()) {
+                    int got = inflater.inflate(out, n, raw - n);
+                    if (got == 0 && (inflater.needsInput() || inflater.needsDictionary())) {
+                        throw new IOException("truncated deflate record");
+                    }
+                    n += got;
+                }
+                return out;
+            } catch (DataFormatException e) {
+                throw new IOException("corrupt deflate record", e);
+            } finally {
+                inflater.end();
+            }
+        }
+
+        @Override
+        public Text getCurrentKey() {
+            return key;
+        }
+
+        @Override
+        public Text getCurrentValue() {
+            return value;
+        }
+
+        @Override
+        public float getProgress() {
+            return end <= HEADER ? 1.0f : (float) (pos - HEADER) / (end - HEADER);
+        }
+
+        @Override
+        public void close() throws IOException {
+            if (in != null) {
+                in.close();
+            }
+        }
+    }
+}
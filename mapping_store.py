@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+
+from batched_writer import BatchedLineWriter, repair_tail
+
+# --- Compact the log once it holds this many lines per live key ---
+COMPACT_RATIO = 1.5
+
+
+# --- Read "<hash>\t<url>" lines; later lines win ---
+def read_mapping_log(path: str) -> tuple:
+    mapping = {}
+    lines = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            key, sep, url = line.rstrip("\n").partition("\t")
+            if sep:
+                mapping[key] = url
+                lines += 1
+    return mapping, lines
+
+
+# --- Rewrite the log with one line per key (temp file + atomic rename) ---
+def write_mapping_log(path: str, mapping: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for key, url in mapping.items():
+            f.write(f"{key}\t{url}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# --- url_mapping as an append-only TSV log ---
+# Dict-like (get/[]/in/len/items) with O(1) lookups from memory. Every new or
+# changed entry is appended through a BatchedLineWriter, so a crash loses at
+# most the last unflushed batch instead of the whole run. An existing
+# url_mapping.json is imported on first use; the log is compacted on open
+# when it has accumulated many superseded lines.
+class MappingStore:
+    def __init__(self, path: str, legacy_json: str = None):
+        self.path = path
+        if not os.path.exists(path):
+            mapping = {}
+            if legacy_json and os.path.exists(legacy_json):
+                with open(legacy_json, "r", encoding="utf-8") as mp:
+                    mapping = json.load(mp)
+                print(f"Imported {len(mapping)} mappings from {legacy_json}")
+            write_mapping_log(path, mapping)
+        repair_tail(path)
+        self._map, lines = read_mapping_log(path)
+        if lines > max(1000, len(self._map) * COMPACT_RATIO):
+            self.compact()
+        self._writer = BatchedLineWriter(path)
+
+    def __len__(self) -> int:
+        return len(self._map)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._map
+
+    def __getitem__(self, key: str) -> str:
+        return self._map[key]
+
+    def get(self, key: str, default=None):
+        return self._map.get(key, default)
+
+    def items(self):
+        return self._map.items()
+
+    def __setitem__(self, key: str, url: str):
+        if self._map.get(key) == url:
+            return
+        self._map[key] = url
+        self._writer.write(f"{key}\t{url}")
+
+    def compact(self):
+        write_mapping_log(self.path, self._map)
+
+    def checkpoint(self):
+        self._writer.checkpoint()
+
+    def close(self):
+        self._writer.close()
+
+
+# --- CLI: inspect, compact or export a mapping log ---
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the url_mapping.tsv log")
+    parser.add_argument("mapping", help="Path to url_mapping.tsv")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Print entry and line counts")
+    sub.add_parser("compact", help="Rewrite the log with one line per hash")
+    export = sub.add_parser("export-json", help="Write the mapping as the old JSON object")
+    export.add_argument("out")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        mapping, lines = read_mapping_log(args.mapping)
+        print(f"{len(mapping)} mappings in {lines} lines")
+    elif args.command == "compact":
+        mapping, lines = read_mapping_log(args.mapping)
+        write_mapping_log(args.mapping, mapping)
+        print(f"Compacted {lines} lines to {len(mapping)}")
+    else:
+        mapping, _ = read_mapping_log(args.mapping)
+        with open(args.out, "w", encoding="utf-8") as jf:
+            json.dump(mapping, jf, indent=2)
+        print(f"Exported {len(mapping)} mappings to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
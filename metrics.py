@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds: seconds, and bytes for response sizes
+TIME_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+
+# --- What the crawler records: name -> (type, help) ---
+METRICS = {
+    "crawler_pages_total": ("counter", "Pages stored, by host and status (crawled, unchanged, "
+                                       "near_duplicate)"),
+    "crawler_responses_total": ("counter", "HTTP responses by host and status code"),
+    "crawler_response_bytes_total": ("counter", "Response body bytes by host"),
+    "crawler_fetch_errors_total": ("counter", "Failed fetch attempts by host and kind (http, "
+                                              "network)"),
+    "crawler_rate_limited_total": ("counter", "429 Too Many Requests answers by host"),
+    "crawler_retries_total": ("counter", "Fetch attempts that will be retried, by host"),
+    "crawler_failed_total": ("counter", "URLs given up after all retries, by host"),
+    "crawler_fetch_seconds_total": ("counter", "Time spent fetching (request to last body byte), "
+                                               "by host"),
+    "crawler_dns_seconds": ("histogram", "DNS resolution time (async mode)"),
+    "crawler_connect_seconds": ("histogram", "Connection setup time incl. TLS (async mode)"),
+    "crawler_ttfb_seconds": ("histogram", "Request start to response headers; in sync and "
+                                          "threaded mode this includes connection setup"),
+    "crawler_download_seconds": ("histogram", "Response headers to last body byte"),
+    "crawler_response_size_bytes": ("histogram", "Response body size"),
+    "crawler_parse_seconds": ("histogram", "HTML decode and parse time per page"),
+    "crawler_tokenize_seconds": ("histogram", "Tokenize time per page"),
+    "crawler_store_seconds": ("histogram", "Master list, mapping and vocab write time per page"),
+    "crawler_politeness_wait_seconds": ("histogram", "Time spent waiting for a host's "
+                                                     "crawl-delay (sync and async mode)"),
+    "crawler_queue_depth": ("gauge", "Queued URLs per host"),
+    "crawler_seeds_active": ("gauge", "Seeds still being crawled"),
+    "crawler_parse_pending": ("gauge", "Pages queued for or in the parse workers"),
+    "crawler_uptime_seconds": ("gauge", "Seconds since the crawl started"),
+}
+
+
+def _key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _labels(key: tuple, extra: str = "") -> str:
+    parts = ['%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- Fixed-bucket histogram, as in Prometheus ---
+class Histogram:
+    def __init__(self, buckets: tuple = TIME_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        # Estimated by linear interpolation within the bucket, like histogram_quantile()
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+# --- Registry shared by every seed, thread and the exporters ---
+# inc()/observe() take a lock and a dict update, cheap enough to call a few
+# times per page. Gauges are callbacks evaluated when a snapshot is taken.
+# Crawls registered with track() report their queue depth per host.
+class CrawlMetrics:
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, label key) -> value
+        self._histograms = {}  # (name, label key) -> Histogram
+        self._gauges = {}      # name -> fn() -> [(labels, value)]
+        self._crawls = set()
+        self.gauge("crawler_queue_depth", self._queue_depth)
+        self.gauge("crawler_seeds_active", lambda: [({}, len(self._crawls))])
+        self.gauge("crawler_uptime_seconds", lambda: [({}, round(time.time() - self.started, 3))])
+
+    def inc(self, name: str, value=1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = TIME_BUCKETS, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def gauge(self, name: str, fn):
+        self._gauges[name] = fn
+
+    def response(self, host: str, status: int, size: int, seconds: float,
+                 ttfb: float = None, download: float = None):
+        # One HTTP response; seconds runs from sending the request to the last body byte
+        self.inc("crawler_responses_total", host=host, code=status)
+        self.inc("crawler_response_bytes_total", size, host=host)
+        self.inc("crawler_fetch_seconds_total", seconds, host=host)
+        self.observe("crawler_response_size_bytes", size, SIZE_BUCKETS)
+        if ttfb is not None:
+            self.observe("crawler_ttfb_seconds", ttfb)
+        if download is not None:
+            self.observe("crawler_download_seconds", download)
+
+    def parsed(self, parse_seconds: float, tokenize_seconds: float):
+        self.observe("crawler_parse_seconds", parse_seconds)
+        self.observe("crawler_tokenize_seconds", tokenize_seconds)
+
+    def track(self, crawl):
+        with self._lock:
+            self._crawls.add(crawl)
+
+    def untrack(self, crawl):
+        with self._lock:
+            self._crawls.discard(crawl)
+
+    def _queue_depth(self) -> list:
+        with self._lock:
+            crawls = list(self._crawls)
+        depth = {}
+        for crawl in crawls:
+            depth[crawl.host] = depth.get(crawl.host, 0) + len(crawl.frontier) + len(crawl.inbox)
+        return [({"host": host}, n) for host, n in sorted(depth.items())]
+
+    def _collect(self) -> tuple:
+        # Consistent copies of counters and histograms, plus evaluated gauges
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {}
+            for key, hist in self._histograms.items():
+                copy = Histogram(hist.buckets)
+                copy.counts, copy.count, copy.sum = list(hist.counts), hist.count, hist.sum
+                histograms[key] = copy
+        gauges = {}
+        for name, fn in self._gauges.items():
+            try:
+                gauges[name] = [(_key(labels), value) for labels, value in fn()]
+            except Exception:
+                # e.g. a frontier closed while its length was being read
+                continue
+        return counters, histograms, gauges
+
+    def total(self, name: str, counters: dict = None) -> float:
+        counters = self._collect()[0] if counters is None else counters
+        return sum(v for (n, _), v in counters.items() if n == name)
+
+    # --- Prometheus text exposition format (version 0.0.4) ---
+    def prometheus(self) -> str:
+        counters, histograms, gauges = self._collect()
+        lines = []
+        names = sorted({n for n, _ in counters} | {n for n, _ in histograms} | set(gauges))
+        for name in names:
+            kind, text = METRICS.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (n, key), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for (n, key), hist in sorted(histograms.items(), key=lambda item: item[0]):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(hist.buckets + (float("inf"),), hist.counts):
+                    cumulative += count
+                    le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(float(bound)))
+                    lines.append(f"{name}_bucket{_labels(key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {_number(hist.sum)}")
+                lines.append(f"{name}_count{_labels(key)} {hist.count}")
+            for key, value in gauges.get(name, ()):
+                lines.append(f"{name}{_labels(key)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    # --- JSON snapshot: totals, histogram quantiles and a per-host table ---
+    def snapshot(self) -> dict:
+        counters, histograms, gauges = self._collect()
+        now = time.time()
+        pages = self.total("crawler_pages_total", counters)
+        out = {
+            "time": round(now, 3),
+            "uptime_seconds": round(now - self.started, 3),
+            "pages": pages,
+            "pages_per_second": round(pages / max(now - self.started, 1e-9), 3),
+            "counters": {},
+            "histograms": {},
+            "gauges": {},
+            "hosts": {},
+        }
+        hosts = {}
+        per_host = {
+            "crawler_pages_total": "pages",
+            "crawler_response_bytes_total": "bytes",
+            "crawler_fetch_errors_total": "errors",
+            "crawler_rate_limited_total": "rate_limited",
+            "crawler_retries_total": "retries",
+            "crawler_failed_total": "failed",
+            "crawler_fetch_seconds_total": "fetch_seconds",
+        }
+        for (name, key), value in sorted(counters.items()):
+            labels = dict(key)
+            out["counters"].setdefault(name, []).append({"labels": labels, "value": value})
+            if "host" in labels and name in per_host:
+                host = hosts.setdefault(labels["host"], {})
+                host[per_host[name]] = host.get(per_host[name], 0) + value
+        for (name, key), hist in sorted(histograms.items(), key=lambda item: item[0]):
+            out["histograms"].setdefault(name, []).append({
+                "labels": dict(key),
+                "count": hist.count,
+                "sum": round(hist.sum, 6),
+                "mean": round(hist.sum / hist.count, 6) if hist.count else 0.0,
+                "p50": round(hist.quantile(0.5), 6),
+                "p90": round(hist.quantile(0.9), 6),
+                "p99": round(hist.quantile(0.99), 6),
+            })
+        for name, values in gauges.items():
+            out["gauges"][name] = [{"labels": dict(key), "value": value} for key, value in values]
+            if name == "crawler_queue_depth":
+                for key, value in values:
+                    hosts.setdefault(dict(key)["host"], {})["queue"] = value
+        for host in hosts.values():
+            if "fetch_seconds" in host:
+                host["fetch_seconds"] = round(host["fetch_seconds"], 3)
+        out["hosts"] = dict(sorted(hosts.items()))
+        return out
+
+    def summary(self) -> str:
+        snap = self.snapshot()
+        hist = {name: values[0] for name, values in snap["histograms"].items()
+                if len(values) == 1}
+        parts = [f"{snap['pages']} pages in {snap['uptime_seconds']:.1f}s "
+                 f"({snap['pages_per_second']:.2f} pages/s)"]
+        counters = {name: sum(v["value"] for v in values)
+                    for name, values in snap["counters"].items()}
+        parts.append(f"{counters.get('crawler_response_bytes_total', 0) / 1e6:.1f} MB")
+        for name, label in (("crawler_retries_total", "retries"),
+                            ("crawler_rate_limited_total", "429s"),
+                            ("crawler_failed_total", "failed")):
+            if counters.get(name):
+                parts.append(f"{counters[name]} {label}")
+        for name, label in (("crawler_ttfb_seconds", "ttfb"),
+                            ("crawler_download_seconds", "download"),
+                            ("crawler_parse_seconds", "parse"),
+                            ("crawler_tokenize_seconds", "tokenize"),
+                            ("crawler_store_seconds", "store"),
+                            ("crawler_politeness_wait_seconds", "politeness wait")):
+            if name in hist:
+                parts.append(f"{label} {hist[name]['mean'] * 1000:.1f} ms")
+        return ", ".join(parts)
+
+
+# --- Exporters: an HTTP endpoint and/or a JSON file rewritten periodically ---
+def make_handler(metrics: CrawlMetrics):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                data = metrics.prometheus().encode("utf-8")
+                kind = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json":
+                data = json.dumps(metrics.snapshot()).encode("utf-8")
+                kind = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+    return Handler
+
+
+class MetricsExporter:
+    def __init__(self, metrics: CrawlMetrics, port: int = None, path: str = None,
+                 interval: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.server = None
+        self._stop = threading.Event()
+        self._thread = None
+        if port is not None:
+            self.server = ThreadingHTTPServer(("", port), make_handler(metrics))
+            self.server.daemon_threads = True
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        if path:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.metrics.snapshot(), f, indent=1)
+        os.replace(tmp, self.path)
+
+    def close(self):
+        # A last snapshot with the final totals
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.write()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+# --- aiohttp request tracing: DNS, connect and time to first byte ---
+def aiohttp_trace(metrics: CrawlMetrics):
+    import aiohttp
+
+    async def request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def dns_start(session, ctx, params):
+        ctx.dns = time.perf_counter()
+
+    async def dns_end(session, ctx, params):
+        metrics.observe("crawler_dns_seconds", time.perf_counter() - ctx.dns)
+
+    async def connect_start(session, ctx, params):
+        ctx.connect = time.perf_counter()
+
+    async def connect_end(session, ctx, params):
+        metrics.observe("crawler_connect_seconds", time.perf_counter() - ctx.connect)
+
+    async def request_end(session, ctx, params):
+        metrics.observe("crawler_ttfb_seconds", time.perf_counter() - ctx.start)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(request_start)
+    trace.on_dns_resolvehost_start.append(dns_start)
+    trace.on_dns_resolvehost_end.append(dns_end)
+    trace.on_connection_create_start.append(connect_start)
+    trace.on_connection_create_end.append(connect_end)
+    trace.on_request_end.append(request_end)
+    return trace
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show a crawl metrics snapshot "
+                                                 "(crawler --metrics-file)")
+    parser.add_argument("snapshot", help="JSON file written by --metrics-file")
+    parser.add_argument("--hosts", type=int, default=10, help="Busiest hosts to list")
+    args = parser.parse_args()
+
+    with open(args.snapshot, encoding="utf-8") as f:
+        snap = json.load(f)
+    print(f"{snap['pages']} pages in {snap['uptime_seconds']:.1f}s "
+          f"({snap['pages_per_second']:.2f} pages/s)")
+    for name, values in sorted(snap["counters"].items()):
+        print(f"  {name:<32} {sum(v['value'] for v in values):>12.6g}")
+    print(f"  {'stage':<32} {'count':>8} {'mean ms':>9} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'total s':>9}")
+    for name, values in sorted(snap["histograms"].items()):
+        if not name.endswith("_seconds"):
+            continue
+        for v in values:
+            print(f"  {name[len('crawler_'):-len('_seconds')]:<32} {v['count']:>8} "
+                  f"{v['mean'] * 1000:>9.2f} {v['p50'] * 1000:>9.2f} {v['p90'] * 1000:>9.2f} "
+                  f"{v['p99'] * 1000:>9.2f} {v['sum']:>9.2f}")
+    hosts = sorted(snap["hosts"].items(), key=lambda item: -item[1].get("pages", 0))
+    if hosts:
+        print(f"  {'host':<32} {'pages':>8} {'queue':>8} {'errors':>8} {'429s':>8} "
+              f"{'MB':>8} {'fetch s':>9}")
+        for host, h in hosts[:args.hosts]:
+            print(f"  {host:<32} {h.get('pages', 0):>8} {h.get('queue', 0):>8} "
+                  f"{h.get('errors', 0):>8} {h.get('rate_limited', 0):>8} "
+                  f"{h.get('bytes', 0) / 1e6:>8.2f} {h.get('fetch_seconds', 0):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import asyncio
+import codecs
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urljoin
+
+from parsers import parse_bs4
+from profiler import no_span
+from tokenizer import default_tokenizer
+
+# (parse, tokenize) of this pool worker process, set by _init_worker
+_worker = None
+
+
+# --- Decode a response body; unknown or missing charsets fall back to UTF-8 ---
+def decode_body(content: bytes, encoding: str = None) -> str:
+    try:
+        codecs.lookup(encoding or "utf-8")
+    except LookupError:
+        encoding = None
+    return content.decode(encoding or "utf-8", errors="replace")
+
+
+# --- Extract tokens and absolute links from a fetched page ---
+def extract_page(html: str, canonical: str, parse=parse_bs4, tokenize=default_tokenizer):
+    # parse is one of parsers.PARSERS (see --parser); tokens are yielded lazily
+    texts, hrefs = parse(html)
+    links = [urljoin(canonical, href) for href in hrefs]
+    return tokenize(texts), links
+
+
+# --- Raw body in, (tokens, links) out ---
+def parse_page(content: bytes, encoding: str, canonical: str, parse=parse_bs4,
+               tokenize=default_tokenizer):
+    tokens, links = extract_page(decode_body(content, encoding), canonical, parse, tokenize)
+    return list(tokens), links
+
+
+# --- extract_page / parse_page plus (parse seconds, tokenize seconds) for the metrics ---
+# span is CrawlProfiler.span when the crawl is profiled (--profile)
+def extract_page_timed(html: str, canonical: str, parse=parse_bs4, tokenize=default_tokenizer,
+                       span=no_span):
+    start = time.perf_counter()
+    with span("parse"):
+        texts, hrefs = parse(html)
+        links = [urljoin(canonical, href) for href in hrefs]
+    parsed = time.perf_counter()
+    with span("tokenize"):
+        tokens = list(tokenize(texts))
+    return tokens, links, (parsed - start, time.perf_counter() - parsed)
+
+
+def parse_page_timed(content: bytes, encoding: str, canonical: str, parse=parse_bs4,
+                     tokenize=default_tokenizer, span=no_span):
+    # The body is decoded inside the parse span, so decoding counts as parse time
+    return extract_page_timed(content, canonical, lambda body: parse(decode_body(body, encoding)),
+                              tokenize, span)
+
+
+def _init_worker(parse, tokenize):
+    global _worker
+    _worker = (parse, tokenize)
+    # Ctrl-C is handled by the crawler, which shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _parse_in_worker(content: bytes, encoding: str, canonical: str):
+    return parse_page_timed(content, encoding, canonical, *_worker)
+
+
+# --- Parse stage: a process pool fed with raw response bodies ---
+# Fetchers hand over the body and carry on with the next request while the
+# page is decoded, parsed and tokenized in another process, so parsing runs
+# on every core instead of competing with network I/O for the GIL. At most
+# max_pending pages are queued or being parsed; submit() blocks (and
+# parse_async() waits) once that many are outstanding, which holds the
+# fetchers back when the parsers fall behind.
+class ParsePool:
+    def __init__(self, parse=parse_bs4, workers: int = None, max_pending: int = None,
+                 tokenize=default_tokenizer):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 4
+        # spawn: the crawler already runs writer/worker threads, which fork would copy mid-flight
+        self._executor = ProcessPoolExecutor(self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker,
+                                             initargs=(parse, tokenize))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._async_slots = None
+
+    def submit(self, content: bytes, encoding: str, canonical: str):
+        # Returns a concurrent.futures.Future of (tokens, links, (parse s, tokenize s))
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(_parse_in_worker, content, encoding, canonical)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def parse_async(self, content: bytes, encoding: str, canonical: str):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_pending)
+        async with self._async_slots:
+            return await asyncio.wrap_future(
+                self._executor.submit(_parse_in_worker, content, encoding, canonical))
+
+    def close(self, cancel: bool = False):
+        self._executor.shutdown(wait=True, cancel_futures=cancel)
@@ -0,0 +1,152 @@
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:  # optional fast backend
+    etree = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional fast backend
+    LexborHTMLParser = None
+
+# Elements whose content is not visible text (BeautifulSoup's get_text skips them too)
+SKIP_TAGS = frozenset(("script", "style", "template"))
+
+
+# --- Page parsers ---
+# Every backend takes the page HTML and returns (texts, hrefs): the visible
+# text chunks in document order and the raw href of every <a href>. Tokens
+# come from the chunks (see tokenizer.Tokenizer), so callers do not care which
+# backend produced them. Backends are plain functions and keep no state
+# between calls, so one can be shared by all crawl threads.
+
+# --- BeautifulSoup (pure Python, always available) ---
+def parse_bs4(html: str):
+    soup = BeautifulSoup(html, "html.parser")
+    hrefs = [link["href"] for link in soup.find_all("a", href=True)]
+    return [soup.get_text(separator=" ")], hrefs
+
+
+# --- lxml: libxml2 tokenizer feeding events straight to us, no tree built ---
+# libxml2 reports the text on either side of an entity or character reference
+# in separate data() calls; they are joined back into one chunk per run of
+# text between tags, so "Caf&eacute;" stays one word.
+class _LxmlTarget:
+    def __init__(self):
+        self.texts = []
+        self.hrefs = []
+        self.skip = 0
+        self._run = []
+
+    def _flush(self):
+        if self._run:
+            self.texts.append("".join(self._run))
+            self._run = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag == "a":
+            href = attrib.get("href")
+            if href is not None:
+                self.hrefs.append(href)
+
+    def end(self, tag):
+        self._flush()
+        if tag in SKIP_TAGS and self.skip:
+            self.skip -= 1
+
+    def data(self, data):
+        if not self.skip:
+            self._run.append(data)
+
+    def close(self):
+        self._flush()
+        return self.texts, self.hrefs
+
+
+def parse_lxml(html: str):
+    parser = etree.HTMLParser(target=_LxmlTarget())
+    parser.feed(html)
+    return parser.close()
+
+
+# --- selectolax: lexbor HTML5 parser, text and links read back in C ---
+def parse_selectolax(html: str):
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(SKIP_TAGS))
+    hrefs = [node.attributes.get("href") or "" for node in tree.css("a[href]")]
+    root = tree.root
+    return [root.text(separator=" ") if root is not None else ""], hrefs
+
+
+# --- html.parser without building a tree (no extra dependency) ---
+class _StdlibCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.texts = []
+        self.hrefs = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip += 1
+        elif tag == "a":
+            for name, value in attrs:
+                if name == "href":
+                    self.hrefs.append(value or "")
+                    break
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip:
+            self.skip -= 1
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.texts.append(data)
+
+    def unknown_decl(self, data):
+        # <![CDATA[...]]> counts as text for BeautifulSoup as well
+        if data.startswith("CDATA[") and not self.skip:
+            self.texts.append(data[6:])
+
+
+def parse_stdlib(html: str):
+    collector = _StdlibCollector()
+    collector.feed(html)
+    collector.close()
+    return collector.texts, collector.hrefs
+
+
+PARSERS = {
+    "bs4": parse_bs4,
+    "lxml": parse_lxml,
+    "selectolax": parse_selectolax,
+    "stdlib": parse_stdlib,
+}
+
+
+# --- Backends whose optional dependency is importable ---
+def available_parsers() -> list:
+    missing = set()
+    if etree is None:
+        missing.add("lxml")
+    if LexborHTMLParser is None:
+        missing.add("selectolax")
+    return [name for name in PARSERS if name not in missing]
+
+
+# --- Resolve a --parser choice; "auto" takes the fastest installed backend ---
+def get_parser(name: str = "auto"):
+    available = available_parsers()
+    if name == "auto":
+        name = next(n for n in ("selectolax", "lxml", "bs4") if n in available)
+    if name not in PARSERS:
+        raise ValueError(f"unknown parser {name!r} (choose from {', '.join(PARSERS)})")
+    if name not in available:
+        raise ValueError(f"parser {name!r} is not installed (pip install {name})")
+    return name, PARSERS[name]
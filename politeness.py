@@ -0,0 +1,61 @@
+import random
+import threading
+import time
+
+
+# --- Per-host politeness: earliest time each host may be fetched again ---
+# Hosts are keyed by netloc. Delays come from robots.txt crawl-delay (or an
+# operator override) plus a random jitter, and 429 Retry-After pushes the host
+# further out. Nothing here sleeps; callers ask ready_at() and go do other
+# hosts' work in the meantime.
+class HostRateLimiter:
+    def __init__(self, jitter=(1.0, 3.0), overrides: dict = None):
+        self.jitter = jitter
+        self.overrides = {h.lower(): d for h, d in (overrides or {}).items()}
+        self._delays = {}
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def knows(self, host: str) -> bool:
+        return host.lower() in self._delays
+
+    def set_crawl_delay(self, host: str, delay: float):
+        host = host.lower()
+        with self._lock:
+            self._delays[host] = self.overrides.get(host, delay or 0)
+
+    def crawl_delay(self, host: str) -> float:
+        host = host.lower()
+        return self._delays.get(host, self.overrides.get(host, 0))
+
+    def ready_at(self, host: str) -> float:
+        # time.monotonic() value at which the host may be fetched
+        return self._next.get(host.lower(), 0.0)
+
+    def wait_time(self, host: str) -> float:
+        return max(0.0, self.ready_at(host) - time.monotonic())
+
+    def record_fetch(self, host: str) -> float:
+        # Call after each request; returns the chosen gap in seconds
+        host = host.lower()
+        gap = self.crawl_delay(host) + random.uniform(*self.jitter)
+        with self._lock:
+            self._next[host] = max(self._next.get(host, 0.0), time.monotonic() + gap)
+        return gap
+
+    def defer(self, host: str, seconds: float):
+        # Retry-After / backoff: keep the host idle for at least `seconds`
+        host = host.lower()
+        with self._lock:
+            self._next[host] = max(self._next.get(host, 0.0), time.monotonic() + seconds)
+
+
+# --- Parse repeated --host-delay HOST=SECONDS options ---
+def parse_host_delays(values) -> dict:
+    overrides = {}
+    for item in values or []:
+        host, sep, delay = item.partition("=")
+        if not sep:
+            raise ValueError(f"expected HOST=SECONDS, got {item!r}")
+        overrides[host.strip().lower()] = float(delay)
+    return overrides
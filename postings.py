@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import heapq
+import itertools
+import mmap
+import os
+import shutil
+import struct
+import sys
+import time
+from array import array
+from itertools import accumulate
+
+from build_index import load_mapping
+from termdict import TermDict, TermDictWriter
+
+# --- Binary index layout (little-endian), one directory ---
+# docs.bin     : b"IDOC", version u32, count u64, (count + 1) url offsets u64,
+#                count doc lengths u32 (tokens), then the UTF-8 URLs
+# terms.bin    : b"ITRM", version u32, count u64, (count + 1) term offsets u64,
+#                count x (postings offset u64, doc freq u32, skip offset u64),
+#                then the UTF-8 terms in sorted (byte) order
+# postings.bin : b"IPST", version u32, then per term its postings sorted by
+#                doc ID as varint pairs (doc ID - previous doc ID, term count)
+# skips.bin    : b"ISKP", version u32, then for every term with more than
+#                BLOCK postings one entry per block of BLOCK postings: last doc
+#                ID, end of the block (bytes from the term's start), largest
+#                count and shortest document in the block (all u32). Skip
+#                offset 0 means the term has a single block and no entries.
+# terms.dict   : the terms again, front-coded with their doc freqs, for prefix
+#                and wildcard lookups (termdict.py)
+# Doc IDs are dense over the documents with postings: url_mapping order, then
+# URLs only found in the index. Mapped URLs without postings get no doc ID.
+VERSION = 2
+BLOCK = 128
+HEAD = struct.Struct("<4sIQ")
+POSTINGS_HEAD = struct.Struct("<4sI")
+TERM_ENTRY = struct.Struct("<QIQ")
+SKIP = struct.Struct("<IIII")
+
+
+# --- LEB128 varints ---
+def encode_varints(numbers) -> bytes:
+    out = bytearray()
+    for n in numbers:
+        while n >= 0x80:
+            out.append((n & 0x7F) | 0x80)
+            n >>= 7
+        out.append(n)
+    return bytes(out)
+
+
+def encode_postings(doc_ids: list, counts: list, last: int = 0) -> bytes:
+    # doc_ids must be sorted and above `last`, the doc ID before them
+    pairs = []
+    for doc, count in zip(doc_ids, counts):
+        pairs.append(doc - last)
+        pairs.append(count)
+        last = doc
+    return encode_varints(pairs)
+
+
+def decode_postings(data, doc: int = 0) -> tuple:
+    # doc is the doc ID the first delta is relative to
+    if data and max(data) < 0x80:
+        # Every delta and count fits in one byte (the usual case inside a
+        # block of a frequent term): slice instead of looping
+        return list(accumulate(data[0::2], initial=doc))[1:], list(data[1::2])
+    doc_ids = []
+    counts = []
+    n = shift = 0
+    want_doc = True
+    for byte in data:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if want_doc:
+            doc += n
+            doc_ids.append(doc)
+        else:
+            counts.append(n)
+        want_doc = not want_doc
+        n = shift = 0
+    return doc_ids, counts
+
+
+# --- Read text part files (ReducerIndex / build_index.py output) in term order ---
+# Every part is sorted by term, and a term lives in one part only.
+def read_text_index(index_dir: str):
+    paths = sorted(glob.glob(os.path.join(index_dir, "part-*")))
+    files = [open(path, "r", encoding="utf-8") for path in paths]
+    try:
+        for line in heapq.merge(*files):
+            term, _, postings = line.rstrip("\n").partition("\t")
+            if postings:
+                yield term, postings
+    finally:
+        for f in files:
+            f.close()
+
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _write_table(path: str, magic: bytes, offsets: array, fixed: bytes, blob_path: str):
+    with open(path, "wb") as out:
+        out.write(HEAD.pack(magic, VERSION, len(offsets) - 1))
+        out.write(_le_bytes(offsets))
+        out.write(fixed)
+        with open(blob_path, "rb") as blob:
+            shutil.copyfileobj(blob, out, 1 << 20)
+    os.remove(blob_path)
+
+
+def _parse_postings(text: str, doc_of: dict, urls: list, doc_lens: array) -> dict:
+    # {doc ID: count} of one "url|count; url|count" line; unknown URLs get new IDs
+    counts = {}
+    for entry in text.split("; "):
+        url, _, count = entry.rpartition("|")
+        doc = doc_of.get(url)
+        if doc is None:
+            doc = doc_of[url] = len(urls)
+            urls.append(url)
+            doc_lens.append(0)
+        counts[doc] = counts.get(doc, 0) + int(count)
+    return counts
+
+
+# --- Write a binary index directory ---
+# postings yields (term, doc IDs, counts) in sorted term order, doc IDs sorted;
+# doc_lens must hold every document's length up front (block skip entries
+# record the shortest document per block). Terms stream through one at a
+# time; only the per-term offsets are held in memory.
+def write_binary(out_dir: str, postings, urls: list, doc_lens: array) -> int:
+    os.makedirs(out_dir, exist_ok=True)
+    term_offsets = array("Q", [0])
+    entries = bytearray()
+    terms_tmp = os.path.join(out_dir, "terms.bin.tmp")
+    postings_path = os.path.join(out_dir, "postings.bin")
+    skips_path = os.path.join(out_dir, "skips.bin")
+    dictionary = TermDictWriter(os.path.join(out_dir, "terms.dict"))
+    with open(terms_tmp, "wb") as tf, open(postings_path + ".tmp", "wb") as pf, \
+            open(skips_path + ".tmp", "wb") as sf:
+        pf.write(POSTINGS_HEAD.pack(b"IPST", VERSION))
+        sf.write(POSTINGS_HEAD.pack(b"ISKP", VERSION))
+        pos = skip_pos = POSTINGS_HEAD.size
+        for term, doc_ids, tfs in postings:
+            if len(doc_ids) <= BLOCK:
+                data = encode_postings(doc_ids, tfs)
+                skip_at = 0
+            else:
+                chunks = []
+                skips = []
+                size = last = 0
+                for i in range(0, len(doc_ids), BLOCK):
+                    block_docs, block_tfs = doc_ids[i:i + BLOCK], tfs[i:i + BLOCK]
+                    chunk = encode_postings(block_docs, block_tfs, last)
+                    chunks.append(chunk)
+                    size += len(chunk)
+                    last = block_docs[-1]
+                    skips.append(SKIP.pack(last, size, max(block_tfs),
+                                           min(doc_lens[doc] for doc in block_docs)))
+                data = b"".join(chunks)
+                sf.write(b"".join(skips))
+                skip_at = skip_pos
+                skip_pos += SKIP.size * len(skips)
+            pf.write(data)
+            entries += TERM_ENTRY.pack(pos, len(doc_ids), skip_at)
+            pos += len(data)
+            raw = term.encode("utf-8")
+            tf.write(raw)
+            term_offsets.append(term_offsets[-1] + len(raw))
+            dictionary.add(raw, len(doc_ids))
+    dictionary.close()
+    os.replace(skips_path + ".tmp", skips_path)
+    os.replace(postings_path + ".tmp", postings_path)
+    # The last term's postings end where the file ends
+    _write_table(os.path.join(out_dir, "terms.bin"), b"ITRM", term_offsets, bytes(entries),
+                 terms_tmp)
+
+    docs_tmp = os.path.join(out_dir, "docs.bin.tmp")
+    url_offsets = array("Q", [0])
+    with open(docs_tmp, "wb") as df:
+        for url in urls:
+            raw = url.encode("utf-8")
+            df.write(raw)
+            url_offsets.append(url_offsets[-1] + len(raw))
+    _write_table(os.path.join(out_dir, "docs.bin"), b"IDOC", url_offsets,
+                 _le_bytes(doc_lens), docs_tmp)
+    return len(term_offsets) - 1
+
+
+# --- Convert a text index into the binary layout ---
+# Only the URL -> doc ID table and the per-term offsets are held in memory.
+# The text is read twice: the block skip entries need every document's
+# length, which is only known after a full pass. The mapping usually covers
+# more than this input (other topics, pages without a vocab file); those
+# URLs are left out so they do not count towards BM25's N and average length.
+def build_binary(index_dir: str, mapping: dict, out_dir: str) -> tuple:
+    urls = list(dict.fromkeys(mapping.values())) if mapping else []
+    doc_of = {url: doc for doc, url in enumerate(urls)}
+    doc_lens = array("I", bytes(4 * len(urls)))
+    mapped = len(urls)
+    present = bytearray(mapped)
+    for _, text in read_text_index(index_dir):
+        for doc, count in _parse_postings(text, doc_of, urls, doc_lens).items():
+            doc_lens[doc] += count
+            if doc < mapped:
+                present[doc] = 1
+    # URLs only found in the index always have postings
+    keep = [doc for doc in range(len(urls)) if doc >= mapped or present[doc]]
+    urls = [urls[doc] for doc in keep]
+    doc_of = {url: doc for doc, url in enumerate(urls)}
+    doc_lens = array("I", (doc_lens[doc] for doc in keep))
+
+    def postings():
+        for term, text in read_text_index(index_dir):
+            counts = _parse_postings(text, doc_of, urls, doc_lens)
+            doc_ids = sorted(counts)
+            yield term, doc_ids, [counts[doc] for doc in doc_ids]
+
+    terms = write_binary(out_dir, postings(), urls, doc_lens)
+    return terms, len(urls)
+
+
+def _map_file(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# --- Memory-mapped reader over a binary index directory ---
+# Nothing is loaded up front: terms are found by binary search over the
+# sorted term table, and postings are decoded from the mapped file on demand.
+class BinaryIndex:
+    def __init__(self, index_dir: str):
+        self._terms = _map_file(os.path.join(index_dir, "terms.bin"))
+        self._docs = _map_file(os.path.join(index_dir, "docs.bin"))
+        self._postings = _map_file(os.path.join(index_dir, "postings.bin"))
+        self._skips = _map_file(os.path.join(index_dir, "skips.bin"))
+        # Prefix / wildcard lookups; indexes built before terms.dict existed
+        # get one with termdict.py build
+        dict_path = os.path.join(index_dir, "terms.dict")
+        self.dictionary = TermDict(dict_path) if os.path.exists(dict_path) else None
+        for name, data, magic in (("terms.bin", self._terms, b"ITRM"),
+                                  ("docs.bin", self._docs, b"IDOC")):
+            got, version, _ = HEAD.unpack_from(data, 0)
+            if got != magic or version != VERSION:
+                raise ValueError(f"{os.path.join(index_dir, name)} is not a binary index file")
+        self.term_count = HEAD.unpack_from(self._terms, 0)[2]
+        self.doc_count = HEAD.unpack_from(self._docs, 0)[2]
+        n = self.term_count
+        self._term_offsets = HEAD.size
+        self._term_entries = self._term_offsets + 8 * (n + 1)
+        self._term_blob = self._term_entries + TERM_ENTRY.size * n
+        d = self.doc_count
+        self._url_offsets = HEAD.size
+        self._doc_lens = self._url_offsets + 8 * (d + 1)
+        self._url_blob = self._doc_lens + 4 * d
+        # 4 bytes per document; BM25 needs every length at hand
+        self.doc_lens = array("I", self._docs[self._doc_lens:self._url_blob])
+        if sys.byteorder == "big":
+            self.doc_lens.byteswap()
+        self.avg_doc_len = sum(self.doc_lens) / d if d else 0.0
+
+    def term(self, i: int) -> str:
+        return self._term_bytes(i).decode("utf-8")
+
+    def _term_bytes(self, i: int) -> bytes:
+        start, end = struct.unpack_from("<QQ", self._terms, self._term_offsets + 8 * i)
+        return self._terms[self._term_blob + start:self._term_blob + end]
+
+    def find(self, term: str) -> int:
+        # Position of term in the sorted term table, or -1
+        key = term.encode("utf-8")
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.term_count and self._term_bytes(lo) == key else -1
+
+    def doc_freq(self, term: str) -> int:
+        i = self.find(term)
+        return 0 if i < 0 else self.entry(i)[2]
+
+    def entry(self, i: int) -> tuple:
+        # (postings start, postings end, doc freq, skip offset) of the i-th term
+        start, df, skip = TERM_ENTRY.unpack_from(self._terms,
+                                                 self._term_entries + TERM_ENTRY.size * i)
+        if i + 1 < self.term_count:
+            end = TERM_ENTRY.unpack_from(self._terms,
+                                         self._term_entries + TERM_ENTRY.size * (i + 1))[0]
+        else:
+            end = len(self._postings)
+        return start, end, df, skip
+
+    def blocks(self, i: int) -> list:
+        # [(last doc, start, end, max count, min doc length)] per block, or
+        # None when the term has a single block
+        start, end, df, skip = self.entry(i)
+        if not skip:
+            return None
+        blocks = []
+        prev = start
+        for last, block_end, max_tf, min_len in SKIP.iter_unpack(
+                self._skips[skip:skip + SKIP.size * (-(-df // BLOCK))]):
+            blocks.append((last, prev, start + block_end, max_tf, min_len))
+            prev = start + block_end
+        return blocks
+
+    def decode(self, start: int, end: int, base: int = 0) -> tuple:
+        return decode_postings(self._postings[start:end], base)
+
+    def postings_at(self, i: int) -> tuple:
+        # (doc IDs, term counts) of the i-th term
+        start, end, _, _ = self.entry(i)
+        return decode_postings(self._postings[start:end])
+
+    def postings(self, term: str) -> tuple:
+        i = self.find(term)
+        return ([], []) if i < 0 else self.postings_at(i)
+
+    def url(self, doc: int) -> str:
+        start, end = struct.unpack_from("<QQ", self._docs, self._url_offsets + 8 * doc)
+        return self._docs[self._url_blob + start:self._url_blob + end].decode("utf-8")
+
+    def doc_len(self, doc: int) -> int:
+        return self.doc_lens[doc]
+
+    def terms(self):
+        for i in range(self.term_count):
+            yield self.term(i)
+
+    def close(self):
+        for data in (self._terms, self._docs, self._postings, self._skips):
+            if isinstance(data, mmap.mmap):
+                data.close()
+        if self.dictionary is not None:
+            self.dictionary.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Write a binary index back out as one text part file ---
+def export_text(index: BinaryIndex, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(index.term_count):
+            doc_ids, counts = index.postings_at(i)
+            postings = "; ".join(f"{index.url(doc)}|{count}" for doc, count in zip(doc_ids, counts))
+            f.write(f"{index.term(i)}\t{postings}\n")
+
+
+def _dir_size(path: str, pattern: str) -> int:
+    return sum(os.path.getsize(p) for p in glob.glob(os.path.join(path, pattern)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary postings: build, inspect and export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Convert part-r-NNNNN text output into the binary format")
+    build.add_argument("index_dir", help="Directory of text part files")
+    build.add_argument("mapping", help="url_mapping.tsv (or .json); fixes the doc ID order")
+    build.add_argument("out_dir")
+    stats = sub.add_parser("stats", help="Terms, documents and sizes")
+    stats.add_argument("binary_dir")
+    look = sub.add_parser("lookup", help="Print the postings of a term")
+    look.add_argument("binary_dir")
+    look.add_argument("term")
+    look.add_argument("--limit", type=int, default=20)
+    export = sub.add_parser("export", help="Write the index back out as one text part file")
+    export.add_argument("binary_dir")
+    export.add_argument("out_file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.time()
+        terms, docs = build_binary(args.index_dir, load_mapping(args.mapping), args.out_dir)
+        text = _dir_size(args.index_dir, "part-*")
+        binary = _dir_size(args.out_dir, "*.bin")
+        print(f"{terms} terms, {docs} documents in {time.time() - start:.1f}s")
+        print(f"Text index {text / 1e6:.1f} MB -> binary {binary / 1e6:.1f} MB "
+              f"({text / max(binary, 1):.1f}x smaller)")
+    elif args.command == "stats":
+        with BinaryIndex(args.binary_dir) as index:
+            print(f"{index.term_count} terms, {index.doc_count} documents, "
+                  f"average length {index.avg_doc_len:.1f} tokens")
+        for name in ("terms.bin", "docs.bin", "postings.bin", "skips.bin", "terms.dict"):
+            if not os.path.exists(os.path.join(args.binary_dir, name)):
+                continue
+            print(f"  {name}: {os.path.getsize(os.path.join(args.binary_dir, name)) / 1e6:.2f} MB")
+    elif args.command == "lookup":
+        with BinaryIndex(args.binary_dir) as index:
+            doc_ids, counts = index.postings(args.term)
+            print(f"{args.term}: {len(doc_ids)} documents")
+            ranked = sorted(zip(counts, doc_ids), reverse=True)
+            for count, doc in itertools.islice(ranked, args.limit):
+                print(f"  {count:>6}  {index.url(doc)}")
+    else:
+        with BinaryIndex(args.binary_dir) as index:
+            export_text(index, args.out_file)
+        print(f"Wrote {args.out_file}")
+
+
+if __name__ == "__main__":
+    main()
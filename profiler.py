@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+STAGES = ("fetch", "parse", "tokenize", "links", "store", "politeness")
+_NO_SPAN = nullcontext()
+
+
+def no_span(stage: str):
+    # Stand-in for CrawlProfiler.span when profiling is off
+    return _NO_SPAN
+
+
+def _frame_name(code) -> str:
+    # One flame graph frame per function; ';' separates frames in the folded format
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(";", ":")
+
+
+# --- Per-stage profiling of a crawl (crawler --profile) ---
+# span(stage) times a pipeline stage (fetch, parse, tokenize, links, store,
+# politeness) and remembers which stage each thread is in. Work that is timed
+# elsewhere (async fetches, pages parsed in pool processes) is added with
+# add(). On top of the span totals:
+#   cprofile  runs one cProfile.Profile per thread and stage while a span is
+#             open; dump() merges them into <stage>.pstats
+#   sample    a thread samples every --profile-interval seconds the stacks of
+#             the threads inside a span (plus the main thread as "other")
+#             and dump() writes them as stacks.folded, the collapsed format of
+#             flamegraph.pl, inferno and speedscope
+# dump() runs at exit and, where available, on SIGUSR1; the files hold
+# everything since the start of the crawl.
+class CrawlProfiler:
+    def __init__(self, out_dir: str, mode: str = "spans", interval: float = 0.005):
+        if mode not in ("spans", "cprofile", "sample"):
+            raise ValueError(f"unknown profile mode {mode!r}")
+        self.out_dir = out_dir
+        self.mode = mode
+        self.interval = interval
+        self.started = time.time()
+        self.totals = Counter()   # stage -> seconds
+        self.counts = Counter()   # stage -> spans
+        self.samples = Counter()  # folded stack -> samples
+        self.skipped = 0          # spans cProfile could not run in
+        self._stages = {}         # thread ident -> stage it is in
+        self._profiles = {}       # (thread ident, stage) -> (Profile, Lock)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._dump_requested = threading.Event()
+        self._threads = []
+
+    def start(self):
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.mode == "sample":
+            self._threads.append(threading.Thread(target=self._sample, daemon=True))
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self._dump_requested.set())
+            self._threads.append(threading.Thread(target=self._dump_on_signal, daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    @contextmanager
+    def span(self, stage: str):
+        ident = threading.get_ident()
+        outer = self._stages.get(ident)
+        self._stages[ident] = stage
+        profile = None
+        if self.mode == "cprofile":
+            profile, lock = self._profile(ident, stage)
+            lock.acquire()
+            try:
+                profile.enable()
+            except ValueError:
+                # Another profiler is active (nested span, or Python 3.12+,
+                # where cProfile covers every thread at once)
+                lock.release()
+                profile = None
+                self.skipped += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            took = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                lock.release()
+            self._stages[ident] = outer
+            self.add(stage, took)
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.totals[stage] += seconds
+            self.counts[stage] += 1
+
+    def _profile(self, ident: int, stage: str) -> tuple:
+        key = (ident, stage)
+        entry = self._profiles.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._profiles.setdefault(key, (cProfile.Profile(), threading.Lock()))
+        return entry
+
+    def _sample(self):
+        me = threading.get_ident()
+        main = threading.main_thread().ident
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                stage = self._stages.get(ident)
+                if ident == me or (stage is None and ident != main):
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                names.append(stage or "other")
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self.samples.update(stacks)
+
+    def _dump_on_signal(self):
+        while True:
+            self._dump_requested.wait()
+            self._dump_requested.clear()
+            if self._stop.is_set():
+                return
+            print(f"Profile: {self.dump()}")
+
+    def summary(self) -> str:
+        with self._lock:
+            totals, counts = dict(self.totals), dict(self.counts)
+        spent = sum(totals.values()) or 1e-9
+        order = [s for s in STAGES if s in totals] + sorted(set(totals) - set(STAGES))
+        return ", ".join(f"{stage} {totals[stage]:.1f}s ({totals[stage] / spent:.0%}, "
+                         f"{counts[stage]} x {totals[stage] / counts[stage] * 1000:.2f} ms)"
+                         for stage in order)
+
+    def dump(self) -> str:
+        # Write the profile files; returns the summary line
+        with self._lock:
+            totals, counts = dict(self.totals), dict(self.counts)
+            samples = dict(self.samples)
+        lines = [f"{'stage':<12}{'spans':>9}{'seconds':>10}{'mean ms':>10}{'share':>8}"]
+        spent = sum(totals.values()) or 1e-9
+        for stage in [s for s in STAGES if s in totals] + sorted(set(totals) - set(STAGES)):
+            lines.append(f"{stage:<12}{counts[stage]:>9}{totals[stage]:>10.2f}"
+                         f"{totals[stage] / counts[stage] * 1000:>10.2f}"
+                         f"{totals[stage] / spent:>8.0%}")
+        lines.append(f"wall clock {time.time() - self.started:.1f}s")
+        self._write("spans.txt", "\n".join(lines) + "\n")
+
+        if self.mode == "sample":
+            self._write("stacks.folded", "".join(f"{stack} {n}\n"
+                                                 for stack, n in sorted(samples.items())))
+        elif self.mode == "cprofile":
+            for stage in sorted({stage for _, stage in self._profiles}):
+                stats = None
+                for (_, s), (profile, lock) in list(self._profiles.items()):
+                    if s != stage:
+                        continue
+                    # Waits for a span that is open in another thread to close
+                    with lock:
+                        if stats is None:
+                            stats = pstats.Stats(profile)
+                        else:
+                            stats.add(profile)
+                path = os.path.join(self.out_dir, f"{stage}.pstats")
+                stats.dump_stats(path + ".tmp")
+                os.replace(path + ".tmp", path)
+                text = io.StringIO()
+                pstats.Stats(path, stream=text).sort_stats("cumulative").print_stats(30)
+                self._write(f"{stage}.txt", text.getvalue())
+        return f"{self.summary()} -> {self.out_dir}"
+
+    def _write(self, name: str, text: str):
+        path = os.path.join(self.out_dir, name)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def close(self) -> str:
+        self._stop.set()
+        self._dump_requested.set()
+        for thread in self._threads:
+            thread.join()
+        return self.dump()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show the hottest stacks of a sampled crawl profile (stacks.folded)"
+    )
+    parser.add_argument("folded", help="stacks.folded written by crawler --profile sample")
+    parser.add_argument("--stage", help="Only stacks of this stage")
+    parser.add_argument("--top", type=int, default=20, help="Functions to list")
+    args = parser.parse_args()
+
+    own = Counter()    # function -> samples where it is on top of the stack
+    total = Counter()  # function -> samples where it is anywhere on the stack
+    stages = Counter()
+    with open(args.folded, encoding="utf-8") as f:
+        for line in f:
+            stack, _, n = line.rstrip("\n").rpartition(" ")
+            frames = stack.split(";")
+            if args.stage and frames[0] != args.stage:
+                continue
+            n = int(n)
+            stages[frames[0]] += n
+            own[frames[-1]] += n
+            for name in set(frames[1:]):
+                total[name] += n
+    samples = sum(stages.values()) or 1
+    print("  ".join(f"{stage} {n / samples:.0%}" for stage, n in stages.most_common()))
+    print(f"{'self':>7}{'total':>7}  function")
+    for name, n in own.most_common(args.top):
+        print(f"{n / samples:>7.1%}{total[name] / samples:>7.1%}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from postings import BinaryIndex
+from termdict import WILDCARDS
+
+END = float("inf")
+
+
+# --- Cursor over one term's postings, decoding a block at a time ---
+# advance() skips whole blocks by their last doc ID without decoding them.
+# Every block also has a score bound (from its largest count and shortest
+# document), which lets the search skip blocks that cannot reach the top k.
+class TermCursor:
+    def __init__(self, index: BinaryIndex, i: int, idf: float, norms: list, k1: float,
+                 b: float, avg: float):
+        self.index = index
+        self.idf = idf
+        self.norms = norms
+        self.k1 = k1
+        start, end, self.df, _ = index.entry(i)
+        blocks = index.blocks(i)
+        if blocks is None:
+            # Single block: decode it now, its bound comes from the postings
+            docs, tfs = index.decode(start, end)
+            self.blocks = [(docs[-1], start, end)]
+            self.uppers = [max(self.weight(tf, norms[doc]) for doc, tf in zip(docs, tfs))]
+            self._set(0, docs, tfs)
+        else:
+            self.blocks = [(last, s, e) for last, s, e, _, _ in blocks]
+            self.uppers = [self.weight(max_tf, k1 * (1 - b + b * min_len / avg))
+                           for _, _, _, max_tf, min_len in blocks]
+            self._load(0)
+        self.upper = max(self.uppers)
+
+    def weight(self, tf: int, norm: float) -> float:
+        return self.idf * tf * (self.k1 + 1) / (tf + norm)
+
+    def _set(self, block: int, docs: list, tfs: list):
+        self.block = block
+        self.docs = docs
+        self.tfs = tfs
+        self.pos = 0
+        self.doc = docs[0]
+        self.block_last = self.blocks[block][0]
+        self.block_upper = self.uppers[block]
+
+    def _load(self, block: int):
+        if block >= len(self.blocks):
+            self.block = block
+            self.doc = self.block_last = END
+            self.block_upper = 0.0
+            return
+        _, start, end = self.blocks[block]
+        base = self.blocks[block - 1][0] if block else 0
+        self._set(block, *self.index.decode(start, end, base))
+
+    def next(self):
+        self.pos += 1
+        if self.pos < len(self.docs):
+            self.doc = self.docs[self.pos]
+        else:
+            self._load(self.block + 1)
+
+    def advance(self, target: int):
+        # Move to the first doc >= target
+        if self.doc >= target:
+            return
+        if self.block_last < target:
+            block = self.block + 1
+            while block < len(self.blocks) and self.blocks[block][0] < target:
+                block += 1
+            self._load(block)
+            if self.doc >= target:
+                return
+        self.pos = bisect_left(self.docs, target, self.pos)
+        self.doc = self.docs[self.pos]
+
+    def score(self) -> float:
+        return self.weight(self.tfs[self.pos], self.norms[self.doc])
+
+
+# --- BM25 search over a binary index (postings.py) ---
+# OR queries use MaxScore: terms are ordered by their score upper bound and
+# the terms whose bounds together cannot lift a document into the current
+# top k are only probed (advance) for documents the other terms produced.
+# AND queries walk the rarest term and probe the others. Blocks whose bound
+# cannot reach the top k are skipped in both. The results are exactly the
+# top k an exhaustive scorer returns.
+# An incremental index (incremental_index.py) is searched segment by segment
+# with one shared top k; document counts, lengths and frequencies are summed
+# over the segments so scores match a single index. Deleted documents are
+# skipped but, as in Lucene, still count towards document frequencies until
+# a merge drops them. Query terms with wildcards (* ? [abc]) stand for their
+# max_expansions most frequent matches in the term dictionary (OR queries).
+class QueryEngine:
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75,
+                 max_expansions: int = 50):
+        if os.path.exists(os.path.join(index_dir, "state.sqlite3")):
+            from incremental_index import open_segments
+            segments = open_segments(index_dir)
+        else:
+            segments = [(BinaryIndex(index_dir), frozenset())]
+        self.segments = [index for index, _ in segments]
+        self.deleted = [dead for _, dead in segments]
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        # Global doc IDs: a segment's doc ID plus the docs of the segments before it
+        self.bases = [0]
+        total = 0
+        self.doc_count = 0
+        for index, dead in segments:
+            self.bases.append(self.bases[-1] + index.doc_count)
+            # Empty documents (pages without tokens, mapped URLs of an older
+            # build) cannot match and are left out of N and the average length
+            self.doc_count += index.doc_count - index.doc_lens.count(0) - \
+                sum(1 for doc in dead if index.doc_lens[doc])
+            total += sum(index.doc_lens) - sum(index.doc_lens[doc] for doc in dead)
+        self.avg_doc_len = (total / self.doc_count if self.doc_count else 0.0) or 1.0
+        # Length part of the BM25 denominator, per document
+        self.norms = [[k1 * (1 - b + b * dl / self.avg_doc_len) for dl in index.doc_lens]
+                      for index in self.segments]
+
+    def idf(self, df: int) -> float:
+        n = self.doc_count
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _dictionaries(self) -> list:
+        if any(index.dictionary is None for index in self.segments):
+            raise ValueError("index has no terms.dict; run termdict.py build on it")
+        return [index.dictionary for index in self.segments]
+
+    def complete(self, prefix: str, k: int = 10) -> list:
+        # [(term, doc freq)] of the k most frequent terms starting with prefix
+        dictionaries = self._dictionaries()
+        if len(dictionaries) == 1:
+            return dictionaries[0].complete(prefix, k)
+        dfs = {}
+        for dictionary in dictionaries:
+            for term, _, df in dictionary.prefix(prefix):
+                dfs[term] = dfs.get(term, 0) + df
+        return heapq.nsmallest(k, dfs.items(), key=lambda t: (-t[1], t[0]))
+
+    def expand(self, pattern: str, limit: int = None) -> list:
+        # [(term, doc freq)] of the terms matching a wildcard, most frequent first
+        dictionaries = self._dictionaries()
+        if len(dictionaries) == 1:
+            return dictionaries[0].expand(pattern, limit)
+        dfs = {}
+        for dictionary in dictionaries:
+            for term, df in dictionary.expand(pattern):
+                dfs[term] = dfs.get(term, 0) + df
+        ranked = sorted(dfs.items(), key=lambda t: (-t[1], t[0]))
+        return ranked if limit is None else ranked[:limit]
+
+    def _terms(self, query: str, mode: str) -> list:
+        terms = []
+        for token in query.split():
+            if not WILDCARDS.search(token):
+                terms.append(token)
+            elif mode == "and":
+                raise ValueError(f"wildcard term {token!r} needs an OR query")
+            else:
+                terms.extend(term for term, _ in self.expand(token, self.max_expansions))
+        return terms
+
+    def _lookup(self, terms: list) -> list:
+        # [(idf, [term position or -1 per segment])] per distinct term
+        found_terms = []
+        for term in dict.fromkeys(terms):
+            found = [index.find(term) for index in self.segments]
+            df = sum(index.entry(i)[2] for index, i in zip(self.segments, found) if i >= 0)
+            found_terms.append((self.idf(df), found))
+        return found_terms
+
+    def search(self, query: str, k: int = 10, mode: str = "or") -> list:
+        # [(score, url)] best first
+        terms = self._lookup(self._terms(query, mode))
+        top = []
+        theta = -1.0
+        for s, index in enumerate(self.segments):
+            cursors = [None if found[s] < 0 else
+                       TermCursor(index, found[s], idf, self.norms[s], self.k1, self.b,
+                                  self.avg_doc_len)
+                       for idf, found in terms]
+            if mode == "and":
+                if cursors and None not in cursors:
+                    theta = self._conjunctive(cursors, k, top, theta, s)
+            else:
+                cursors = [c for c in cursors if c is not None]
+                if cursors:
+                    theta = self._max_score(cursors, k, top, theta, s)
+        return self._results(top)
+
+    def _results(self, top: list) -> list:
+        results = []
+        for score, neg_doc in sorted(top, reverse=True):
+            s = bisect_right(self.bases, -neg_doc) - 1
+            results.append((score, self.segments[s].url(-neg_doc - self.bases[s])))
+        return results
+
+    @staticmethod
+    def _offer(top: list, k: int, score: float, doc: int) -> float:
+        # Keep the k best (ties go to the lower doc ID); returns the new threshold
+        if len(top) < k:
+            heapq.heappush(top, (score, -doc))
+        elif (score, -doc) > top[0]:
+            heapq.heapreplace(top, (score, -doc))
+        return top[0][0] if len(top) == k else -1.0
+
+    def _max_score(self, cursors: list, k: int, top: list, theta: float, s: int) -> float:
+        # Adds segment s's hits to top; returns the new threshold
+        cursors.sort(key=lambda c: c.upper)
+        bounds = [0.0]
+        for c in cursors:
+            bounds.append(bounds[-1] + c.upper)  # bounds[j]: best score of terms 0..j-1
+        dead = self.deleted[s]
+        base = self.bases[s]
+        first = 0  # cursors[first:] are essential
+        n = len(cursors)
+        while first < n:
+            if first == n - 1:
+                # One essential term left: score its postings a block at a time
+                return self._max_score_tail(cursors, bounds, top, k, theta, s)
+            essential = cursors[first:]
+            # Block-max skip: no document before the nearest block end among the
+            # essential terms can beat theta, so jump past it without scoring
+            if sum(c.block_upper for c in essential) + bounds[first] <= theta:
+                target = min(c.block_last for c in essential)
+                if target == END:
+                    break
+                for c in essential:
+                    c.advance(target + 1)
+                continue
+            doc = min(c.doc for c in essential)
+            if doc == END:
+                break
+            score = 0.0
+            for c in essential:
+                if c.doc == doc:
+                    score += c.score()
+                    c.next()
+            if doc in dead:
+                continue
+            for j in range(first - 1, -1, -1):
+                if score + bounds[j + 1] <= theta:
+                    break
+                c = cursors[j]
+                c.advance(doc)
+                if c.doc == doc:
+                    score += c.score()
+            if score > theta:
+                theta = self._offer(top, k, score, base + doc)
+            while first < n and bounds[first + 1] <= theta:
+                first += 1
+        return theta
+
+    def _max_score_tail(self, cursors: list, bounds: list, top: list, k: int,
+                        theta: float, s: int) -> float:
+        # MaxScore once only the strongest term is essential (and plain
+        # single-term queries): its blocks are scored with one list
+        # comprehension each, and only documents that could still enter the
+        # top k probe the other terms.
+        first = len(cursors) - 1
+        c = cursors[first]
+        weight = c.idf * (self.k1 + 1)
+        norms = self.norms[s]
+        dead = self.deleted[s]
+        base = self.bases[s]
+        while c.doc != END:
+            rest = bounds[first]
+            if c.block_upper + rest <= theta:
+                c.advance(c.block_last + 1)
+                continue
+            docs, tfs = c.docs[c.pos:], c.tfs[c.pos:]
+            scores = [weight * tf / (tf + norms[doc]) for doc, tf in zip(docs, tfs)]
+            for doc, score in zip(docs, scores):
+                if score + rest <= theta or doc in dead:
+                    continue
+                for j in range(first - 1, -1, -1):
+                    if score + bounds[j + 1] <= theta:
+                        break
+                    other = cursors[j]
+                    other.advance(doc)
+                    if other.doc == doc:
+                        score += other.score()
+                if score > theta:
+                    theta = self._offer(top, k, score, base + doc)
+                    if c.upper + rest <= theta:
+                        return theta
+            c._load(c.block + 1)
+        return theta
+
+    def _conjunctive(self, cursors: list, k: int, top: list, theta: float, s: int) -> float:
+        # The rarest term leads, a block at a time; the others are only probed
+        # for documents whose lead score plus their bounds could enter the top k
+        cursors.sort(key=lambda c: c.df)
+        lead, others = cursors[0], cursors[1:]
+        rest = sum(c.upper for c in others)
+        weight = lead.idf * (self.k1 + 1)
+        norms = self.norms[s]
+        dead = self.deleted[s]
+        base = self.bases[s]
+        while lead.doc != END:
+            if lead.block_upper + rest <= theta:
+                lead.advance(lead.block_last + 1)
+                continue
+            docs, tfs = lead.docs[lead.pos:], lead.tfs[lead.pos:]
+            scores = [weight * tf / (tf + norms[doc]) for doc, tf in zip(docs, tfs)]
+            for doc, score in zip(docs, scores):
+                if score + rest <= theta or doc in dead:
+                    continue
+                for c in others:
+                    c.advance(doc)
+                    if c.doc != doc:
+                        break
+                    score += c.score()
+                else:
+                    if score > theta:
+                        theta = self._offer(top, k, score, base + doc)
+                        if lead.upper + rest <= theta:
+                            return theta
+                    continue
+                if c.doc == END:
+                    return theta
+            lead._load(lead.block + 1)
+        return theta
+
+    def search_exhaustive(self, query: str, k: int = 10, mode: str = "or") -> list:
+        # Scores every posting; the reference for search()
+        terms = self._lookup(self._terms(query, mode))
+        scores = {}
+        hits = {}
+        for idf, found in terms:
+            for s, index in enumerate(self.segments):
+                if found[s] < 0:
+                    continue
+                norms, dead, base = self.norms[s], self.deleted[s], self.bases[s]
+                for doc, tf in zip(*index.postings_at(found[s])):
+                    if doc in dead:
+                        continue
+                    score = idf * tf * (self.k1 + 1) / (tf + norms[doc])
+                    scores[base + doc] = scores.get(base + doc, 0.0) + score
+                    hits[base + doc] = hits.get(base + doc, 0) + 1
+        if mode == "and":
+            scores = {doc: s for doc, s in scores.items() if hits[doc] == len(terms)}
+        top = heapq.nlargest(k, ((s, -doc) for doc, s in scores.items()))
+        return self._results(top)
+
+    def close(self):
+        for index in self.segments:
+            index.close()
+
+
+# --- HTTP endpoints: /search?q=..&k=..&mode=.., /complete?q=prefix&k=.., /expand?q=pattern ---
+def make_handler(engine: QueryEngine, lowercase: bool = False):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            q = params.get("q", "")
+            if lowercase:
+                q = q.lower()
+            start = time.perf_counter()
+            try:
+                k = int(params.get("k", 10))
+                if url.path == "/search":
+                    body = {"query": q, "results": [
+                        {"score": round(score, 4), "url": hit}
+                        for score, hit in engine.search(q, k, params.get("mode", "or"))]}
+                elif url.path == "/complete":
+                    body = {"prefix": q, "terms": [{"term": term, "df": df}
+                                                   for term, df in engine.complete(q, k)]}
+                elif url.path == "/expand":
+                    body = {"pattern": q, "terms": [
+                        {"term": term, "df": df}
+                        for term, df in engine.expand(q, int(params.get("limit", 50)))]}
+                else:
+                    self.send_error(404)
+                    return
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            body["ms"] = round((time.perf_counter() - start) * 1000, 2)
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 search over a binary index (postings.py)")
+    parser.add_argument("index_dir", help="Directory written by postings.py build / "
+                                          "build_index.py --binary / incremental_index.py")
+    parser.add_argument("query", nargs="*",
+                        help="Query terms; without them, queries are read from stdin, one per line")
+    parser.add_argument("-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--mode", choices=["or", "and"], default="or",
+                        help="or ranks pages with any of the terms; and only pages with all")
+    parser.add_argument("--lowercase", action="store_true",
+                        help="Lowercase queries (for indexes of --lowercase crawls)")
+    parser.add_argument("--k1", type=float, default=1.2)
+    parser.add_argument("--b", type=float, default=0.75)
+    parser.add_argument("--exhaustive", action="store_true",
+                        help="Score every posting instead of MaxScore / leapfrogging "
+                             "(same results, for comparison)")
+    parser.add_argument("--max-expansions", type=int, default=50,
+                        help="Terms a wildcard query term (* ? [abc]) expands to, most frequent first")
+    parser.add_argument("--serve", type=int, metavar="PORT",
+                        help="Serve /search, /complete (autocomplete) and /expand as JSON over HTTP")
+    args = parser.parse_args()
+
+    engine = QueryEngine(args.index_dir, args.k1, args.b, args.max_expansions)
+    if args.serve:
+        server = ThreadingHTTPServer(("", args.serve), make_handler(engine, args.lowercase))
+        print(f"Serving {args.index_dir} on http://localhost:{args.serve}/ "
+              f"(/search?q=, /complete?q=, /expand?q=)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            engine.close()
+        return
+    search = engine.search_exhaustive if args.exhaustive else engine.search
+    queries = [" ".join(args.query)] if args.query else (line.strip() for line in sys.stdin)
+    try:
+        for query in queries:
+            if not query:
+                continue
+            if args.lowercase:
+                query = query.lower()
+            start = time.perf_counter()
+            try:
+                results = search(query, args.k, args.mode)
+            except ValueError as e:
+                print(f"{query!r}: {e}")
+                continue
+            took = (time.perf_counter() - start) * 1000
+            print(f"{query!r}: {len(results)} results in {took:.1f} ms")
+            for rank, (score, url) in enumerate(results, 1):
+                print(f"{rank:>3}. {score:7.3f}  {url}")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,173 @@
-import os, json, hashlib
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import re
+import time
+from collections import deque
+from multiprocessing import Pool
 
-master = "crawl_output/all_urls_master.txt"
-out   = "crawl_output/url_mapping_final.json"
+from segments import SEGMENT_RE, live_keys
 
-mapping = {}
-with open(master, "r", encoding="utf-8") as mf:
-    for line in mf:
-        url = line.strip()
+VOCAB_RE = re.compile(r"^vocab_([0-9a-f]{16})\.txt$")
+
+# Hashes of the vocab files on disk, handed to each worker by the pool initializer
+_vocab = None
+
+
+# --- Read the master list in newline-aligned blocks ---
+def read_blocks(path: str, block_size: int):
+    with open(path, "rb") as mf:
+        tail = b""
+        while True:
+            data = mf.read(block_size)
+            if not data:
+                break
+            data = tail + data
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                tail = data
+                continue
+            tail = data[cut:]
+            yield data[:cut]
+        # A last line without its newline was torn by a crash (as
+        # BatchedLineWriter.repair_tail would cut it), not a URL
+        if tail:
+            print(f"Ignoring a torn last line in {path} ({len(tail)} bytes)")
+
+
+# --- Collect {hash -> path} for every page stored under a directory ---
+# vocab_<hash>.txt files and the live documents of segment-NNNNN.seg files
+# (--vocab-format segments); a segment document's path is its directory's
+# segment pattern.
+def scan_vocab(root: str) -> dict:
+    found = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        segs = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                m = VOCAB_RE.match(entry.name)
+                if m:
+                    found[m.group(1)] = entry.path
+                elif SEGMENT_RE.match(entry.name):
+                    segs.append(entry.path)
+        if segs:
+            pattern = os.path.join(directory, "segment-*.seg")
+            for key in live_keys(segs):
+                found[key] = pattern
+    return found
+
+
+def _init_worker(vocab):
+    global _vocab
+    _vocab = vocab
+
+
+# --- Worker: hash one block of URLs ---
+# Returns the TSV text for the block, the vocab hashes it accounted for and
+# the (hash, url) pairs that have no vocab file.
+def hash_block(block: bytes):
+    out = []
+    matched = []
+    missing = []
+    for raw in block.split(b"\n"):
+        url = raw.strip().decode("utf-8", errors="replace")
+        if not url:
+            continue
         key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
-        mapping[key] = url
+        out.append(f"{key}\t{url}\n")
+        if _vocab is not None:
+            if key in _vocab:
+                matched.append(key)
+            else:
+                missing.append((key, url))
+    return "".join(out), matched, missing
+
+
+# --- Ordered pool.map with at most `window` blocks in flight ---
+# (Pool.imap would read the whole master file ahead into its task queue)
+def bounded_map(pool, fn, items, window: int):
+    pending = deque()
+    for item in items:
+        pending.append(pool.apply_async(fn, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild url_mapping.tsv from all_urls_master.txt and cross-check vocab files"
+    )
+    parser.add_argument("--master", default="crawl_output/all_urls_master.txt",
+                        help="Master URL list written by the crawler")
+    parser.add_argument("--out", default="crawl_output/url_mapping_final.tsv",
+                        help="Mapping log to write (<hash>\\t<url> per line)")
+    parser.add_argument("--vocab-dir",
+                        help="Crawl output directory to cross-check vocab files and segments against")
+    parser.add_argument("--report",
+                        help="Write every orphan to this file (kind\\thash\\turl-or-path)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Hashing processes")
+    parser.add_argument("--block-size", type=int, default=4 << 20,
+                        help="Bytes of the master list handed to a worker at a time")
+    args = parser.parse_args()
+
+    start = time.time()
+    vocab = None
+    if args.vocab_dir:
+        vocab = scan_vocab(args.vocab_dir)
+        print(f"Found {len(vocab)} vocab documents under {args.vocab_dir}")
+    unmatched = set(vocab) if vocab is not None else set()
+
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    report = open(args.report, "w", encoding="utf-8") if args.report else None
+
+    count = 0
+    no_vocab = 0
+    examples = []
+    tmp = args.out + ".tmp"
+    # Only the vocab hash set and a few blocks in flight are held in memory
+    with open(tmp, "w", encoding="utf-8") as tf, \
+            Pool(args.workers, initializer=_init_worker,
+                 initargs=(frozenset(vocab) if vocab is not None else None,)) as pool:
+        for text, matched, missing in bounded_map(pool, hash_block,
+                                                  read_blocks(args.master, args.block_size),
+                                                  args.workers * 2):
+            tf.write(text)
+            count += text.count("\n")
+            unmatched.difference_update(matched)
+            no_vocab += len(missing)
+            for key, url in missing:
+                if len(examples) < 5:
+                    examples.append(url)
+                if report:
+                    report.write(f"missing_vocab\t{key}\t{url}\n")
+    os.replace(tmp, args.out)
+
+    print(f"Rebuilt mapping for {count} URLs into {args.out} in {time.time() - start:.1f}s")
+    if vocab is not None:
+        print(f"URLs without a vocab file: {no_vocab}")
+        for url in examples:
+            print(f"  {url}")
+        print(f"Vocab files without a mapping: {len(unmatched)}")
+        for key in sorted(unmatched)[:5]:
+            print(f"  {vocab[key]}")
+        if report:
+            for key in sorted(unmatched):
+                report.write(f"missing_mapping\t{key}\t{vocab[key]}\n")
+    if report:
+        report.close()
+        print(f"Orphan report written to {args.report}")
 
-os.makedirs(os.path.dirname(out), exist_ok=True)
-with open(out, "w", encoding="utf-8") as jf:
-    json.dump(mapping, jf, indent=2)
 
-print(f"Rebuilt mapping for {len(mapping)} URLs into {out}")
+if __name__ == "__main__":
+    main()
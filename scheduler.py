@@ -0,0 +1,171 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+
+# --- Per-seed progress record ---
+class SeedProgress:
+    def __init__(self, topic: str, seed: str):
+        self.topic = topic
+        self.seed = seed
+        self.status = "pending"
+        self.pages = 0
+        self.started = None
+        self.finished = None
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+
+# --- Run every (topic, seed) crawl on a worker pool ---
+# Seeds are grouped by host and hosts sit in a heap ordered by the time the
+# rate limiter lets them fetch next. A worker takes the earliest ready host,
+# advances one of its seeds by a single page and puts the host back, so idle
+# politeness time is spent on other hosts instead of in time.sleep(). A host
+# is out of the heap while it is being fetched, so it never sees two requests
+# at once. Wall-clock time therefore grows with the busiest host, not the
+# number of seeds.
+class SeedScheduler:
+    def __init__(self, make_crawl, limiter, workers: int = 8, report_every: float = 30.0):
+        # make_crawl(topic, seed, progress) returns an object with .host,
+        # .done, .finish() and .step(); step() fetches at most one page, done
+        # is a plain check and finish() tears a done crawl down, returning
+        # False if it has to go on after all. finish(failed=True) tears down
+        # a crawl whose step() raised.
+        self.make_crawl = make_crawl
+        self.limiter = limiter
+        self.workers = max(1, workers)
+        self.report_every = report_every
+        self.progress = {}
+        self._hosts = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._cond = threading.Condition()
+        self._done = threading.Event()
+        self._stopping = False
+
+    def _add(self, topic: str, seed: str):
+        rec = SeedProgress(topic, seed)
+        self.progress[(topic, seed)] = rec
+
+        def update(pages, rec=rec):
+            rec.pages = pages
+
+        crawl = self.make_crawl(topic, seed, update)
+        crawl.record = rec
+        rec.pages = getattr(crawl, "count", 0)
+        self._hosts.setdefault(crawl.host, deque()).append(crawl)
+
+    def _next_host(self):
+        with self._cond:
+            while True:
+                if self._stopping:
+                    return None
+                if not self._heap:
+                    if self._active == 0:
+                        return None
+                    self._cond.wait()
+                    continue
+                ready, _, host = self._heap[0]
+                wait = ready - time.monotonic()
+                if wait <= 0:
+                    heapq.heappop(self._heap)
+                    return host
+                self._cond.wait(wait)
+
+    def _finish(self, crawl, status: str):
+        rec = crawl.record
+        rec.status = status
+        rec.finished = time.time()
+        print(f"Finished seed [{rec.topic}] {rec.seed}: {rec.pages} pages in {rec.elapsed():.1f}s "
+              f"({self._summary()})")
+
+    def _worker(self):
+        while True:
+            host = self._next_host()
+            if host is None:
+                return
+            crawls = self._hosts[host]
+            crawl = crawls[0]
+            rec = crawl.record
+            if rec.status == "pending":
+                rec.status = "running"
+                rec.started = time.time()
+                print(f"Starting seed [{rec.topic}] {rec.seed}")
+            try:
+                # A resumed crawl may already be finished
+                if not crawl.done:
+                    crawl.step()
+                finished = crawl.done and crawl.finish()
+                failed = False
+            except Exception as exc:
+                print(f"Seed [{rec.topic}] {rec.seed} failed: {exc!r}")
+                finished = failed = True
+                # Still close its frontier and stop tracking it in the metrics
+                try:
+                    crawl.finish(failed=True)
+                except Exception as exc:
+                    print(f"Seed [{rec.topic}] {rec.seed} cleanup failed: {exc!r}")
+
+            with self._cond:
+                if finished:
+                    crawls.popleft()
+                else:
+                    # Round-robin between seeds that share this host
+                    crawls.rotate(-1)
+                if crawls:
+                    heapq.heappush(self._heap, (self.limiter.ready_at(host), next(self._seq), host))
+                else:
+                    self._active -= 1
+                self._cond.notify_all()
+            if finished:
+                self._finish(crawl, "failed" if failed else "done")
+
+    def _summary(self) -> str:
+        recs = list(self.progress.values())
+        done = sum(r.status in ("done", "failed") for r in recs)
+        running = sum(r.status == "running" for r in recs)
+        pages = sum(r.pages for r in recs)
+        return f"{done}/{len(recs)} seeds done, {running} running, {pages} pages"
+
+    def _reporter(self):
+        while not self._done.wait(self.report_every):
+            print(f"Progress: {self._summary()}")
+
+    def run(self, topics: dict):
+        for topic, seeds in topics.items():
+            for seed in seeds:
+                self._add(topic, seed)
+        for host in self._hosts:
+            heapq.heappush(self._heap, (self.limiter.ready_at(host), next(self._seq), host))
+        self._active = len(self._hosts)
+        print(f"Scheduling {len(self.progress)} seeds over {len(self._hosts)} hosts "
+              f"on {self.workers} workers")
+
+        reporter = threading.Thread(target=self._reporter, daemon=True)
+        reporter.start()
+        threads = [threading.Thread(target=self._worker, name=f"crawl-{i}")
+                   for i in range(self.workers)]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        except KeyboardInterrupt:
+            # Let workers finish the page in hand so nothing is half-recorded
+            print("Interrupted, waiting for workers to finish their current page...")
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            for t in threads:
+                t.join()
+            raise
+        finally:
+            self._done.set()
+        print(f"Scheduler finished: {self._summary()}")
+        return self.progress
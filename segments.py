@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+import shutil
+import struct
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd segments are optional
+    zstandard = None
+
+# --- Segment file layout (big-endian, so the Java reader can use DataInputStream) ---
+# header : b"VSEG", version u8, codec u8, 10 reserved bytes          (16 bytes)
+# record : tag u8, doc hash (16 ASCII hex chars), stored length u32,
+#          raw length u32, stored bytes (the vocab line, maybe compressed)
+#          tag 1 = document, tag 3 = deletion (no data)
+# footer : tag u8 = 2, count u32, count x (doc hash, tag u8, record offset u64),
+#          then index offset u64 and b"VIDX"                     (on seal())
+# Records are only ever appended; a later record for the same hash wins,
+# within a segment and across the segments of a directory. A segment that
+# was not sealed (crash) is recovered by scanning its records.
+MAGIC = b"VSEG"
+TRAILER = b"VIDX"
+HEADER = struct.Struct(">4sBB10x")
+RECORD = struct.Struct(">B16sII")
+INDEX_ENTRY = struct.Struct(">16sBQ")
+TAIL = struct.Struct(">Q4s")
+DOC, INDEX, DELETE = 1, 2, 3
+CODECS = {"none": 0, "deflate": 1, "zstd": 2}
+SEGMENT_RE = re.compile(r"^segment-(\d+)\.seg$")
+
+
+def _compressor(codec: int):
+    if codec == 1:
+        return lambda data: zlib.compress(data, 6)
+    if codec == 2:
+        if zstandard is None:
+            raise ValueError("zstd segments need the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=3).compress
+    return lambda data: data
+
+
+def _decompressor(codec: int):
+    if codec == 1:
+        return zlib.decompress
+    if codec == 2:
+        if zstandard is None:
+            raise ValueError("zstd segments need the zstandard package (pip install zstandard)")
+        dctx = zstandard.ZstdDecompressor()
+        return lambda data, size: dctx.decompress(data, max_output_size=size)
+    return lambda data: data
+
+
+# --- Scan records from the start: ({hash: (tag, offset)}, end of last full record) ---
+def _scan(f, size: int) -> tuple:
+    index = {}
+    pos = HEADER.size
+    f.seek(pos)
+    while pos + RECORD.size <= size:
+        tag, key, stored, _ = RECORD.unpack(f.read(RECORD.size))
+        if tag not in (DOC, DELETE) or pos + RECORD.size + stored > size:
+            break
+        index[key.decode("ascii")] = (tag, pos)
+        pos += RECORD.size + stored
+        f.seek(pos)
+    return index, pos
+
+
+# --- Random and sequential access to one segment ---
+class SegmentReader:
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        magic, version, self.codec = HEADER.unpack(self._f.read(HEADER.size))
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{path} is not a vocab segment")
+        self._raw = self.codec == 2
+        self._decompress = _decompressor(self.codec)
+        size = self._f.seek(0, os.SEEK_END)
+        self.sealed = False
+        if size >= HEADER.size + TAIL.size:
+            self._f.seek(size - TAIL.size)
+            index_offset, trailer = TAIL.unpack(self._f.read(TAIL.size))
+            if trailer == TRAILER:
+                self.sealed = True
+                self.index = self._read_index(index_offset)
+        if not self.sealed:
+            self.index, _ = _scan(self._f, size)
+
+    def _read_index(self, offset: int) -> dict:
+        self._f.seek(offset)
+        tag, count = struct.unpack(">BI", self._f.read(5))
+        data = self._f.read(count * INDEX_ENTRY.size)
+        return {key.decode("ascii"): (tag, pos) for key, tag, pos in INDEX_ENTRY.iter_unpack(data)}
+
+    def _read_at(self, offset: int) -> str:
+        self._f.seek(offset)
+        _, _, stored, raw = RECORD.unpack(self._f.read(RECORD.size))
+        data = self._f.read(stored)
+        data = self._decompress(data, raw) if self._raw else self._decompress(data)
+        return data.decode("utf-8")
+
+    def __len__(self) -> int:
+        return sum(tag == DOC for tag, _ in self.index.values())
+
+    def __contains__(self, key: str) -> bool:
+        entry = self.index.get(key)
+        return entry is not None and entry[0] == DOC
+
+    def keys(self):
+        return [key for key, (tag, _) in self.index.items() if tag == DOC]
+
+    def deleted(self):
+        return [key for key, (tag, _) in self.index.items() if tag == DELETE]
+
+    def get(self, key: str, default=None):
+        entry = self.index.get(key)
+        if entry is None or entry[0] != DOC:
+            return default
+        return self._read_at(entry[1])
+
+    def items(self, skip=()):
+        # (hash, vocab line) in file order, latest version of each hash only
+        live = sorted(pos for key, (tag, pos) in self.index.items()
+                      if tag == DOC and key not in skip)
+        for offset in live:
+            self._f.seek(offset)
+            key = RECORD.unpack(self._f.read(RECORD.size))[1].decode("ascii")
+            yield key, self._read_at(offset)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Append-only writer for one segment ---
+class SegmentWriter:
+    def __init__(self, path: str, codec: str = "none"):
+        self.path = path
+        if os.path.exists(path):
+            with SegmentReader(path) as existing:
+                if existing.sealed:
+                    raise ValueError(f"{path} is sealed; start a new segment")
+                self.codec = existing.codec
+            self._f = open(path, "r+b")
+            size = self._f.seek(0, os.SEEK_END)
+            self.index, end = _scan(self._f, size)
+            # Drop a record torn by a crash
+            self._f.truncate(end)
+            self._f.seek(end)
+        else:
+            self.codec = CODECS[codec]
+            self._f = open(path, "wb")
+            self._f.write(HEADER.pack(MAGIC, 1, self.codec))
+            self.index = {}
+        self._compress = _compressor(self.codec)
+        self.size = self._f.tell()
+
+    def append(self, key: str, text: str):
+        raw = text.encode("utf-8")
+        stored = self._compress(raw)
+        self.index[key] = (DOC, self.size)
+        self._f.write(RECORD.pack(DOC, key.encode("ascii"), len(stored), len(raw)))
+        self._f.write(stored)
+        self.size += RECORD.size + len(stored)
+
+    def delete(self, key: str):
+        # Hides the document in this and every earlier segment
+        self.index[key] = (DELETE, self.size)
+        self._f.write(RECORD.pack(DELETE, key.encode("ascii"), 0, 0))
+        self.size += RECORD.size
+
+    def flush(self):
+        self._f.flush()
+
+    def seal(self):
+        # Append the hash -> offset index; the segment is read-only afterwards
+        index_offset = self.size
+        self._f.write(struct.pack(">BI", INDEX, len(self.index)))
+        self._f.write(b"".join(INDEX_ENTRY.pack(key.encode("ascii"), tag, pos)
+                               for key, (tag, pos) in self.index.items()))
+        self._f.write(TAIL.pack(index_offset, TRAILER))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+
+
+# --- Rolling segments for one directory: segment-00000.seg, segment-00001.seg, ... ---
+# Thread-safe. A new segment is started once the current one passes
+# max_bytes, and at the start of every run (sealed segments are immutable).
+class SegmentDir:
+    def __init__(self, directory: str, codec: str = "none", max_bytes: int = 256 << 20):
+        self.directory = directory
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        numbers = sorted(int(m.group(1)) for m in map(SEGMENT_RE.match, os.listdir(directory)) if m)
+        self._next = numbers[-1] if numbers else 0
+        self._writer = None
+        if numbers:
+            # Continue an unsealed segment left by a crash; otherwise start the next one
+            try:
+                self._writer = SegmentWriter(self._path(self._next))
+                self._next += 1
+            except ValueError:
+                self._next += 1
+
+    def _path(self, number: int) -> str:
+        return os.path.join(self.directory, f"segment-{number:05d}.seg")
+
+    def write(self, key: str, text: str):
+        with self._lock:
+            self._current().append(key, text)
+            self._roll()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._current().delete(key)
+            self._roll()
+
+    def _current(self) -> SegmentWriter:
+        if self._writer is None:
+            self._writer = SegmentWriter(self._path(self._next), self.codec)
+            self._next += 1
+        return self._writer
+
+    def _roll(self):
+        if self._writer.size >= self.max_bytes:
+            self._writer.seal()
+            self._writer = None
+
+    def flush(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+
+    def close(self):
+        with self._lock:
+            if self._writer is not None:
+                self._writer.seal()
+                self._writer = None
+
+
+# --- Vocab segments for every topic directory of a crawl ---
+class VocabSegments:
+    def __init__(self, codec: str = "none", max_bytes: int = 256 << 20):
+        _compressor(CODECS[codec])  # fail early on a missing codec
+        self.codec = codec
+        self.max_bytes = max_bytes
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, topic_dir: str) -> SegmentDir:
+        with self._lock:
+            seg = self._dirs.get(topic_dir)
+            if seg is None:
+                seg = self._dirs[topic_dir] = SegmentDir(topic_dir, self.codec, self.max_bytes)
+            return seg
+
+    def write(self, topic_dir: str, key: str, text: str):
+        self._dir(topic_dir).write(key, text)
+
+    def delete(self, topic_dir: str, key: str):
+        self._dir(topic_dir).delete(key)
+
+    def close(self):
+        with self._lock:
+            for seg in self._dirs.values():
+                seg.close()
+
+
+# --- Live documents of one directory's segments, newest segment winning ---
+def iter_segments(paths: list):
+    readers = [SegmentReader(path) for path in sorted(paths)]
+    try:
+        # A hash written or deleted in a later segment hides earlier versions
+        shadowed = set()
+        layers = []
+        for seg in reversed(readers):
+            layers.append((seg, set(shadowed)))
+            shadowed.update(seg.index)
+        for seg, skip in reversed(layers):
+            yield from seg.items(skip)
+    finally:
+        for seg in readers:
+            seg.close()
+
+
+# --- Hashes of the live documents of one directory's segments, without reading them ---
+def live_keys(paths: list) -> set:
+    keys = set()
+    for path in sorted(paths):
+        with SegmentReader(path) as seg:
+            for key, (tag, _) in seg.index.items():
+                if tag == DOC:
+                    keys.add(key)
+                else:
+                    keys.discard(key)
+    return keys
+
+
+# --- Every document of a crawl output: (hash, vocab line) ---
+# Reads vocab_<hash>.txt files and *.seg segments alike, so consumers do
+# not care which --vocab-format wrote them.
+def iter_documents(root: str):
+    for dirpath, _, files in os.walk(root):
+        files.sort()
+        for name in files:
+            if name.startswith("vocab_") and name.endswith(".txt"):
+                with open(os.path.join(dirpath, name), "r", encoding="utf-8",
+                          errors="replace") as f:
+                    yield name[6:-4], f.read()
+        segs = [os.path.join(dirpath, name) for name in files if name.endswith(".seg")]
+        if segs:
+            yield from iter_segments(segs)
+
+
+# --- Rewrite a directory's segments keeping only the live version of each document ---
+def compact(directory: str, codec: str, max_bytes: int) -> tuple:
+    names = sorted(n for n in os.listdir(directory) if SEGMENT_RE.match(n))
+    old = [os.path.join(directory, n) for n in names]
+    # compact.tmp only ever holds copies: the old segments are removed after
+    # every rewritten one is in place, so one left by a crash is dropped
+    tmp = os.path.join(directory, "compact.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    out = SegmentDir(tmp, codec, max_bytes)
+    count = 0
+    for key, text in iter_segments(old):
+        out.write(key, text)
+        count += 1
+    out.close()
+    # Numbered after the old segments, the rewritten ones win over them
+    # until the old ones are gone
+    number = int(SEGMENT_RE.match(names[-1]).group(1)) + 1 if names else 0
+    for i, name in enumerate(sorted(os.listdir(tmp))):
+        os.replace(os.path.join(tmp, name), os.path.join(directory, f"segment-{number + i:05d}.seg"))
+    os.rmdir(tmp)
+    _sync_dir(directory)
+    for path in old:
+        os.remove(path)
+    return len(old), count
+
+
+def _sync_dir(directory: str):
+    # Make renames durable before the files they replace are removed
+    if os.name != "nt":
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+# --- CLI: pack vocab files into segments, compact and inspect segments ---
+def main():
+    parser = argparse.ArgumentParser(description="Pack, compact and inspect vocab segment files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pack = sub.add_parser("pack", help="Move the vocab_<hash>.txt files under a directory into segments")
+    pack.add_argument("directory")
+    pack.add_argument("--codec", choices=list(CODECS), default="deflate")
+    pack.add_argument("--segment-size", type=int, default=256, help="MB per segment")
+    pack.add_argument("--keep", action="store_true", help="Keep the vocab files after packing")
+    comp = sub.add_parser("compact", help="Merge a directory's segments, dropping old versions "
+                                          "and deletions (one record per document)")
+    comp.add_argument("directory")
+    comp.add_argument("--codec", choices=list(CODECS), default="deflate")
+    comp.add_argument("--segment-size", type=int, default=256, help="MB per segment")
+    stats = sub.add_parser("stats", help="Documents and sizes per segment")
+    stats.add_argument("segments", nargs="+")
+    cat = sub.add_parser("cat", help="Print one document's vocab line")
+    cat.add_argument("segment")
+    cat.add_argument("hash")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        try:
+            _compressor(CODECS[args.codec])
+        except ValueError as exc:
+            parser.error(str(exc))
+        total = raw = 0
+        for dirpath, _, files in os.walk(args.directory):
+            names = sorted(n for n in files if n.startswith("vocab_") and n.endswith(".txt"))
+            if not names:
+                continue
+            seg = SegmentDir(dirpath, args.codec, args.segment_size << 20)
+            for name in names:
+                path = os.path.join(dirpath, name)
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    text = f.read()
+                raw += len(text.encode("utf-8"))
+                seg.write(name[6:-4], text)
+            seg.close()
+            if not args.keep:
+                for name in names:
+                    os.remove(os.path.join(dirpath, name))
+            total += len(names)
+        packed = sum(os.path.getsize(os.path.join(d, n)) for d, _, files in os.walk(args.directory)
+                     for n in files if SEGMENT_RE.match(n))
+        print(f"Packed {total} vocab files ({raw / 1e6:.1f} MB) into "
+              f"{packed / 1e6:.1f} MB of segments")
+    elif args.command == "compact":
+        try:
+            _compressor(CODECS[args.codec])
+        except ValueError as exc:
+            parser.error(str(exc))
+        for dirpath, _, files in os.walk(args.directory):
+            if any(SEGMENT_RE.match(n) for n in files):
+                merged, count = compact(dirpath, args.codec, args.segment_size << 20)
+                print(f"{dirpath}: {merged} segments -> {count} documents")
+    elif args.command == "stats":
+        for path in args.segments:
+            with SegmentReader(path) as seg:
+                codec = next(k for k, v in CODECS.items() if v == seg.codec)
+                state = "sealed" if seg.sealed else "open"
+                print(f"{path}: {len(seg)} documents, {len(seg.deleted())} deletions, "
+                      f"{os.path.getsize(path) / 1e6:.1f} MB, {codec}, {state}")
+    else:
+        with SegmentReader(args.segment) as seg:
+            text = seg.get(args.hash)
+        if text is None:
+            parser.error(f"{args.hash} not in {args.segment}")
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
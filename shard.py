@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from urllib.parse import urlparse
+
+from archive import merge_archive
+from batched_writer import repair_tail
+from mapping_store import MappingStore, read_mapping_log
+from segments import SEGMENT_RE
+
+
+# --- Which shard crawls a host ---
+def shard_of(host: str, shards: int) -> int:
+    # crc32 rather than hash(): every process and node must agree
+    return zlib.crc32(host.lower().encode("utf-8")) % shards
+
+
+def parse_shard(value: str) -> tuple:
+    # "I/N" -> (I, N)
+    index, sep, count = value.partition("/")
+    if not sep or not index.isdigit() or not count.isdigit() or not 0 <= int(index) < int(count):
+        raise ValueError(f"expected INDEX/COUNT with 0 <= INDEX < COUNT, got {value!r}")
+    return int(index), int(count)
+
+
+def shard_dir(output_dir: str, index: int) -> str:
+    return os.path.join(output_dir, "shards", f"{index:03d}")
+
+
+def parse_address(address: str) -> tuple:
+    # "unix:/path/to.sock" or "host:port" -> (socket family, address)
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[5:]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def _send(sock: socket.socket, lock: threading.Lock, message: dict):
+    data = (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+    with lock:
+        sock.sendall(data)
+
+
+# --- Coordinator: relays forwarded links between the shards ---
+# Newline-delimited JSON over TCP or a Unix socket. A shard says
+# {"op": "hello", "shard": i}, sends {"op": "links", "to": j, "links":
+# [[url, depth], ...]} and finally {"op": "done"}; links for a shard that has
+# not connected yet are held, links for a finished one are dropped. A shard
+# whose connection ends without "done" (it crashed) counts as finished.
+class Coordinator:
+    def __init__(self, address: str, shards: int):
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            os.remove(addr)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(addr)
+        self.sock.listen(shards)
+        if family == socket.AF_INET:
+            host, port = self.sock.getsockname()[:2]
+            self.address = f"{host}:{port}"
+        else:
+            self.address = address
+        self.shards = shards
+        self.lock = threading.Lock()
+        self.peers = {}       # shard -> (socket, send lock)
+        self.queued = {}      # shard -> links held until it connects
+        self.finished = set()
+        self.stats = Counter()
+        self.all_done = threading.Event()
+        self._conns = []
+
+    def start(self):
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self
+
+    def _accept(self):
+        while not self.all_done.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self._conns.append(conn)
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket):
+        shard = None
+        try:
+            for line in conn.makefile("r", encoding="utf-8"):
+                msg = json.loads(line)
+                if msg["op"] == "hello":
+                    shard = msg["shard"]
+                    peer = (conn, threading.Lock())
+                    with self.lock:
+                        self.peers[shard] = peer
+                        held = self.queued.pop(shard, [])
+                    if held:
+                        _send(conn, peer[1], {"op": "links", "links": held})
+                elif msg["op"] == "links":
+                    self._forward(msg["to"], msg["links"])
+                elif msg["op"] == "done":
+                    break
+        except (OSError, ValueError):
+            pass
+        if shard is not None:
+            self.finish(shard)
+
+    def _forward(self, to: int, links: list):
+        with self.lock:
+            if to in self.finished:
+                self.stats["dropped"] += len(links)
+                return
+            self.stats["forwarded"] += len(links)
+            peer = self.peers.get(to)
+            if peer is None:
+                self.queued.setdefault(to, []).extend(links)
+                return
+        try:
+            _send(peer[0], peer[1], {"op": "links", "links": links})
+        except OSError:
+            self.stats["dropped"] += len(links)
+
+    def finish(self, shard: int):
+        with self.lock:
+            self.finished.add(shard)
+            self.peers.pop(shard, None)
+            self.stats["dropped"] += len(self.queued.pop(shard, []))
+            if len(self.finished) >= self.shards:
+                self.all_done.set()
+
+    def close(self):
+        self.all_done.set()
+        for conn in self._conns + [self.sock]:
+            try:
+                conn.close()
+            except OSError:
+                pass
+        if self.address.startswith("unix:") and os.path.exists(self.address[5:]):
+            os.remove(self.address[5:])
+
+
+# --- Transport to the coordinator ---
+# Any object with send(shard, url, depth) and close() can stand in (e.g. a
+# queue service between nodes); links it receives go to on_links([[url,
+# depth], ...]). Links are batched per target shard: a batch goes out when
+# it is full or flush_every seconds old.
+class SocketTransport:
+    def __init__(self, address: str, shard: int, on_links, batch: int = 256,
+                 flush_every: float = 0.5, connect_timeout: float = 30.0):
+        family, addr = parse_address(address)
+        deadline = time.monotonic() + connect_timeout
+        while True:
+            self.sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(addr)
+                break
+            except OSError:
+                self.sock.close()
+                # The coordinator may still be starting (multi-node crawls)
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+        self.shard = shard
+        self.on_links = on_links
+        self.batch = batch
+        self.flush_every = flush_every
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.buffers = {}
+        self.sent = 0
+        self._closed = threading.Event()
+        _send(self.sock, self.send_lock, {"op": "hello", "shard": shard})
+        threading.Thread(target=self._receive, daemon=True).start()
+        threading.Thread(target=self._flusher, daemon=True).start()
+
+    def send(self, shard: int, url: str, depth: int):
+        with self.lock:
+            buffer = self.buffers.setdefault(shard, [])
+            buffer.append([url, depth])
+            full = len(buffer) >= self.batch
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            buffers, self.buffers = self.buffers, {}
+        for shard, links in buffers.items():
+            _send(self.sock, self.send_lock, {"op": "links", "to": shard, "links": links})
+            self.sent += len(links)
+
+    def _flusher(self):
+        while not self._closed.wait(self.flush_every):
+            try:
+                self.flush()
+            except OSError:
+                return
+
+    def _receive(self):
+        try:
+            for line in self.sock.makefile("r", encoding="utf-8"):
+                msg = json.loads(line)
+                if msg["op"] == "links":
+                    self.on_links(msg["links"])
+        except (OSError, ValueError):
+            pass
+
+    def close(self):
+        self._closed.set()
+        try:
+            self.flush()
+            _send(self.sock, self.send_lock, {"op": "done"})
+        except OSError:
+            pass
+        self.sock.close()
+
+
+# --- Routes links that leave their seed's site ---
+# A link under another seed's URL goes to that seed's crawl: straight into
+# its inbox when this shard crawls it, otherwise through the transport to
+# the shard that owns its host. Links for a seed crawl that has finished are
+# dropped (counted), as are links outside every seed.
+class ShardRouter:
+    def __init__(self, topics: dict, shard: int, shards: int, transport=None):
+        self.shard = shard
+        self.shards = shards
+        self.transport = transport
+        self.owners = {}      # host -> [(base, (topic, seed))], longest base first
+        for topic, seeds in topics.items():
+            for seed in seeds:
+                host = urlparse(seed).netloc.lower()
+                self.owners.setdefault(host, []).append((seed.rstrip('/'), (topic, seed)))
+        for bases in self.owners.values():
+            bases.sort(key=lambda b: -len(b[0]))
+        self.lock = threading.Lock()
+        self.crawls = {}      # (topic, seed) -> running SeedCrawl
+        self.early = {}       # (topic, seed) -> links that came before its crawl started
+        self.finished = set()
+        self.stats = Counter()
+
+    def owns(self, seed: str) -> bool:
+        return shard_of(urlparse(seed).netloc, self.shards) == self.shard
+
+    def owner(self, url: str):
+        for base, key in self.owners.get(urlparse(url).netloc.lower(), ()):
+            if url.startswith(base):
+                return key
+        return None
+
+    def route(self, url: str, depth: int):
+        key = self.owner(url)
+        if key is None:
+            return
+        shard = shard_of(urlparse(key[1]).netloc, self.shards)
+        if shard == self.shard:
+            self.deliver(url, depth, key)
+        else:
+            with self.lock:
+                self.stats["forwarded"] += 1
+            self.transport.send(shard, url, depth)
+
+    def deliver(self, url: str, depth: int, key=None):
+        key = key or self.owner(url)
+        with self.lock:
+            if key is None or key in self.finished:
+                self.stats["dropped"] += 1
+                return
+            self.stats["routed"] += 1
+            crawl = self.crawls.get(key)
+            if crawl is None:
+                self.early.setdefault(key, []).append((url, depth))
+            else:
+                crawl.inbox.append((url, depth))
+
+    def deliver_many(self, links: list):
+        self.stats["received"] += len(links)
+        for url, depth in links:
+            self.deliver(url, depth)
+
+    def register(self, crawl):
+        with self.lock:
+            key = (crawl.topic, crawl.seed)
+            self.crawls[key] = crawl
+            crawl.inbox.extend(self.early.pop(key, ()))
+
+    def finish(self, crawl, drop: bool = False) -> bool:
+        # False if links arrived since the crawl last looked at its inbox;
+        # with drop they are discarded instead
+        with self.lock:
+            if crawl.inbox:
+                if not drop:
+                    return False
+                self.stats["dropped"] += len(crawl.inbox)
+                crawl.inbox.clear()
+            key = (crawl.topic, crawl.seed)
+            self.finished.add(key)
+            self.crawls.pop(key, None)
+            return True
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"{s['routed']} links routed to seeds here, {s['forwarded']} forwarded to "
+                f"other shards, {s['received']} received, {s['dropped']} dropped")
+
+
+# --- Merge the shard directories into the output directory ---
+# Master list and near-duplicate logs get the lines each shard added since
+# the last merge, mappings are added to url_mapping.tsv, vocab files are
+# moved into the topic directories and segments are moved in after the
+# existing ones. Hosts never span shards, so shards never hold the same
+# page. A shard directory lives on between runs; its merged.tsv records how
+# many bytes of each log were merged, so a merge streams only the new lines.
+MERGED = "merged.tsv"
+
+
+def _read_merged(src_dir: str) -> dict:
+    path = os.path.join(src_dir, MERGED)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {name: int(offset) for name, offset in
+                (line.rstrip("\n").split("\t") for line in f if line.strip())}
+
+
+def _write_merged(src_dir: str, merged: dict):
+    path = os.path.join(src_dir, MERGED)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.writelines(f"{name}\t{offset}\n" for name, offset in sorted(merged.items()))
+    os.replace(path + ".tmp", path)
+
+
+def _append_new_lines(src: str, dst: str, merged: dict) -> int:
+    if not os.path.exists(src):
+        return 0
+    name = os.path.basename(src)
+    pos = merged.get(name, 0)
+    if pos > os.path.getsize(src):
+        pos = 0  # the shard was started over
+    # A line torn by a crash during an earlier merge
+    repair_tail(dst)
+    added = 0
+    with open(src, "rb") as f, open(dst, "ab") as out:
+        f.seek(pos)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # still being written (or torn); merged next time
+            pos += len(line)
+            if line.strip():
+                out.write(line)
+                added += 1
+        out.flush()
+        os.fsync(out.fileno())
+    merged[name] = pos
+    return added
+
+
+def merge_shards(output_dir: str, shard_dirs: list) -> Counter:
+    stats = Counter()
+    mapping = MappingStore(os.path.join(output_dir, "url_mapping.tsv"))
+    try:
+        for src in shard_dirs:
+            merged = _read_merged(src)
+            stats["urls"] += _append_new_lines(os.path.join(src, "all_urls_master.txt"),
+                                               os.path.join(output_dir, "all_urls_master.txt"),
+                                               merged)
+            for name in ("simhash.tsv", "duplicates.tsv"):
+                _append_new_lines(os.path.join(src, name), os.path.join(output_dir, name), merged)
+            _write_merged(src, merged)
+            mapping_path = os.path.join(src, "url_mapping.tsv")
+            if os.path.exists(mapping_path):
+                for key, url in read_mapping_log(mapping_path)[0].items():
+                    if mapping.get(key) != url:
+                        mapping[key] = url
+            stats["archive files"] += merge_archive(os.path.join(src, "archive"),
+                                                    os.path.join(output_dir, "archive"))
+            for topic in sorted(os.listdir(src)):
+                topic_src = os.path.join(src, topic)
+                if topic.startswith(".") or topic == "archive" or not os.path.isdir(topic_src):
+                    continue
+                topic_dst = os.path.join(output_dir, topic)
+                os.makedirs(topic_dst, exist_ok=True)
+                names = sorted(os.listdir(topic_src))
+                for name in names:
+                    if name.startswith("vocab_") and name.endswith(".txt"):
+                        os.replace(os.path.join(topic_src, name), os.path.join(topic_dst, name))
+                        stats["vocab files"] += 1
+                segs = [name for name in names if SEGMENT_RE.match(name)]
+                if segs:
+                    numbers = [int(SEGMENT_RE.match(n).group(1))
+                               for n in os.listdir(topic_dst) if SEGMENT_RE.match(n)]
+                    number = max(numbers, default=-1) + 1
+                    for name in segs:
+                        os.replace(os.path.join(topic_src, name),
+                                   os.path.join(topic_dst, f"segment-{number:05d}.seg"))
+                        number += 1
+                        stats["segments"] += 1
+    finally:
+        mapping.close()
+    return stats
+
+
+def _strip_option(argv: list, option: str) -> list:
+    # argv without "--option VALUE" / "--option=VALUE"
+    out = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == option:
+            skip = True
+        elif not arg.startswith(option + "="):
+            out.append(arg)
+    return out
+
+
+# --- Run a sharded crawl on this machine ---
+# Starts the coordinator, one crawler process per shard (the same command
+# line plus --shard I/N), waits for them and merges their output.
+def launch(script: str, argv: list, shards: int, output_dir: str, address: str) -> int:
+    coordinator = Coordinator(address, shards).start()
+    print(f"Coordinator listening on {coordinator.address}; starting {shards} shards")
+    argv = _strip_option(_strip_option(argv, "--shards"), "--coordinator")
+    procs = [subprocess.Popen([sys.executable, script] + argv +
+                              ["--shard", f"{i}/{shards}", "--coordinator", coordinator.address])
+             for i in range(shards)]
+    failed = 0
+    try:
+        for i, proc in enumerate(procs):
+            if proc.wait() != 0:
+                print(f"Shard {i} exited with status {proc.returncode}")
+                failed += 1
+            coordinator.finish(i)
+    except KeyboardInterrupt:
+        for proc in procs:
+            proc.wait()
+        raise
+    finally:
+        coordinator.close()
+    print(f"Coordinator: {coordinator.stats['forwarded']} links forwarded, "
+          f"{coordinator.stats['dropped']} dropped")
+    stats = merge_shards(output_dir, [shard_dir(output_dir, i) for i in range(shards)])
+    print(f"Merged {shards} shards into {output_dir}: {stats['urls']} new URLs, "
+          f"{stats['vocab files']} vocab files, {stats['segments']} segments, "
+          f"{stats['archive files']} archive files")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded crawls: coordinator and output merge")
+    sub = parser.add_subparsers(dest="command", required=True)
+    coord = sub.add_parser("coordinator",
+                           help="Relay links between shards started on other nodes with "
+                                "--shard I/N --coordinator ADDRESS")
+    coord.add_argument("--listen", default="0.0.0.0:7070", help="host:port or unix:/path")
+    coord.add_argument("--shards", type=int, required=True)
+    merge = sub.add_parser("merge", help="Merge <output-dir>/shards/* into the output directory")
+    merge.add_argument("output_dir")
+    args = parser.parse_args()
+
+    if args.command == "coordinator":
+        coordinator = Coordinator(args.listen, args.shards).start()
+        print(f"Coordinator listening on {coordinator.address} for {args.shards} shards")
+        try:
+            while not coordinator.all_done.wait(1.0):
+                pass
+        finally:
+            coordinator.close()
+        print(f"All shards finished: {coordinator.stats['forwarded']} links forwarded, "
+              f"{coordinator.stats['dropped']} dropped")
+    else:
+        root = os.path.join(args.output_dir, "shards")
+        dirs = sorted(os.path.join(root, name) for name in os.listdir(root)
+                      if os.path.isdir(os.path.join(root, name)))
+        stats = merge_shards(args.output_dir, dirs)
+        print(f"Merged {len(dirs)} shards: {stats['urls']} new URLs, "
+              f"{stats['vocab files']} vocab files, {stats['segments']} segments, "
+              f"{stats['archive files']} archive files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+
+from batched_writer import BatchedLineWriter, repair_tail
+
+
+# --- Overlapping word n-grams; short pages become a single feature ---
+def shingles(tokens: list, size: int = 3) -> list:
+    if len(tokens) <= size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+# --- 64-bit SimHash of a feature list (count weighted) ---
+# Per-bit votes are kept bit-sliced: planes[j] holds bit j of every bit's
+# vote count, so adding a feature is a short ripple-carry over a few
+# 64-bit ints instead of a 64-step loop. Bit i of the result is set when
+# more than half of the feature weight has bit i set.
+def simhash(features) -> int:
+    counts = Counter(features)
+    planes = []
+    for feature, weight in counts.items():
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        j = 0
+        while weight:
+            if weight & 1:
+                carry, k = h, j
+                while carry:
+                    while k >= len(planes):
+                        planes.append(0)
+                    plane = planes[k]
+                    planes[k] = plane ^ carry
+                    carry &= plane
+                    k += 1
+            weight >>= 1
+            j += 1
+    half = sum(counts.values()) / 2
+    sig = 0
+    for i in range(64):
+        votes = sum(((plane >> i) & 1) << j for j, plane in enumerate(planes))
+        if votes > half:
+            sig |= 1 << i
+    return sig
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+# --- LSH index over SimHash signatures ---
+# The 64 bits are cut into distance + 1 bands. Two signatures within
+# `distance` bits must agree exactly on at least one band (pigeonhole), so
+# only pages sharing a band bucket are compared. With a log path, every
+# signature added is appended to that file (<key>\t<signature>) and loaded
+# again on open, so later runs still see the pages of earlier ones.
+class SimHashIndex:
+    def __init__(self, distance: int = 2, log_path: str = None):
+        if not 0 <= distance < 32:
+            raise ValueError("distance must be between 0 and 31")
+        self.distance = distance
+        bands = distance + 1
+        edges = [64 * i // bands for i in range(bands + 1)]
+        self._bands = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self._buckets = [{} for _ in self._bands]
+        self._lock = threading.Lock()
+        self._writer = None
+        self.size = 0
+        if log_path:
+            if os.path.exists(log_path):
+                repair_tail(log_path)
+                with open(log_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        key, _, sig = line.rstrip("\n").partition("\t")
+                        if sig:
+                            self._add(int(sig, 16), key)
+            self._writer = BatchedLineWriter(log_path)
+
+    def _add(self, sig: int, key: str):
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((sig >> shift) & mask, []).append((sig, key))
+        self.size += 1
+
+    def _find(self, sig: int, exclude: str = None):
+        best = None
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            for other, key in buckets.get((sig >> shift) & mask, ()):
+                if key == exclude:
+                    continue
+                dist = hamming(sig, other)
+                if dist <= self.distance and (best is None or dist < best[1]):
+                    best = (key, dist)
+                    if dist == 0:
+                        return best
+        return best
+
+    def check(self, key: str, sig: int):
+        # (original key, distance) for a near-duplicate; otherwise the page
+        # is added under `key` and None is returned. A page never matches
+        # its own earlier signature (recrawls).
+        with self._lock:
+            match = self._find(sig, key)
+            if match is None:
+                self._add(sig, key)
+                if self._writer is not None:
+                    self._writer.write(f"{key}\t{sig:016x}")
+            return match
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# --- Near-duplicate filter in front of the vocab files ---
+# Pages are compared on word 3-grams rather than single words, otherwise the
+# navigation and footer text shared by every page of a site outweighs the
+# content. A page whose signature is within `distance` bits of an earlier
+# page is not written; it is recorded in duplicates.tsv as
+# <hash>\t<original hash>\t<distance>\t<url> instead. Empty pages all alias
+# to the first empty page.
+class NearDupFilter:
+    def __init__(self, output_dir: str, distance: int = 2, shingle: int = 3):
+        self.shingle = shingle
+        self.index = SimHashIndex(distance, os.path.join(output_dir, "simhash.tsv"))
+        self.aliases = BatchedLineWriter(os.path.join(output_dir, "duplicates.tsv"))
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def duplicate_of(self, key: str, url: str, tokens: list):
+        # Hash of the page this one duplicates, or None (and it is remembered)
+        match = self.index.check(key, simhash(shingles(tokens, self.shingle)))
+        if match is None:
+            return None
+        original, dist = match
+        self.aliases.write(f"{key}\t{original}\t{dist}\t{url}")
+        with self._lock:
+            self.skipped += 1
+        return original
+
+    def close(self):
+        self.index.close()
+        self.aliases.close()
+
+
+# --- Worker: signature of one vocab file ---
+def file_signature(path: str, shingle: int = 3):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        tokens = f.read().split()
+    return not tokens, simhash(shingles(tokens, shingle))
+
+
+# --- CLI: find near-duplicate vocab files in an existing crawl / index input ---
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find near-duplicate vocab_<hash>.txt files with SimHash + LSH"
+    )
+    parser.add_argument("vocab_dir", help="Directory searched for vocab_*.txt files")
+    parser.add_argument("--distance", type=int, default=2,
+                        help="Max differing SimHash bits for two pages to count as duplicates")
+    parser.add_argument("--shingle", type=int, default=3,
+                        help="Words per feature (1 compares bags of words)")
+    parser.add_argument("--report",
+                        help="Write <file>\\t<original file>\\t<distance> per duplicate")
+    parser.add_argument("--move-to", metavar="DIR",
+                        help="Move duplicates out of vocab_dir into DIR "
+                             "(the first page of each group stays)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processes computing signatures")
+    args = parser.parse_args()
+
+    paths = []
+    for root, _, files in os.walk(args.vocab_dir):
+        paths.extend(os.path.join(root, name) for name in files
+                     if name.startswith("vocab_") and name.endswith(".txt"))
+    paths.sort()
+
+    start = time.time()
+    index = SimHashIndex(args.distance)
+    dups = []
+    empty = 0
+    # Signatures are computed in parallel; pages are indexed in path order
+    with Pool(args.workers) as pool:
+        signatures = pool.imap(partial(file_signature, shingle=args.shingle), paths,
+                               chunksize=16)
+        for path, (is_empty, sig) in zip(paths, signatures):
+            empty += is_empty
+            match = index.check(path, sig)
+            if match is not None:
+                dups.append((path, match[0], match[1]))
+    took = time.time() - start
+
+    exact = sum(1 for _, _, dist in dups if dist == 0)
+    print(f"{len(paths)} vocab files, {empty} empty, {len(dups)} near-duplicates "
+          f"({exact} identical signatures) in {took:.1f}s")
+    print(f"Unique pages left for indexing: {len(paths) - len(dups)}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as rf:
+            for path, original, dist in dups:
+                rf.write(f"{path}\t{original}\t{dist}\n")
+        print(f"Report written to {args.report}")
+    if args.move_to:
+        for path, _, _ in dups:
+            dest = os.path.join(args.move_to, os.path.relpath(path, args.vocab_dir))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.move(path, dest)
+        print(f"Moved {len(dups)} duplicates to {args.move_to}")
+
+
+if __name__ == "__main__":
+    main()
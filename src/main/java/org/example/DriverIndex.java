@@ -63,11 +63,14 @@ public class DriverIndex {
 package org.example;
 
 import java.io.File;
+import java.io.IOException;
 import java.net.URI;
 
 import org.apache.hadoop.conf.Configuration;
 import org.apache.hadoop.fs.LocalFileSystem;
+import org.apache.hadoop.fs.LocatedFileStatus;
 import org.apache.hadoop.fs.Path;
+import org.apache.hadoop.fs.RemoteIterator;
 import org.apache.hadoop.io.Text;
 import org.apache.hadoop.mapreduce.Job;
 import org.apache.hadoop.mapreduce.lib.input.FileInputFormat;
@@ -78,7 +81,7 @@ public class DriverIndex {
         System.setProperty("hadoop.home.dir", "C:\\hadoop");
         System.load("C:\\hadoop\\bin\\hadoop.dll"); // Load native library
         if (args.length != 3) {
-            System.err.println("Usage: DriverIndex <input_dir> <url_mapping_json> <output_dir>");
+            System.err.println("Usage: DriverIndex <input_dir> <url_mapping.tsv|url_mapping_json> <output_dir>");
             System.exit(-1);
         }
         String inputDir      = args[0];
@@ -117,9 +120,10 @@ public class DriverIndex {
         // Verify job's configuration
         System.out.println("Job's mapreduce.framework.name: " + job.getConfiguration().get("mapreduce.framework.name"));
 
-        // 5) Ship the JSON mapping into each mapper
+        // 5) Ship the mapping (TSV log or legacy JSON) into each mapper
         URI mapUri = new File(mappingJson).toURI();
-        job.addCacheFile(new URI(mapUri.toString() + "#url_mapping.json"));
+        String mapLink = mappingJson.endsWith(".tsv") ? "url_mapping.tsv" : "url_mapping.json";
+        job.addCacheFile(new URI(mapUri.toString() + "#" + mapLink));
 
         job.setMapperClass(MapperIndex.class);
         job.setCombinerClass(CombinerIndex.class);
@@ -128,13 +132,45 @@ public class DriverIndex {
         job.setOutputKeyClass(Text.class);
         job.setOutputValueClass(Text.class);
 
-        conf.setBoolean("mapreduce.input.FileInputFormat.input.dir.recursive", true);
+        // the Job holds its own copy of conf, so set this on the job's configuration
+        job.getConfiguration().setBoolean("mapreduce.input.fileinputformat.input.dir.recursive", true);
+
+        // Crawls written with --vocab-format segments: one split per segment file.
+        // One job reads one format, so a tree holding both is refused instead of
+        // silently indexing only half of it
+        Path inPath = new Path(inputDir);
+        int[] counts = countVocab(localFs, inPath);
+        if (counts[0] > 0 && counts[1] > 0) {
+            System.err.println("Input mixes " + counts[0] + " vocab_*.txt files and " + counts[1]
+                    + " segments (*.seg); pack the files into segments first: python segments.py pack "
+                    + inputDir);
+            System.exit(-1);
+        }
+        if (counts[1] > 0) {
+            System.out.println("Reading vocab segments (*.seg)");
+            job.setInputFormatClass(SegmentInputFormat.class);
+        }
 
-        FileInputFormat.addInputPath(job, new Path(inputDir));
+        FileInputFormat.addInputPath(job, inPath);
         FileOutputFormat.setOutputPath(job, outPath);
 
         // 6) Run and wait
         boolean success = job.waitForCompletion(true);
         System.exit(success ? 0 : 1);
     }
+
+    // {vocab_*.txt files, *.seg segments} under dir
+    static int[] countVocab(LocalFileSystem fs, Path dir) throws IOException {
+        int[] counts = new int[2];
+        RemoteIterator<LocatedFileStatus> files = fs.listFiles(dir, true);
+        while (files.hasNext()) {
+            String name = files.next().getPath().getName();
+            if (name.startsWith("vocab_") && name.endsWith(".txt")) {
+                counts[0]++;
+            } else if (name.endsWith(".seg")) {
+                counts[1]++;
+            }
+        }
+        return counts;
+    }
 }
\ No newline at end of file
@@ -1,9 +1,12 @@
 package org.example;
 
 import java.io.BufferedReader;
+import java.io.FileInputStream;
 import java.io.FileReader;
 import java.io.IOException;
+import java.io.InputStreamReader;
 import java.net.URI;
+import java.nio.charset.StandardCharsets;
 import java.util.Arrays;
 import java.util.HashMap;
 import java.util.Map;
@@ -12,12 +15,13 @@ import java.util.StringTokenizer;
 import com.google.gson.Gson;
 import com.google.gson.reflect.TypeToken;
 
-import org.apache.hadoop.io.LongWritable;
 import org.apache.hadoop.io.Text;
 import org.apache.hadoop.mapreduce.Mapper;
 import org.apache.hadoop.mapreduce.lib.input.FileSplit;
 
-public class MapperIndex extends Mapper<LongWritable, Text, Text, Text> {
+// Input is either one vocab_<safeName>.txt per split (TextInputFormat, key = byte
+// offset) or SegmentInputFormat records (key = safeName, value = the vocab line).
+public class MapperIndex extends Mapper<Object, Text, Text, Text> {
     private Map<String,String> urlMap = new HashMap<>();
     private final Text outKey = new Text();   // the term
     private final Text outVal = new Text();   // the full URL
@@ -28,13 +32,16 @@ public class MapperIndex extends Mapper<LongWritable, Text, Text, Text> {
         // load the mapping file from the distributed cache
         URI[] cacheFiles = context.getCacheFiles();
         if (cacheFiles == null) {
-            throw new IOException("url_mapping.json not found in Distributed Cache");
+            throw new IOException("url_mapping not found in Distributed Cache");
         }
         for (URI uri : cacheFiles) {
             // match on the fragment or the filename part
-            String frag = uri.getFragment();             // "url_mapping.json"
+            String frag = uri.getFragment();             // "url_mapping.json" / "url_mapping.tsv"
             String path = uri.getPath();                 // "D:/…/url_mapping_final.json"
-            if ("url_mapping.json".equals(frag) || path.endsWith("url_mapping_final.json")) {
+            if ("url_mapping.tsv".equals(frag) || path.endsWith(".tsv")) {
+                // append-only log: one "<hash>\t<url>" per line, later lines win
+                urlMap = loadTsvMapping(path);
+            } else if ("url_mapping.json".equals(frag) || path.endsWith("url_mapping_final.json")) {
                 // read straight from the URI’s path
                 try (BufferedReader br = new BufferedReader(new FileReader(path))) {
                     Gson gson = new Gson();
@@ -56,17 +63,39 @@ public class MapperIndex extends Mapper<LongWritable, Text, Text, Text> {
 
     }
 
+    // stream the TSV log line by line instead of deserializing one huge object
+    static Map<String,String> loadTsvMapping(String path) throws IOException {
+        Map<String,String> map = new HashMap<>();
+        try (BufferedReader br = new BufferedReader(
+                new InputStreamReader(new FileInputStream(path), StandardCharsets.UTF_8))) {
+            String line;
+            while ((line = br.readLine()) != null) {
+                int tab = line.indexOf('\t');
+                if (tab > 0) {
+                    map.put(line.substring(0, tab), line.substring(tab + 1));
+                }
+            }
+        }
+        return map;
+    }
+
     @Override
-    protected void map(LongWritable key, Text value, Context context)
+    protected void map(Object key, Text value, Context context)
             throws IOException, InterruptedException {
-        // get the filename being processed (e.g. vocab_<safeName>.txt)
-        String filename = ((FileSplit)context.getInputSplit())
-                              .getPath()
-                              .getName();
-        // strip prefix and suffix to recover the safeName
-        String safeName = filename
-            .replaceFirst("^vocab_", "")
-            .replaceFirst("\\.txt$", "");
+        String safeName;
+        if (key instanceof Text) {
+            // segment record: the key already is the safeName
+            safeName = key.toString();
+        } else {
+            // get the filename being processed (e.g. vocab_<safeName>.txt)
+            String filename = ((FileSplit)context.getInputSplit())
+                                  .getPath()
+                                  .getName();
+            // strip prefix and suffix to recover the safeName
+            safeName = filename
+                .replaceFirst("^vocab_", "")
+                .replaceFirst("\\.txt$", "");
+        }
 
         // look up the real URL
         String url = urlMap.get(safeName);
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+import argparse
+import fnmatch
+import heapq
+import mmap
+import os
+import re
+import shutil
+import struct
+import time
+
+# --- Term dictionary layout (little-endian), terms.dict in a binary index directory ---
+# b"ITDC", version u32, term count u64, block count u32, terms per block u32,
+# then per block (data offset u64, largest doc freq u32), then the blocks.
+# A block's first term is stored whole (varint length, bytes, varint doc
+# freq); every other term as varint shared prefix length with the previous
+# term, varint suffix length, suffix bytes, varint doc freq (front coding).
+# Terms are in byte order, and a term's ordinal is its position in terms.bin.
+VERSION = 1
+BLOCK_TERMS = 16
+HEAD = struct.Struct("<4sIQII")
+BLOCK_ENTRY = struct.Struct("<QI")
+WILDCARDS = re.compile(r"[*?\[]")
+
+
+def _varint(n: int, out: bytearray):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos: int) -> tuple:
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+# --- Streaming writer: add() terms in byte order ---
+class TermDictWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._data = open(path + ".data.tmp", "wb")
+        self._blocks = []
+        self._block = bytearray()
+        self._block_df = 0
+        self._prev = b""
+        self.count = 0
+        self._pos = 0
+
+    def add(self, term: bytes, df: int):
+        if self.count % BLOCK_TERMS == 0:
+            self._flush_block()
+            _varint(len(term), self._block)
+            self._block += term
+        else:
+            shared = 0
+            limit = min(len(term), len(self._prev))
+            while shared < limit and term[shared] == self._prev[shared]:
+                shared += 1
+            _varint(shared, self._block)
+            _varint(len(term) - shared, self._block)
+            self._block += term[shared:]
+        _varint(df, self._block)
+        self._block_df = max(self._block_df, df)
+        self._prev = term
+        self.count += 1
+
+    def _flush_block(self):
+        if self._block:
+            self._blocks.append(BLOCK_ENTRY.pack(self._pos, self._block_df))
+            self._data.write(self._block)
+            self._pos += len(self._block)
+        self._block = bytearray()
+        self._block_df = 0
+
+    def close(self):
+        self._flush_block()
+        self._data.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as out:
+            out.write(HEAD.pack(b"ITDC", VERSION, self.count, len(self._blocks), BLOCK_TERMS))
+            out.write(b"".join(self._blocks))
+            with open(self.path + ".data.tmp", "rb") as data:
+                shutil.copyfileobj(data, out, 1 << 20)
+        os.remove(self.path + ".data.tmp")
+        os.replace(tmp, self.path)
+
+
+# --- Memory-mapped reader ---
+# Exact lookups binary-search the blocks by their first term, then decode one
+# block. Prefix enumeration walks the contiguous run of blocks that can hold
+# the prefix; wildcards enumerate the literal prefix before the first
+# wildcard (the whole dictionary for a leading one) and filter.
+class TermDict:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.block_count, self.block_terms = \
+            HEAD.unpack_from(self._data, 0)
+        if magic != b"ITDC" or version != VERSION:
+            raise ValueError(f"{path} is not a term dictionary")
+        self._base = HEAD.size + BLOCK_ENTRY.size * self.block_count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entry(self, b: int) -> tuple:
+        # (data offset, largest doc freq) of block b
+        return BLOCK_ENTRY.unpack_from(self._data, HEAD.size + BLOCK_ENTRY.size * b)
+
+    def _first(self, b: int) -> bytes:
+        pos = self._base + self._entry(b)[0]
+        n, pos = _read_varint(self._data, pos)
+        return self._data[pos:pos + n]
+
+    def _block(self, b: int) -> list:
+        # [(term, doc freq)] of block b
+        data = self._data
+        pos = self._base + self._entry(b)[0]
+        terms = []
+        n, pos = _read_varint(data, pos)
+        term = data[pos:pos + n]
+        df, pos = _read_varint(data, pos + n)
+        terms.append((term, df))
+        for _ in range(min(self.block_terms, self.count - b * self.block_terms) - 1):
+            shared, pos = _read_varint(data, pos)
+            n, pos = _read_varint(data, pos)
+            term = term[:shared] + data[pos:pos + n]
+            df, pos = _read_varint(data, pos + n)
+            terms.append((term, df))
+        return terms
+
+    def _find_block(self, key: bytes) -> int:
+        # Last block whose first term is <= key (0 if none)
+        lo, hi = 0, self.block_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._first(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return max(lo - 1, 0)
+
+    def find(self, term: str) -> int:
+        # Ordinal of term, or -1
+        key = term.encode("utf-8")
+        if not self.count:
+            return -1
+        b = self._find_block(key)
+        for i, (t, _) in enumerate(self._block(b)):
+            if t == key:
+                return b * self.block_terms + i
+        return -1
+
+    def prefix(self, prefix: str):
+        # (term, ordinal, doc freq) of every term starting with prefix, in order
+        for _, matches in self._prefix_blocks(prefix.encode("utf-8")):
+            yield from matches
+
+    def _prefix_blocks(self, key: bytes, skip=None):
+        # Blocks that can hold key-prefixed terms, as (block, [(term, ordinal,
+        # df)] of the matching terms); blocks skip(block) rejects are not decoded
+        if not self.count:
+            return
+        for b in range(self._find_block(key), self.block_count):
+            first = self._first(b)
+            if first > key and not first.startswith(key):
+                return
+            if skip is not None and skip(b):
+                continue
+            base = b * self.block_terms
+            matches = [(t.decode("utf-8"), base + i, df)
+                       for i, (t, df) in enumerate(self._block(b)) if t.startswith(key)]
+            yield b, matches
+
+    def complete(self, prefix: str, k: int = 10) -> list:
+        # The k most frequent terms starting with prefix: [(term, doc freq)].
+        # Once k are held, blocks whose largest doc freq cannot enter are skipped.
+        top = []
+
+        def skip(b: int) -> bool:
+            return len(top) == k and self._entry(b)[1] <= top[0][0]
+
+        for _, matches in self._prefix_blocks(prefix.encode("utf-8"), skip):
+            for term, ordinal, df in matches:
+                if len(top) < k:
+                    heapq.heappush(top, (df, -ordinal, term))
+                elif (df, -ordinal) > top[0][:2]:
+                    heapq.heapreplace(top, (df, -ordinal, term))
+        return [(term, df) for df, _, term in sorted(top, reverse=True)]
+
+    def expand(self, pattern: str, limit: int = None) -> list:
+        # Terms matching a shell-style wildcard (* ? [abc]): [(term, doc freq)]
+        # by doc freq, at most limit
+        literal = WILDCARDS.split(pattern, 1)[0]
+        match = re.compile(fnmatch.translate(pattern)).match
+        terms = [(term, df) for term, _, df in self.prefix(literal) if match(term)]
+        if limit is not None and len(terms) > limit:
+            return heapq.nlargest(limit, terms, key=lambda t: t[1])
+        return sorted(terms, key=lambda t: -t[1])
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Write terms.dict for an existing binary index directory ---
+def build_dict(binary_dir: str) -> int:
+    from postings import BinaryIndex
+    writer = TermDictWriter(os.path.join(binary_dir, "terms.dict"))
+    with BinaryIndex(binary_dir) as index:
+        for i in range(index.term_count):
+            writer.add(index._term_bytes(i), index.entry(i)[2])
+    writer.close()
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Front-coded term dictionary of a binary index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Write terms.dict for a binary index built without one")
+    build.add_argument("binary_dir")
+    stats = sub.add_parser("stats", help="Terms, blocks and size")
+    stats.add_argument("binary_dir")
+    complete = sub.add_parser("complete", help="Most frequent terms with a prefix")
+    complete.add_argument("binary_dir")
+    complete.add_argument("prefix")
+    complete.add_argument("-k", type=int, default=10)
+    expand = sub.add_parser("expand", help="Terms matching a wildcard pattern (* ? [abc])")
+    expand.add_argument("binary_dir")
+    expand.add_argument("pattern")
+    expand.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    path = os.path.join(args.binary_dir, "terms.dict")
+    if args.command == "build":
+        start = time.time()
+        count = build_dict(args.binary_dir)
+        print(f"{count} terms -> {path} ({os.path.getsize(path) / 1e6:.2f} MB) "
+              f"in {time.time() - start:.1f}s")
+        return
+    with TermDict(path) as terms:
+        start = time.perf_counter()
+        if args.command == "stats":
+            print(f"{terms.count} terms in {terms.block_count} blocks of {terms.block_terms}, "
+                  f"{os.path.getsize(path) / 1e6:.2f} MB")
+            return
+        if args.command == "complete":
+            results = terms.complete(args.prefix, args.k)
+        else:
+            results = terms.expand(args.pattern, args.limit)
+        took = (time.perf_counter() - start) * 1000
+        for term, df in results:
+            print(f"{df:>8}  {term}")
+        print(f"{len(results)} terms in {took:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import os
+
+from archive import (WarcArchive, archive_files, latest_records, merge_archive, read_at,
+                     read_index, reprocess, url_hash)
+from parse_pool import parse_page
+from parsers import get_parser
+from segments import VocabSegments, iter_documents
+from tokenizer import Tokenizer
+
+HEADERS = {"Content-Type": "text/html; charset=utf-8", "Content-Encoding": "gzip",
+           "Content-Length": "3", "ETag": '"v1"'}
+
+
+def page(n: int, word: str = "page") -> bytes:
+    return (f"<html><body><p>{word} number {n} café</p>"
+            f"<a href='/p{n + 1}'>next</a></body></html>").encode("utf-8")
+
+
+def test_round_trip_and_recovery_without_index(tmp_path):
+    archive = WarcArchive(str(tmp_path))
+    urls = [f"http://h/p{n}" for n in range(5)]
+    for n, url in enumerate(urls):
+        archive.write("books", url, 200, HEADERS, page(n))
+    archive.close()
+    assert archive.records == 5
+    [path] = archive_files(str(tmp_path))
+    entries = read_index(path)
+    assert [(key, topic, url) for key, topic, _, _, url in entries] == \
+        [(url_hash(url), "books", url) for url in urls]
+
+    fields, status, headers, body = read_at(path, entries[2][2], entries[2][3])
+    assert fields["WARC-Target-URI"] == urls[2]
+    assert status == 200 and body == page(2)
+    # Bodies are stored decoded, so the encoding and length are rewritten
+    assert "content-encoding" not in headers
+    assert headers["content-length"] == str(len(body))
+    assert headers["etag"] == '"v1"'
+
+    # A file left unsealed by a crash is indexed by scanning its members
+    os.remove(path[:-len(".warc.gz")] + ".idx")
+    assert read_index(path) == entries
+    # ... up to a torn last member
+    with open(path, "r+b") as f:
+        f.truncate(entries[-1][2] + entries[-1][3] // 2)
+    assert read_index(path) == entries[:-1]
+
+
+def test_roll_over_latest_wins_and_merge(tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    archive = WarcArchive(archive_dir, max_bytes=600)
+    for version in ("old", "new"):
+        for n in range(3):
+            archive.write("books", f"http://h/p{n}", 200, HEADERS, page(n, version))
+    archive.close()
+    files = archive_files(archive_dir)
+    assert len(files) > 1
+    assert all(os.path.exists(p[:-len(".warc.gz")] + ".idx") for p in files)
+    latest = latest_records(archive_dir)
+    assert len(latest) == 3
+    for key, (path, _, offset, length, url) in latest.items():
+        assert b"new number" in read_at(path, offset, length)[3]
+
+    shard = str(tmp_path / "shard")
+    other = WarcArchive(shard)
+    other.write("travel", "http://h/t0", 200, HEADERS, page(0))
+    other.close()
+    assert merge_archive(shard, archive_dir) == 1
+    assert archive_files(shard) == []
+    assert len(archive_files(archive_dir)) == len(files) + 1
+    assert latest_records(archive_dir)[url_hash("http://h/t0")][1] == "travel"
+
+
+def crawl_output(tmp_path) -> str:
+    # Three archived pages, one of them a near-duplicate, plus a page crawled
+    # before --archive that only has its vocab file
+    output = tmp_path / "output"
+    (output / "books").mkdir(parents=True)
+    archive = WarcArchive(str(output / "archive"))
+    for n in range(3):
+        archive.write("books", f"http://h/p{n}", 200, HEADERS, page(n, "Archived"))
+    archive.close()
+    (output / "duplicates.tsv").write_text(f"{url_hash('http://h/p2')}\tdup\n", encoding="utf-8")
+    (output / "books" / "vocab_00000000000000ff.txt").write_text("crawled before", encoding="utf-8")
+    return str(output)
+
+
+def expected(n: int, parse, tokenize) -> str:
+    tokens, _ = parse_page(page(n, "Archived"), "utf-8", f"http://h/p{n}", parse, tokenize)
+    return " ".join(tokens)
+
+
+def test_reprocess_rebuilds_archived_pages_and_reports_the_rest(tmp_path):
+    output = crawl_output(tmp_path)
+    name, parse = get_parser("auto")
+    count, missed = reprocess(output, output, 2, name, True, None, 0)
+    assert count == 2
+    assert missed == {"books": 1}
+    tokenize = Tokenizer(lowercase=True)
+    books = os.path.join(output, "books")
+    for n in range(2):
+        with open(os.path.join(books, f"vocab_{url_hash(f'http://h/p{n}')}.txt"),
+                  encoding="utf-8") as f:
+            assert f.read() == expected(n, parse, tokenize)
+    assert not os.path.exists(os.path.join(books, f"vocab_{url_hash('http://h/p2')}.txt"))
+    with open(os.path.join(books, "vocab_00000000000000ff.txt"), encoding="utf-8") as f:
+        assert f.read() == "crawled before"
+
+
+def test_reprocess_into_segments(tmp_path):
+    output = crawl_output(tmp_path)
+    out = str(tmp_path / "out")
+    name, parse = get_parser("auto")
+    segments = VocabSegments("deflate")
+    try:
+        count, missed = reprocess(output, out, 2, name, False, None, 0, segments)
+    finally:
+        segments.close()
+    assert (count, missed) == (2, {"books": 1})
+    tokenize = Tokenizer()
+    assert dict(iter_documents(out)) == {url_hash(f"http://h/p{n}"): expected(n, parse, tokenize)
+                                         for n in range(2)}
@@ -0,0 +1,94 @@
+import os
+import time
+
+from frontier import (Frontier, FreshnessPriority, FrontierStore, PatternPriority,
+                      PersistentFrontier)
+
+
+def drain(frontier) -> list:
+    out = []
+    while True:
+        item = frontier.pop()
+        if item is None:
+            return out
+        out.append(item)
+
+
+def test_fifo_within_priority_and_dedupe():
+    frontier = Frontier()
+    for url in ["a", "b", "a", "c", "b"]:
+        frontier.push(url, 1)
+    frontier.push("root", 0)
+    assert len(frontier) == 4
+    assert drain(frontier) == [("root", 0), ("a", 1), ("b", 1), ("c", 1)]
+    # Popped URLs are still known, so they are not queued again
+    assert "a" in frontier
+    assert not frontier.push("a", 1)
+
+
+def test_spill_keeps_order_and_bounds_memory(tmp_path):
+    spill_dir = str(tmp_path / "spill")
+    frontier = Frontier(max_in_memory=10, spill_dir=spill_dir)
+    urls = [f"http://h/{i}" for i in range(100)]
+    for url in urls + urls[::3]:
+        frontier.push(url, 0)
+    assert len(frontier) == 100
+    # Neither the queue nor the dedupe set holds more than max_in_memory entries
+    assert frontier._in_memory <= 10
+    assert len(frontier._seen) <= 10
+    assert os.path.exists(os.path.join(spill_dir, "seen.fp"))
+    assert [url for url, _ in drain(frontier)] == urls
+    assert all(url in frontier for url in urls)
+    assert "http://h/unknown" not in frontier
+    frontier.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_leftover_spill_dir_is_cleared(tmp_path):
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+    (spill_dir / "prio_0.txt").write_text("0\thttp://stale\n")
+    frontier = Frontier(max_in_memory=1, spill_dir=str(spill_dir))
+    frontier.push("http://fresh", 0)
+    frontier.push("http://fresh/2", 0)
+    assert [url for url, _ in drain(frontier)] == ["http://fresh", "http://fresh/2"]
+
+
+def test_pattern_priority():
+    prio = PatternPriority([(r"/page/\d+/", -5)])
+    assert prio("http://h/page/2/", 3) == -2
+    assert prio("http://h/item", 3) == 3
+
+
+def test_freshness_priority():
+    now = time.time()
+    checked = {"http://h/old": now - 40 * 86400, "http://h/new": now - 60}
+    prio = FreshnessPriority(checked.get)
+    frontier = Frontier(prio)
+    for url in ["http://h/new", "http://h/old", "http://h/never"]:
+        frontier.push(url, 1)
+    assert [url for url, _ in drain(frontier)] == ["http://h/old", "http://h/never",
+                                                   "http://h/new"]
+
+
+def test_persistent_frontier_dedupes_through_the_table(tmp_path):
+    path = str(tmp_path / "frontier.sqlite3")
+    store = FrontierStore(path)
+    frontier = PersistentFrontier(store, "k", batch_size=2)
+    for url in ["a", "b", "c", "a", "b"]:
+        frontier.push(url, 0)
+    assert len(frontier) == 3
+    assert frontier.pop() == ("a", 0)
+    frontier.mark_stored("a")
+    assert frontier.pop() == ("b", 0)
+    frontier.suspend()
+    store.close()
+
+    # b was popped but never stored, so a resumed crawl gets it again; a is never re-queued
+    store = FrontierStore(path)
+    frontier = PersistentFrontier(store, "k", visited={"a"})
+    assert frontier.pages == 1
+    assert not frontier.push("a", 0)
+    assert "c" in frontier and "d" not in frontier
+    assert drain(frontier) == [("b", 0), ("c", 0)]
+    store.close()
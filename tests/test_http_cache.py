@@ -0,0 +1,40 @@
+from http_cache import HttpCache, content_hash
+
+
+def test_revalidate_outcomes(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.sqlite3"))
+    url = "http://h/p"
+    meta, links = cache.revalidate(url, 200, {"ETag": '"v1"'}, b"body")
+    assert links is None and meta == ('"v1"', None, content_hash(b"body"))
+    cache.put(url, meta, ["http://h/a", "http://h/b"])
+    assert cache.conditional_headers(url) == {"If-None-Match": '"v1"'}
+
+    assert cache.revalidate(url, 200, {"ETag": '"v2"'}, b"body") == \
+        (None, ["http://h/a", "http://h/b"])
+    meta, links = cache.revalidate(url, 200, {}, b"new body")
+    assert links is None and meta[2] == content_hash(b"new body")
+    assert cache.revalidate("http://h/unknown", 304, {}, b"") == (None, [])
+    assert dict(cache.stats) == {"new": 1, "same_body": 1, "changed": 1, "not_modified": 1}
+    cache.close()
+
+
+def test_not_modified_refreshes_checked_and_validators(tmp_path, monkeypatch):
+    path = str(tmp_path / "http_cache.sqlite3")
+    cache = HttpCache(path)
+    url = "http://h/p"
+    monkeypatch.setattr("http_cache.time.time", lambda: 1000.0)
+    cache.put(url, ('"v1"', "Mon, 01 Jan 2024 00:00:00 GMT", content_hash(b"body")), ["http://h/a"])
+
+    monkeypatch.setattr("http_cache.time.time", lambda: 2000.0)
+    assert cache.revalidate(url, 304, {"ETag": '"v2"'}, b"") == (None, ["http://h/a"])
+    assert cache.last_checked(url) == 2000.0
+    # A 304 without Last-Modified keeps the stored one
+    assert cache.conditional_headers(url) == {"If-None-Match": '"v2"',
+                                              "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    cache.close()
+
+    cache = HttpCache(path)
+    assert cache.last_checked(url) == 2000.0
+    assert cache.get(url) == ('"v2"', "Mon, 01 Jan 2024 00:00:00 GMT", content_hash(b"body"),
+                              ["http://h/a"])
+    cache.close()
@@ -0,0 +1,164 @@
+import os
+
+import pytest
+
+from incremental_index import IncrementalIndexer, IndexState, merge, pick_merge
+from postings import build_binary
+from query import QueryEngine
+from segments import SegmentDir
+
+
+def write_vocab(root, key: str, text: str):
+    path = os.path.join(root, f"vocab_{key}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    # A rewrite within one mtime tick must still look changed
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def update(index_dir: str, input_dir: str):
+    state = IndexState(index_dir)
+    try:
+        indexer = IncrementalIndexer(state, None)
+        indexer.update(input_dir)
+        return indexer.stats
+    finally:
+        state.close()
+
+
+def hits(index_dir: str, query: str) -> list:
+    engine = QueryEngine(index_dir)
+    try:
+        return sorted(url for _, url in engine.search_exhaustive(query, k=100))
+    finally:
+        engine.close()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    crawl = tmp_path / "output"
+    crawl.mkdir()
+    return str(crawl), str(tmp_path / "index")
+
+
+def test_updates_track_added_changed_and_deleted_files(dirs):
+    crawl, index = dirs
+    write_vocab(crawl, "a" * 16, "apple common")
+    write_vocab(crawl, "b" * 16, "banana common")
+    stats = update(index, crawl)
+    assert stats["added"] == 2 and stats["segments"] == 1
+    assert hits(index, "common") == ["a" * 16, "b" * 16]
+
+    # Nothing changed: no file is read again
+    assert update(index, crawl)["files read"] == 0
+
+    write_vocab(crawl, "a" * 16, "apricot common")
+    os.remove(os.path.join(crawl, f"vocab_{'b' * 16}.txt"))
+    write_vocab(crawl, "c" * 16, "cherry")
+    stats = update(index, crawl)
+    assert (stats["added"], stats["changed"], stats["deleted"]) == (1, 1, 1)
+    assert hits(index, "apple") == []
+    assert hits(index, "apricot") == ["a" * 16]
+    assert hits(index, "common") == ["a" * 16]
+    assert hits(index, "banana") == []
+
+    before = {q: hits(index, q) for q in ("apricot", "common", "cherry")}
+    assert merge(index, full=True) == 1
+    state = IndexState(index)
+    try:
+        assert [(docs, dead) for _, docs, dead in state.live_segments()] == [(2, 0)]
+    finally:
+        state.close()
+    assert {q: hits(index, q) for q in before} == before
+
+
+def test_segment_input_honours_deletions(dirs):
+    crawl, index = dirs
+    seg = SegmentDir(crawl)
+    seg.write("a" * 16, "apple")
+    seg.write("b" * 16, "banana")
+    seg.close()
+    update(index, crawl)
+    seg = SegmentDir(crawl)
+    seg.write("a" * 16, "apricot")
+    seg.delete("b" * 16)
+    seg.close()
+    stats = update(index, crawl)
+    assert (stats["changed"], stats["deleted"]) == (1, 1)
+    assert hits(index, "apple") == [] and hits(index, "banana") == []
+    assert hits(index, "apricot") == ["a" * 16]
+
+
+@pytest.mark.parametrize("change", ["put", "remove"])
+def test_merge_between_lookup_and_flush_keeps_the_deletion(dirs, change):
+    # update holds update.lock and a merge holds merge.lock, so a merge can
+    # move a document after the update looked it up but before it flushed
+    crawl, index = dirs
+    write_vocab(crawl, "a" * 16, "apple")
+    update(index, crawl)
+    write_vocab(crawl, "b" * 16, "banana")
+    update(index, crawl)
+
+    state = IndexState(index)
+    try:
+        indexer = IncrementalIndexer(state, None)
+        if change == "put":
+            indexer.put("a" * 16, "apricot", f"vocab_{'a' * 16}.txt")
+        else:
+            indexer.remove("a" * 16)
+        assert merge(index, full=True) == 1
+        indexer.flush()
+    finally:
+        state.close()
+    assert hits(index, "apple") == []
+    assert hits(index, "apricot") == (["a" * 16] if change == "put" else [])
+    assert hits(index, "banana") == ["b" * 16]
+
+
+def test_pick_merge_tiers():
+    # (segment ID, docs, deleted docs)
+    assert pick_merge([(1, 10, 0), (2, 10, 0), (3, 10, 0)], fanout=3) == [1, 2, 3]
+    assert pick_merge([(1, 10, 0), (2, 10, 0)], fanout=3) == []
+    assert pick_merge([(1, 100, 0), (2, 10, 6)], fanout=3) == [2]
+
+
+def test_scores_match_a_full_build(tmp_path):
+    # The mapping also holds pages of another topic, and one page is empty
+    crawl = tmp_path / "output"
+    crawl.mkdir()
+    texts = {"a" * 16: "cheap flights europe cheap", "b" * 16: "europe trains",
+             "c" * 16: "flights flights", "d" * 16: ""}
+    for key, text in texts.items():
+        write_vocab(str(crawl), key, text)
+    mapping = {key: f"http://h/{key[0]}" for key in texts}
+    mapping["e" * 16] = "http://other/e"
+
+    index = str(tmp_path / "index-inc")
+    state = IndexState(index)
+    try:
+        IncrementalIndexer(state, mapping).update(str(crawl))
+    finally:
+        state.close()
+
+    text_index = tmp_path / "text"
+    text_index.mkdir()
+    postings = {}
+    for key, text in texts.items():
+        for term in sorted(set(text.split())):
+            postings.setdefault(term, []).append(f"{mapping[key]}|{text.split().count(term)}")
+    (text_index / "part-r-00000").write_text(
+        "".join(f"{term}\t{'; '.join(entries)}\n" for term, entries in sorted(postings.items())),
+        encoding="utf-8")
+    full = str(tmp_path / "index-bin")
+    build_binary(str(text_index), mapping, full)
+
+    for query in ("cheap flights", "europe", "trains flights"):
+        engines = [QueryEngine(index), QueryEngine(full)]
+        try:
+            inc, ref = (e.search_exhaustive(query, k=10) for e in engines)
+        finally:
+            for e in engines:
+                e.close()
+        assert [url for _, url in inc] == [url for _, url in ref]
+        assert [s for s, _ in inc] == pytest.approx([s for s, _ in ref])
@@ -0,0 +1,42 @@
+import pytest
+
+from parsers import PARSERS, available_parsers, get_parser
+from tokenizer import default_tokenizer
+
+BACKENDS = available_parsers()
+
+
+def tokens(name: str, html: str) -> list:
+    texts, _ = PARSERS[name](html)
+    return list(default_tokenizer(texts))
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_entities_do_not_split_words(name):
+    html = ("<p>Caf&eacute; cr&#232;me &amp; na&#x00EF;ve</p>"
+            "<p>&#1605;&#1585;&#1581;&#1576;&#1575; &#1576;&#1603;</p>")
+    assert tokens(name, html) == ["Café", "crème", "naïve", "مرحبا", "بك"]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_skips_script_and_style_and_collects_hrefs(name):
+    html = ("<html><head><style>p { color: red }</style><script>var hidden = 1;</script>"
+            "</head><body><a href='/one'>One</a> text <a>no href</a>"
+            "<a href=\"http://x/two\">Two</a></body></html>")
+    texts, hrefs = PARSERS[name](html)
+    assert list(default_tokenizer(texts)) == ["One", "text", "no", "href", "Two"]
+    assert hrefs == ["/one", "http://x/two"]
+
+
+def test_backends_agree():
+    html = ("<div>Alpha<b>beta</b> gamma&nbsp;delta <i>&lt;tag&gt;</i>"
+            "<p>first&#8217;s</p><p>second</p></div>")
+    results = {name: tokens(name, html) for name in BACKENDS}
+    assert len(set(map(tuple, results.values()))) == 1, results
+
+
+def test_get_parser():
+    name, parse = get_parser("auto")
+    assert name in BACKENDS and parse is PARSERS[name]
+    with pytest.raises(ValueError):
+        get_parser("nope")
@@ -0,0 +1,98 @@
+import random
+from array import array
+
+from postings import (BLOCK, BinaryIndex, build_binary, decode_postings, encode_postings,
+                      export_text, write_binary)
+
+
+def test_varint_postings_round_trip():
+    # Both the one-byte fast path and multi-byte varints
+    for doc_ids, counts in [([0, 1, 5, 100], [1, 2, 3, 127]),
+                            ([3, 200, 70000, 2 ** 32 - 1], [1, 300, 1, 2 ** 20])]:
+        assert decode_postings(encode_postings(doc_ids, counts)) == (doc_ids, counts)
+    # A block continues from the previous block's last doc ID
+    data = encode_postings([10, 12], [1, 1], last=9)
+    assert decode_postings(data, 9) == ([10, 12], [1, 1])
+
+
+def sample(seed: int = 7) -> tuple:
+    rng = random.Random(seed)
+    urls = [f"http://h/{n}" for n in range(1000)]
+    doc_lens = array("I", (rng.randint(1, 5000) for _ in urls))
+    postings = []
+    for term in sorted(["a", "common", "rare", "zebra", "ünïcode", "日本"]):
+        size = 700 if term == "common" else rng.randint(1, 50)
+        doc_ids = sorted(rng.sample(range(len(urls)), size))
+        postings.append((term, doc_ids, [rng.randint(1, 300) for _ in doc_ids]))
+    return postings, urls, doc_lens
+
+
+def test_binary_index_round_trip(tmp_path):
+    postings, urls, doc_lens = sample()
+    assert write_binary(str(tmp_path), iter(postings), urls, doc_lens) == len(postings)
+    with BinaryIndex(str(tmp_path)) as index:
+        assert index.doc_count == len(urls)
+        assert list(index.doc_lens) == list(doc_lens)
+        assert [index.url(doc) for doc in (0, 999)] == [urls[0], urls[999]]
+        assert list(index.terms()) == [term for term, _, _ in postings]
+        for term, doc_ids, counts in postings:
+            assert index.doc_freq(term) == len(doc_ids)
+            assert index.postings(term) == (doc_ids, counts)
+        assert index.find("missing") == -1 and index.postings("b") == ([], [])
+        assert index.dictionary is not None and len(index.dictionary) == len(postings)
+
+
+def test_skip_blocks_match_postings(tmp_path):
+    postings, urls, doc_lens = sample()
+    write_binary(str(tmp_path), iter(postings), urls, doc_lens)
+    _, doc_ids, counts = next(p for p in postings if p[0] == "common")
+    with BinaryIndex(str(tmp_path)) as index:
+        i = index.find("common")
+        blocks = index.blocks(i)
+        assert len(blocks) == -(-len(doc_ids) // BLOCK)
+        assert index.blocks(index.find("rare")) is None
+        base = 0
+        for n, (last, start, end, max_tf, min_len) in enumerate(blocks):
+            block_docs, block_tfs = index.decode(start, end, base)
+            assert block_docs == doc_ids[n * BLOCK:(n + 1) * BLOCK]
+            assert block_tfs == counts[n * BLOCK:(n + 1) * BLOCK]
+            assert last == block_docs[-1] and max_tf == max(block_tfs)
+            assert min_len == min(doc_lens[doc] for doc in block_docs)
+            base = last
+
+
+def test_build_from_text_and_export(tmp_path):
+    text = tmp_path / "text"
+    text.mkdir()
+    # Terms are sorted within a part and a term lives in one part only
+    (text / "part-r-00000").write_text("apple\thttp://h/a|2; http://h/b|1\n"
+                                       "pear\thttp://h/c|4\n", encoding="utf-8")
+    (text / "part-r-00001").write_text("fig\thttp://h/b|3\n", encoding="utf-8")
+    mapping = {"0" * 16: "http://h/b", "1" * 16: "http://h/a"}
+    out = str(tmp_path / "binary")
+    assert build_binary(str(text), mapping, out) == (3, 3)
+    with BinaryIndex(out) as index:
+        # Mapped URLs come first, in mapping order; http://h/c only appears in the index
+        assert [index.url(doc) for doc in range(index.doc_count)] == \
+            ["http://h/b", "http://h/a", "http://h/c"]
+        assert list(index.doc_lens) == [4, 2, 4]
+        assert index.postings("apple") == ([0, 1], [1, 2])
+        export_text(index, str(tmp_path / "part-r-00000"))
+    assert (tmp_path / "part-r-00000").read_text(encoding="utf-8") == (
+        "apple\thttp://h/b|1; http://h/a|2\n"
+        "fig\thttp://h/b|3\n"
+        "pear\thttp://h/c|4\n")
+
+
+def test_build_leaves_out_mapped_urls_without_postings(tmp_path):
+    text = tmp_path / "text"
+    text.mkdir()
+    (text / "part-r-00000").write_text("apple\thttp://h/b|2\n", encoding="utf-8")
+    # Pages of other topics, or without a vocab file, are in the mapping too
+    mapping = {"0" * 16: "http://h/a", "1" * 16: "http://h/b", "2" * 16: "http://h/c"}
+    out = str(tmp_path / "binary")
+    assert build_binary(str(text), mapping, out) == (1, 1)
+    with BinaryIndex(out) as index:
+        assert index.doc_count == 1 and index.url(0) == "http://h/b"
+        assert index.avg_doc_len == 2
+        assert index.postings("apple") == ([0], [2])
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import subprocess
+import sys
+
+from rebuild_mapping import read_blocks, scan_vocab
+from segments import SegmentDir
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+def test_read_blocks_drops_a_torn_last_line(tmp_path):
+    master = tmp_path / "all_urls_master.txt"
+    master.write_bytes(b"http://h/a\nhttp://h/b\nhttp://h/tor")
+    for block_size in (1, 7, 1 << 20):
+        assert b"".join(read_blocks(str(master), block_size)) == b"http://h/a\nhttp://h/b\n"
+
+
+def test_scan_vocab_reads_files_and_segments(tmp_path):
+    (tmp_path / "books").mkdir()
+    (tmp_path / "books" / f"vocab_{url_hash('http://h/a')}.txt").write_text("a")
+    seg = SegmentDir(str(tmp_path / "travel"))
+    seg.write(url_hash("http://h/b"), "b")
+    seg.write(url_hash("http://h/gone"), "gone")
+    seg.delete(url_hash("http://h/gone"))
+    seg.close()
+    assert set(scan_vocab(str(tmp_path))) == {url_hash("http://h/a"), url_hash("http://h/b")}
+
+
+def test_rebuild_cross_checks_segments(tmp_path):
+    output = tmp_path / "output"
+    seg = SegmentDir(str(output / "travel"))
+    for url in ("http://h/a", "http://h/b"):
+        seg.write(url_hash(url), "text")
+    seg.close()
+    master = output / "all_urls_master.txt"
+    master.write_bytes(b"http://h/a\nhttp://h/b\nhttp://h/c\nhttp://h/d")
+    out = tmp_path / "url_mapping.tsv"
+    run = subprocess.run([sys.executable, os.path.join(ROOT, "rebuild_mapping.py"),
+                          "--master", str(master), "--out", str(out), "--vocab-dir", str(output),
+                          "--workers", "1"], capture_output=True, text=True, check=True)
+    assert out.read_text(encoding="utf-8") == "".join(
+        f"{url_hash(url)}\t{url}\n" for url in ("http://h/a", "http://h/b", "http://h/c"))
+    assert "URLs without a vocab file: 1" in run.stdout
+    assert "Vocab files without a mapping: 0" in run.stdout
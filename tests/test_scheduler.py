@@ -0,0 +1,84 @@
+import threading
+
+from scheduler import SeedScheduler
+
+
+class ReadyLimiter:
+    def ready_at(self, host: str) -> float:
+        return 0.0
+
+
+class FakeCrawl:
+    def __init__(self, host: str, pages: int, reopen: int = 0, fail_at: int = None):
+        self.host = host
+        self.pages = pages
+        self.count = 0
+        self.steps = 0
+        self.finishes = 0
+        self.reopen = reopen  # finish() calls that find new work, like routed links
+        self.fail_at = fail_at
+        self.failed = False
+        self.lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self.count >= self.pages
+
+    def step(self):
+        with self.lock:
+            self.steps += 1
+            if self.steps == self.fail_at:
+                raise RuntimeError("fetch blew up")
+            self.count += 1
+
+    def finish(self, failed: bool = False) -> bool:
+        self.finishes += 1
+        if failed:
+            self.failed = True
+            return True
+        if self.reopen:
+            self.reopen -= 1
+            self.pages += 1
+            return False
+        return True
+
+
+def run(crawls: dict, workers: int = 4):
+    def make_crawl(topic, seed, progress):
+        return crawls[seed]
+
+    topics = {"t": list(crawls)}
+    return SeedScheduler(make_crawl, ReadyLimiter(), workers=workers, report_every=60).run(topics)
+
+
+def test_every_seed_finishes_once():
+    crawls = {f"s{i}": FakeCrawl(f"h{i % 3}", pages=5 + i) for i in range(9)}
+    progress = run(crawls)
+    assert all(rec.status == "done" for rec in progress.values())
+    for crawl in crawls.values():
+        assert crawl.steps == crawl.pages
+        assert crawl.finishes == 1
+
+
+def test_finish_can_keep_a_crawl_going():
+    crawls = {"a": FakeCrawl("h", pages=3, reopen=2), "b": FakeCrawl("h", pages=2)}
+    run(crawls, workers=2)
+    assert crawls["a"].steps == 5
+    assert crawls["a"].finishes == 3
+    assert crawls["b"].finishes == 1
+
+
+def test_finished_resumed_crawl_is_not_stepped():
+    crawls = {"a": FakeCrawl("h", pages=0)}
+    run(crawls)
+    assert crawls["a"].steps == 0
+    assert crawls["a"].finishes == 1
+
+
+def test_failed_seed_is_torn_down():
+    crawls = {"a": FakeCrawl("h", pages=5, fail_at=2), "b": FakeCrawl("h", pages=3)}
+    progress = run(crawls, workers=2)
+    assert progress[("t", "a")].status == "failed"
+    assert crawls["a"].failed and crawls["a"].finishes == 1
+    assert crawls["a"].steps == 2
+    assert progress[("t", "b")].status == "done" and crawls["b"].steps == 3
@@ -0,0 +1,144 @@
+import os
+
+import pytest
+
+from segments import (SegmentDir, SegmentReader, SegmentWriter, compact, iter_documents,
+                      iter_segments, zstandard)
+
+CODECS = ["none", "deflate"] + (["zstd"] if zstandard is not None else [])
+DOCS = {f"{i:016x}": f"word{i} " * (i + 1) + "ünïcode" for i in range(20)}
+
+
+def segment_paths(directory) -> list:
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".seg"))
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_round_trip(tmp_path, codec):
+    path = str(tmp_path / "segment-00000.seg")
+    writer = SegmentWriter(path, codec)
+    for key, text in DOCS.items():
+        writer.append(key, text)
+    writer.seal()
+    with SegmentReader(path) as seg:
+        assert seg.sealed
+        assert len(seg) == len(DOCS)
+        assert dict(seg.items()) == DOCS
+        assert seg.get("0000000000000005") == DOCS["0000000000000005"]
+        assert seg.get("ffffffffffffffff") is None
+
+
+def test_last_record_wins_within_a_segment(tmp_path):
+    path = str(tmp_path / "segment-00000.seg")
+    writer = SegmentWriter(path)
+    writer.append("a" * 16, "old")
+    writer.append("b" * 16, "gone")
+    writer.append("a" * 16, "new")
+    writer.delete("b" * 16)
+    writer.seal()
+    with SegmentReader(path) as seg:
+        assert list(seg.items()) == [("a" * 16, "new")]
+        assert seg.deleted() == ["b" * 16]
+
+
+def test_newer_segments_hide_older_versions_and_deletions(tmp_path):
+    directory = str(tmp_path)
+    first = SegmentDir(directory)
+    for key in ("a", "b", "c"):
+        first.write(key * 16, f"{key} v1")
+    first.close()
+    # A later run starts the next segment; it replaces a and deletes b
+    second = SegmentDir(directory)
+    second.write("a" * 16, "a v2")
+    second.delete("b" * 16)
+    second.close()
+    paths = segment_paths(directory)
+    assert len(paths) == 2
+    assert dict(iter_segments(paths)) == {"a" * 16: "a v2", "c" * 16: "c v1"}
+    # Each hash comes out once, whatever order the segments are listed in
+    assert sorted(k for k, _ in iter_segments(paths[::-1])) == ["a" * 16, "c" * 16]
+
+
+def test_unsealed_segment_recovers_up_to_a_torn_record(tmp_path):
+    path = str(tmp_path / "segment-00000.seg")
+    writer = SegmentWriter(path, "deflate")
+    writer.append("a" * 16, "kept")
+    writer.flush()
+    size = writer.size
+    writer.append("b" * 16, "torn " * 50)
+    writer.flush()
+    writer._f.close()
+    with open(path, "r+b") as f:
+        f.truncate(size + 30)
+    with SegmentReader(path) as seg:
+        assert not seg.sealed
+        assert dict(seg.items()) == {"a" * 16: "kept"}
+    # Reopening drops the torn tail and appends after the last full record
+    seg_dir = SegmentDir(str(tmp_path))
+    seg_dir.write("c" * 16, "after crash")
+    seg_dir.close()
+    assert dict(iter_segments([path])) == {"a" * 16: "kept", "c" * 16: "after crash"}
+
+
+def test_compact_keeps_only_live_documents(tmp_path):
+    directory = str(tmp_path)
+    seg_dir = SegmentDir(directory, max_bytes=200)
+    for key, text in DOCS.items():
+        seg_dir.write(key, text)
+    seg_dir.close()
+    seg_dir = SegmentDir(directory)
+    seg_dir.delete("0000000000000000")
+    seg_dir.write("0000000000000001", "rewritten")
+    seg_dir.close()
+    before = dict(iter_segments(segment_paths(directory)))
+    assert len(segment_paths(directory)) > 2
+
+    merged, count = compact(directory, "deflate", 1 << 20)
+    assert count == len(DOCS) - 1
+    paths = segment_paths(directory)
+    assert len(paths) == 1 and merged > 1
+    with SegmentReader(paths[0]) as seg:
+        assert seg.deleted() == []
+    assert dict(iter_segments(paths)) == before
+
+
+def test_iter_documents_reads_files_and_segments(tmp_path):
+    files = tmp_path / "topic_a"
+    files.mkdir()
+    (files / "vocab_0000000000000001.txt").write_text("from file", encoding="utf-8")
+    seg_dir = SegmentDir(str(tmp_path / "topic_b"))
+    seg_dir.write("0000000000000002", "from segment")
+    seg_dir.close()
+    assert dict(iter_documents(str(tmp_path))) == {"0000000000000001": "from file",
+                                                   "0000000000000002": "from segment"}
+
+
+def test_compact_interrupted_before_removing_old_segments(tmp_path, monkeypatch):
+    import segments
+
+    directory = str(tmp_path)
+    seg_dir = SegmentDir(directory, max_bytes=200)
+    for key, text in DOCS.items():
+        seg_dir.write(key, text)
+    seg_dir.close()
+    seg_dir = SegmentDir(directory)
+    seg_dir.delete("0000000000000000")
+    seg_dir.close()
+    before = dict(iter_segments(segment_paths(directory)))
+
+    def crash(directory):
+        raise KeyboardInterrupt
+
+    # Rewritten segments are in place, old ones not yet removed
+    monkeypatch.setattr(segments, "_sync_dir", crash)
+    with pytest.raises(KeyboardInterrupt):
+        compact(directory, "deflate", 1 << 20)
+    assert dict(iter_segments(segment_paths(directory))) == before
+    monkeypatch.undo()
+
+    # A leftover compact.tmp only holds copies and is dropped
+    os.makedirs(os.path.join(directory, "compact.tmp"))
+    SegmentDir(os.path.join(directory, "compact.tmp")).write("f" * 16, "partial")
+    compact(directory, "deflate", 1 << 20)
+    assert len(segment_paths(directory)) == 1
+    assert dict(iter_segments(segment_paths(directory))) == before
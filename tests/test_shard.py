@@ -0,0 +1,46 @@
+import os
+
+from shard import merge_shards, parse_shard, shard_dir, shard_of
+
+
+def write_shard(output, index: int, urls: list, vocab: dict = None, tail: str = ""):
+    src = shard_dir(str(output), index)
+    os.makedirs(os.path.join(src, "books"), exist_ok=True)
+    with open(os.path.join(src, "all_urls_master.txt"), "a", encoding="utf-8") as f:
+        f.write("".join(url + "\n" for url in urls) + tail)
+    for key, text in (vocab or {}).items():
+        with open(os.path.join(src, "books", f"vocab_{key}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+    return src
+
+
+def master_lines(output) -> list:
+    with open(os.path.join(str(output), "all_urls_master.txt"), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_shard_assignment():
+    assert parse_shard("1/4") == (1, 4)
+    assert shard_of("Example.com", 4) == shard_of("example.com", 4)
+    assert {shard_of(f"h{n}.com", 3) for n in range(50)} == {0, 1, 2}
+
+
+def test_merge_appends_only_lines_added_since_the_last_merge(tmp_path):
+    srcs = [write_shard(tmp_path, 0, ["http://a/1", "http://a/2"], {"0" * 16: "a one"}),
+            write_shard(tmp_path, 1, ["http://b/1"], tail="http://b/to")]
+    stats = merge_shards(str(tmp_path), srcs)
+    assert stats["urls"] == 3 and stats["vocab files"] == 1
+    # The torn (or still open) last line waits for its newline
+    assert master_lines(tmp_path) == ["http://a/1", "http://a/2", "http://b/1"]
+    assert os.path.exists(os.path.join(str(tmp_path), "books", f"vocab_{'0' * 16}.txt"))
+
+    # Next run: the shards keep their logs and append to them
+    write_shard(tmp_path, 0, ["http://a/3"])
+    with open(os.path.join(srcs[1], "all_urls_master.txt"), "a", encoding="utf-8") as f:
+        f.write("rn\n")
+    stats = merge_shards(str(tmp_path), srcs)
+    assert stats["urls"] == 2
+    assert master_lines(tmp_path) == ["http://a/1", "http://a/2", "http://b/1", "http://a/3",
+                                      "http://b/torn"]
+    assert merge_shards(str(tmp_path), srcs)["urls"] == 0
+    assert len(master_lines(tmp_path)) == 5
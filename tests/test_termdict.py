@@ -0,0 +1,88 @@
+import fnmatch
+import os
+import random
+from array import array
+
+import pytest
+
+from postings import write_binary
+from termdict import BLOCK_TERMS, TermDict, TermDictWriter, build_dict
+
+
+def sample_terms(seed: int = 3) -> list:
+    # Sorted (term, doc freq), many terms sharing long prefixes so runs cross blocks
+    rng = random.Random(seed)
+    terms = {"a", "é", "日本", "日本語", "zz"}
+    for stem in ("car", "cart", "card", "travel", "trave"):
+        terms.update(stem + "".join(rng.choice("aeiourst") for _ in range(rng.randint(0, 5)))
+                     for _ in range(30))
+    return [(term, rng.randint(1, 1000)) for term in sorted(terms, key=lambda t: t.encode("utf-8"))]
+
+
+@pytest.fixture
+def dictionary(tmp_path):
+    terms = sample_terms()
+    writer = TermDictWriter(str(tmp_path / "terms.dict"))
+    for term, df in terms:
+        writer.add(term.encode("utf-8"), df)
+    writer.close()
+    assert not os.path.exists(str(tmp_path / "terms.dict.data.tmp"))
+    with TermDict(str(tmp_path / "terms.dict")) as td:
+        yield td, terms
+
+
+def test_find_returns_ordinals(dictionary):
+    td, terms = dictionary
+    assert len(td) == len(terms) > 4 * BLOCK_TERMS
+    for ordinal, (term, _) in enumerate(terms):
+        assert td.find(term) == ordinal
+    for missing in ("", "0", "carz", "日", "zzz"):
+        assert td.find(missing) == -1
+
+
+@pytest.mark.parametrize("prefix", ["", "car", "card", "trav", "日本", "q"])
+def test_prefix(dictionary, prefix):
+    td, terms = dictionary
+    assert list(td.prefix(prefix)) == [(term, ordinal, df) for ordinal, (term, df)
+                                       in enumerate(terms) if term.startswith(prefix)]
+
+
+@pytest.mark.parametrize("prefix,k", [("car", 5), ("trave", 1), ("", 10), ("x", 3)])
+def test_complete_is_the_top_k_by_doc_freq(dictionary, prefix, k):
+    td, terms = dictionary
+    matches = [(df, -ordinal, term) for ordinal, (term, df) in enumerate(terms)
+               if term.startswith(prefix)]
+    assert td.complete(prefix, k) == [(term, df) for df, _, term in sorted(matches, reverse=True)[:k]]
+
+
+@pytest.mark.parametrize("pattern", ["car*", "*el", "c?r[dt]*", "[ab]*", "*", "nomatch*"])
+def test_expand_matches_fnmatch(dictionary, pattern):
+    td, terms = dictionary
+    expected = [(term, df) for term, df in terms if fnmatch.fnmatchcase(term, pattern)]
+    got = td.expand(pattern)
+    assert sorted(got) == sorted(expected)
+    assert [df for _, df in got] == sorted((df for _, df in expected), reverse=True)
+    limited = td.expand(pattern, limit=3)
+    assert len(limited) == min(3, len(expected))
+    assert [df for _, df in limited] == sorted((df for _, df in expected), reverse=True)[:3]
+
+
+def test_empty_dictionary(tmp_path):
+    path = str(tmp_path / "terms.dict")
+    TermDictWriter(path).close()
+    with TermDict(path) as td:
+        assert len(td) == 0
+        assert td.find("a") == -1
+        assert list(td.prefix("")) == [] and td.complete("a") == [] and td.expand("*") == []
+
+
+def test_build_dict_matches_the_one_written_with_the_index(tmp_path):
+    terms = sample_terms()
+    postings = [(term, list(range(df % 7 + 1)), [1] * (df % 7 + 1)) for term, df in terms]
+    write_binary(str(tmp_path), iter(postings), [f"u{n}" for n in range(7)], array("I", [1] * 7))
+    with open(tmp_path / "terms.dict", "rb") as f:
+        written = f.read()
+    os.remove(tmp_path / "terms.dict")
+    assert build_dict(str(tmp_path)) == len(terms)
+    with open(tmp_path / "terms.dict", "rb") as f:
+        assert f.read() == written
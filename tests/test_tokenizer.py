@@ -0,0 +1,38 @@
+import re
+
+import pytest
+
+from tokenizer import Tokenizer, default_tokenizer, load_stopwords
+
+
+def legacy(text: str) -> list:
+    return [t for t in re.findall(r"\b\w+\b", text) if t.isalpha()]
+
+
+def test_matches_findall_isalpha():
+    text = "Hello, world! abc123 snake_case Ünïcode مرحبا بالعالم 42 x"
+    assert list(default_tokenizer([text])) == legacy(text)
+
+
+def test_chunks_are_word_boundaries():
+    assert list(default_tokenizer(["foo", "bar baz"])) == ["foo", "bar", "baz"]
+
+
+def test_lowercase_stopwords_and_max_length():
+    tokenize = Tokenizer(lowercase=True, stopwords=load_stopwords("en,ar"), max_length=5)
+    text = "The Quick brown foxes and في البيت jumped"
+    assert list(tokenize([text])) == ["quick", "brown", "foxes", "البيت"]
+
+
+def test_stopwords_match_case_insensitively_without_lowercasing():
+    tokenize = Tokenizer(stopwords=["the"])
+    assert list(tokenize(["The cat THE hat"])) == ["cat", "hat"]
+
+
+def test_load_stopwords(tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_text("Foo\n\nbar\n", encoding="utf-8")
+    words = load_stopwords(f"en,{path}")
+    assert {"foo", "bar", "the"} <= words
+    with pytest.raises(ValueError):
+        load_stopwords("nope")
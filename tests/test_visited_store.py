@@ -0,0 +1,52 @@
+from visited_store import HEADER, MAX_LOAD, FingerprintSet, fingerprint
+
+
+def test_set_interface_and_growth(tmp_path):
+    visited = FingerprintSet(str(tmp_path / "visited.fp"), initial_capacity=8)
+    urls = [f"http://h/{n}" for n in range(100)]
+    for url in urls + urls[:10]:
+        visited.add(url)
+    assert len(visited) == 100
+    assert visited._capacity * MAX_LOAD >= 100
+    assert all(url in visited for url in urls)
+    assert "http://h/other" not in visited
+    assert visited.has_fingerprint(fingerprint(urls[0]))
+    visited.close()
+    reopened = FingerprintSet(str(tmp_path / "visited.fp"))
+    assert len(reopened) == 100 and all(url in reopened for url in urls)
+    reopened.close()
+
+
+def test_catch_up_from_master_file(tmp_path):
+    master = tmp_path / "all_urls_master.txt"
+    master.write_text("http://h/a\n")
+    visited = FingerprintSet(str(tmp_path / "visited.fp"), str(master))
+    visited.close()
+    with open(master, "a") as f:
+        f.write("http://h/b\nhttp://h/tor")
+    visited = FingerprintSet(str(tmp_path / "visited.fp"), str(master))
+    assert len(visited) == 2 and "http://h/b" in visited and "http://h/tor" not in visited
+    visited.close()
+
+
+def test_unclean_shutdown_recounts_slots(tmp_path):
+    path = str(tmp_path / "visited.fp")
+    visited = FingerprintSet(path, initial_capacity=16)
+    urls = [f"http://h/{n}" for n in range(10)]
+    for url in urls:
+        visited.add(url)
+    # Crash: the slots reached the file, the header count did not
+    visited._mm.flush()
+    with open(path, "rb") as f:
+        assert HEADER.unpack(f.read(HEADER.size))[3] == 0
+
+    recovered = FingerprintSet(path)
+    assert len(recovered) == 10
+    assert all(url in recovered for url in urls)
+    # The load factor is right again, so the table grows on time
+    for n in range(10, 40):
+        recovered.add(f"http://h/{n}")
+    assert len(recovered) == 40 and recovered._count <= recovered._capacity * MAX_LOAD
+    recovered.close()
+    with open(path, "rb") as f:
+        assert HEADER.unpack(f.read(HEADER.size))[3:] == (40, 0, 0)
@@ -0,0 +1,79 @@
+import os
+import re
+from itertools import filterfalse
+
+# Maximal runs of word characters. A run is a token only if every character
+# in it is a letter (str.isalpha), so Latin, Arabic and other scripts pass,
+# while "abc123" or "snake_case" are dropped rather than split. Same output
+# as re.findall(r"\b\w+\b", text) followed by the isalpha() filter.
+WORD_RE = re.compile(r"\w+")
+
+# --- Built-in stop-word lists (--stopwords en,ar) ---
+STOPWORDS = {
+    "en": frozenset("""
+        a about above after again against all am an and any are as at be because been
+        before being below between both but by can could did do does doing down during
+        each few for from further had has have having he her here hers herself him
+        himself his how i if in into is it its itself just me more most my myself no nor
+        not now of off on once only or other our ours ourselves out over own same she
+        should so some such than that the their theirs them themselves then there these
+        they this those through to too under until up very was we were what when where
+        which while who whom why will with would you your yours yourself yourselves
+    """.split()),
+    "ar": frozenset("""
+        في من على إلى الى عن مع هذا هذه ذلك تلك هؤلاء التي الذي الذين اللذين اللتين
+        أن ان إن كان كانت يكون تكون لا ما لم لن قد ثم أو او بل هو هي هم هما هن نحن
+        أنا انا أنت انت أنتم كل بعض غير بين حتى إذا اذا عند عندما منذ أي اي كما لكن
+        ليس ليست وقد وكان وهو وهي ولا وما ومن وفي وعلى كذلك أيضا ايضا حيث هناك هنا
+        بعد قبل خلال حول ضد دون لدى لقد إلا الا أما اما
+    """.split()),
+}
+
+
+# --- Parse a --stopwords value: built-in list names and/or files, comma separated ---
+def load_stopwords(spec: str) -> frozenset:
+    words = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        if part in STOPWORDS:
+            words.update(STOPWORDS[part])
+        elif os.path.isfile(part):
+            with open(part, "r", encoding="utf-8") as f:
+                words.update(line.strip().lower() for line in f if line.strip())
+        else:
+            raise ValueError(f"{part!r} is neither a built-in list "
+                             f"({', '.join(STOPWORDS)}) nor a file")
+    return frozenset(words)
+
+
+# --- Single-pass tokenizer over a page's text chunks ---
+# Call it with an iterable of text chunks (as returned by the parsers); it
+# yields tokens chunk by chunk and filters them in one pass, so the chunks
+# are never joined into one string. Each chunk's word runs are collected
+# with findall, which holds one list per chunk (for bs4 the chunk is the
+# whole page). WORD_RE.finditer would stream, but it is about 20% slower,
+# and the vocab line, the SimHash and the parse pool all need the full
+# token list anyway. Stop words are matched case-insensitively. Tokens
+# longer than max_length are dropped (0 keeps them all).
+class Tokenizer:
+    def __init__(self, lowercase: bool = False, stopwords=(), max_length: int = 0):
+        self.lowercase = lowercase
+        self.stopwords = frozenset(w.lower() for w in stopwords)
+        self.max_length = max_length
+
+    def __call__(self, texts):
+        max_length = self.max_length
+        stopwords = self.stopwords
+        for text in texts:
+            tokens = filter(str.isalpha, WORD_RE.findall(text))
+            if max_length:
+                tokens = (t for t in tokens if len(t) <= max_length)
+            if self.lowercase:
+                tokens = map(str.lower, tokens)
+                if stopwords:
+                    tokens = filterfalse(stopwords.__contains__, tokens)
+            elif stopwords:
+                tokens = (t for t in tokens if t.lower() not in stopwords)
+            yield from tokens
+
+
+default_tokenizer = Tokenizer()
@@ -0,0 +1,180 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+# --- On-disk layout ---
+# 64-byte header: magic, version, capacity (slots), count, master-file offset
+# already folded in, flags. Then `capacity` native-endian uint64 slots; 0
+# marks an empty slot. Capacity is always a power of two. DIRTY is set while
+# the file is open: slots are written through the mapping, so after a crash
+# the count is stale and is recounted from the slots.
+MAGIC = b"VFP1"
+HEADER = struct.Struct("<4sIQQQI")
+DIRTY = 1
+HEADER_SIZE = 64
+MAX_LOAD = 0.7
+
+
+# --- Same 64 bits as encode_name(): first 16 hex chars of SHA-256 ---
+def fingerprint(url: str) -> int:
+    fp = int(hashlib.sha256(url.encode('utf-8')).hexdigest()[:16], 16)
+    return fp or 1
+
+
+# --- Compact visited set: open-addressing table of 64-bit URL fingerprints ---
+# Drop-in for the `visited` set (in / add / len). Roughly 12 bytes per URL
+# instead of a full Python string, memory-mapped so a restart just maps the
+# file. Lines appended to the master file after the last sync (e.g. before a
+# crash) are folded in on open.
+class FingerprintSet:
+    def __init__(self, path: str, master_file: str = None, initial_capacity: int = 1 << 16):
+        self.path = path
+        self.master_file = master_file
+        self._lock = threading.RLock()
+        if not os.path.exists(path):
+            self._create(path, initial_capacity)
+        self._open()
+        if master_file and os.path.exists(master_file):
+            self._catch_up()
+
+    # --- set interface ---
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, url: str) -> bool:
+        return self.has_fingerprint(fingerprint(url))
+
+    def has_fingerprint(self, fp: int) -> bool:
+        with self._lock:
+            slots, mask = self._slots, self._mask
+            i = fp & mask
+            while True:
+                cur = slots[i]
+                if cur == fp:
+                    return True
+                if cur == 0:
+                    return False
+                i = (i + 1) & mask
+
+    def add(self, url: str):
+        self.add_fingerprint(fingerprint(url))
+
+    def add_fingerprint(self, fp: int):
+        with self._lock:
+            if self._insert(fp):
+                self._count += 1
+                if self._count > self._capacity * MAX_LOAD:
+                    self._grow()
+
+    def sync(self, source_offset: int = None):
+        # Persist the header and make the mapped pages durable
+        with self._lock:
+            if source_offset is None and self.master_file and os.path.exists(self.master_file):
+                source_offset = os.path.getsize(self.master_file)
+            if source_offset is not None:
+                self._source_offset = source_offset
+            self._write_header()
+            self._mm.flush()
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            self._write_header(clean=True)
+            self._mm.flush()
+            self._slots.release()
+            self._mm.close()
+
+    # --- internals ---
+    def _insert(self, fp: int) -> bool:
+        slots, mask = self._slots, self._mask
+        i = fp & mask
+        while True:
+            cur = slots[i]
+            if cur == fp:
+                return False
+            if cur == 0:
+                slots[i] = fp
+                return True
+            i = (i + 1) & mask
+
+    @staticmethod
+    def _create(path: str, capacity: int, source_offset: int = 0):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, 1, capacity, 0, source_offset, 0).ljust(HEADER_SIZE, b"\0"))
+            f.truncate(HEADER_SIZE + 8 * capacity)
+
+    def _open(self):
+        with open(self.path, "r+b") as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        magic, version, capacity, count, offset, flags = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != 1:
+            raise ValueError(f"{self.path} is not a visited fingerprint file")
+        self._capacity = capacity
+        self._mask = capacity - 1
+        self._count = count
+        self._source_offset = offset
+        self._slots = memoryview(self._mm)[HEADER_SIZE:HEADER_SIZE + 8 * capacity].cast("Q")
+        if flags & DIRTY:
+            # Not closed cleanly: the slots may hold more than the header says
+            self._count = capacity - array("Q", self._slots).count(0)
+        self._write_header()
+        self._mm.flush(0, HEADER_SIZE)
+        if self._count > capacity * MAX_LOAD:
+            self._grow()
+
+    def _write_header(self, clean: bool = False):
+        HEADER.pack_into(self._mm, 0, MAGIC, 1, self._capacity, self._count, self._source_offset,
+                         0 if clean else DIRTY)
+
+    def _grow(self):
+        # Rehash into a table twice the size, then swap files atomically
+        old = self._slots
+        tmp = self.path + ".tmp"
+        self._create(tmp, self._capacity * 2, self._source_offset)
+        with open(tmp, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), 0)
+        slots = memoryview(mm)[HEADER_SIZE:].cast("Q")
+        mask = self._capacity * 2 - 1
+        for fp in old:
+            if fp:
+                i = fp & mask
+                while slots[i]:
+                    i = (i + 1) & mask
+                slots[i] = fp
+        HEADER.pack_into(mm, 0, MAGIC, 1, self._capacity * 2, self._count, self._source_offset, 0)
+        mm.flush()
+        slots.release()
+        mm.close()
+        old.release()
+        self._mm.close()
+        os.replace(tmp, self.path)
+        self._open()
+
+    def _catch_up(self):
+        # Fold in master-file lines written after the last sync
+        pos = self._source_offset
+        with open(self.master_file, "rb") as mf:
+            mf.seek(pos)
+            for line in mf:
+                if not line.endswith(b"\n"):
+                    break
+                pos += len(line)
+                url = line.strip().decode("utf-8")
+                if url:
+                    self.add(url)
+        self.sync(pos)
+
+
+# --- Open the visited set for an output directory ---
+def open_visited(backend: str, output_dir: str, master_file: str):
+    if backend == "fingerprint":
+        return FingerprintSet(os.path.join(output_dir, "visited.fp"), master_file)
+    visited = set()
+    if os.path.exists(master_file):
+        with open(master_file, 'r', encoding='utf-8') as mf:
+            for line in mf:
+                visited.add(line.strip())
+    return visited